@@ -0,0 +1,489 @@
+import inspect
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple
+
+from classes import ItemBag, Scene
+from conditions import Condition, ConditionCache
+from context import EvalContext
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+# handler(batch, item), may be a coroutine function; returning False means it has taken over
+ActionHandler = Callable[['ActionBatch', Any], Any]
+
+
+class ActionError(Exception):
+    """
+    Raised when an on_enter action of a scene module has no handler or a malformed item,
+    or when an action (or its condition) fails while the actions of a scene run.
+    """
+
+
+class ActionType:
+    """
+    A registered action type.
+    handler — called with (batch, item) when the action runs.
+    prepare — converts the item of the action once, when it is compiled (None to keep it as it is).
+    commit — whether the changes made so far are committed before the action runs.
+    is_async — whether the handler has to be awaited.
+    """
+    __slots__ = ('handler', 'prepare', 'commit', 'is_async')
+
+    def __init__(self, handler: ActionHandler, prepare: Callable[[Any], Any] = None, commit: bool = False):
+        self.handler = handler
+        self.prepare = prepare
+        self.commit = commit
+        self.is_async = inspect.iscoroutinefunction(handler)
+
+
+# Action types by (target, action type)
+ACTIONS: Dict[Tuple[str, str], ActionType] = {}
+
+
+def register_action(target: str, action_type: str, handler: ActionHandler = None,
+                    prepare: Callable[[Any], Any] = None, commit: bool = False):
+    """
+    Registers the handler of an action type, replacing the one registered before. Can be used as a decorator:
+
+        @register_action('variables', 'double')
+        def double(batch, item):
+            batch.variables[item] *= 2
+
+    Handlers change the state through the batch (batch.inventory, batch.modifiers, batch.variables).
+    Handlers which leave the scene or act outside the state (saves, notifications) have to be registered with
+    commit=True, so they see the changes of the actions before them; they return False if they have taken over.
+    :param target: target of the action (inventory, modifiers, variables, game or a new one)
+    :param action_type: type of the action
+    :param handler: called with (batch, item), may be a coroutine function
+    :param prepare: converts the item once, when the action is compiled (raises ValueError, TypeError etc.
+        for malformed items)
+    :param commit: whether the changes made so far are committed before the action runs
+    :return: the handler
+    """
+    def register(function: ActionHandler) -> ActionHandler:
+        ACTIONS[(target, action_type)] = ActionType(function, prepare, commit)
+        # Actions compiled with the old handler are compiled again when their scenes are entered
+        ActionTable.invalidate(target, action_type)
+
+        return function
+
+    return register(handler) if handler is not None else register
+
+
+class Action:
+    """
+    An on_enter action compiled against its handler.
+    label — where the action comes from, for error messages.
+    condition — the compiled condition of the action.
+    always — whether the condition is just 'True' (it isn't evaluated then).
+    code — the code object of a synchronous expression condition, evaluated without going through the Condition.
+    handler, item, is_async, commit — the handler of the action type, the prepared item and the flags of the type.
+    """
+    __slots__ = ('label', 'condition', 'always', 'code', 'handler', 'item', 'is_async', 'commit')
+
+    def __init__(self, label: str, condition: Condition, kind: ActionType, item: Any):
+        self.label = label
+        self.condition = condition
+        self.always = condition.source.strip() == 'True'
+        self.code = None if condition.is_async else condition.code
+        self.handler = kind.handler
+        self.item = item
+        self.is_async = kind.is_async
+        self.commit = kind.commit
+
+
+class ActionBatch:
+    """
+    A class to run the on_enter actions of a scene as one transaction.
+    Every condition is evaluated against the state the scene was entered with; the actions change copies of the
+    parts of the state they touch, which replace the originals on commit(), so the context is refreshed once
+    per batch. If an action fails, the uncommitted changes are dropped and ActionError is raised.
+    engine — the game.
+    context — the context of the transition.
+    """
+    __slots__ = ('engine', 'context', '_inventory', '_modifiers', '_variables')
+
+    def __init__(self, engine: 'Engine', context: EvalContext):
+        self.engine = engine
+        self.context = context
+        self._inventory: Optional[ItemBag] = None
+        self._modifiers: Optional[ItemBag] = None
+        self._variables: Optional[Dict[str, Any]] = None
+
+    @property
+    def inventory(self) -> ItemBag:
+        if self._inventory is None:
+            self._inventory = self.engine.player.inventory.copy()
+
+        return self._inventory
+
+    @property
+    def modifiers(self) -> ItemBag:
+        if self._modifiers is None:
+            self._modifiers = self.engine.modifiers.copy()
+
+        return self._modifiers
+
+    @property
+    def variables(self) -> Dict[str, Any]:
+        if self._variables is None:
+            self._variables = dict(self.engine.variables)
+
+        return self._variables
+
+    @variables.setter
+    def variables(self, variables: Dict[str, Any]) -> None:
+        self._variables = variables
+
+    def commit(self) -> None:
+        """
+        Replaces the state with the changed copies and refreshes the context once.
+        :return: None
+        """
+        inventory, modifiers, variables = self._inventory, self._modifiers, self._variables
+
+        if inventory is not None:
+            self.engine.player.inventory = inventory
+
+        if modifiers is not None:
+            self.engine.modifiers = modifiers
+
+        if variables is not None:
+            self.engine.variables = variables
+
+        if inventory is not None or modifiers is not None or variables is not None:
+            self._inventory = self._modifiers = self._variables = None
+            self.context.invalidate(
+                inventory=inventory is not None, modifiers=modifiers is not None, variables=variables is not None
+            )
+
+    async def run(self, actions: Tuple[Action, ...]) -> bool:
+        """
+        Runs the actions whose conditions are met and commits their changes.
+        :param actions: compiled actions of the scene
+        :return: bool — False if an action has taken over (goto, restart, load, etc.)
+        :raises ActionError: if an action or its condition fails (the uncommitted changes are dropped)
+        """
+        namespace = self.context.namespace
+        matched: List[Action] = []
+        append = matched.append
+        action = None
+
+        # One try block per loop: a block per action costs more than the actions themselves
+        try:
+            for action in actions:
+                if action.always:
+                    append(action)
+                elif action.code is not None:
+                    if eval(action.code, namespace):
+                        append(action)
+                elif action.condition.is_async:
+                    if await action.condition.evaluate(namespace):
+                        append(action)
+                elif action.condition.evaluate(namespace):
+                    append(action)
+        except Exception as e:
+            raise ActionError(f'{action.label}: condition {action.condition.source!r}: {e!r}') from e
+
+        try:
+            for action in matched:
+                if action.commit:
+                    self.commit()
+
+                if action.is_async:
+                    result = await action.handler(self, action.item)
+                else:
+                    result = action.handler(self, action.item)
+
+                if result is False:
+                    self.commit()
+                    return False
+        except ActionError:
+            # Raised by the actions of a scene this one has gone to
+            raise
+        except Exception as e:
+            raise ActionError(f'{action.label}: {e!r}') from e
+
+        self.commit()
+
+        return True
+
+
+class ActionTable:
+    """
+    Compiled on_enter actions of a single scene module.
+    Every action is bound to its handler and its condition once, when the module is first requested, so unknown
+    actions are reported at load time and running them doesn't compare strings. Scenes of story bundles
+    (validated when the bundle was compiled) and system scenes are compiled when they are first entered.
+    name — the name of the scene module.
+    conditions — the condition cache of the module.
+    scenes — the compiled actions by scene.
+    uses — the compiled scenes by the (target, action type) pairs of their actions.
+    """
+    _modules: Dict[str, 'ActionTable'] = {}
+
+    def __init__(self, name: str, conditions: ConditionCache):
+        self.name = name
+        self.conditions = conditions
+        self.scenes: Dict[Scene, Tuple[Action, ...]] = {}
+        self.uses: Dict[Tuple[str, str], Set[Scene]] = {}
+
+    @classmethod
+    def for_module(cls, module: ModuleType) -> 'ActionTable':
+        """
+        Returns the table of the module, compiling it on first use.
+        :param module: scene module
+        :return: ActionTable
+        """
+        table = cls._modules.get(module.__name__)
+
+        if table is None:
+            table = cls(module.__name__, ConditionCache.for_module(module))
+
+            if not hasattr(module, '__bundle__'):
+                table.compile_module(module)
+
+            cls._modules[module.__name__] = table
+
+        return table
+
+    @classmethod
+    def discard(cls, name: str) -> None:
+        """
+        Drops the compiled actions of the module (when it is unloaded).
+        :param name: name of the scene module
+        :return: None
+        """
+        cls._modules.pop(name, None)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._modules.clear()
+
+    @classmethod
+    def invalidate(cls, target: str, action_type: str) -> None:
+        """
+        Drops the compiled actions of the scenes which use the action type (its handler has changed),
+        in every loaded module. The other scenes keep theirs.
+        :param target: target of the action
+        :param action_type: type of the action
+        :return: None
+        """
+        for table in cls._modules.values():
+            for scene in table.uses.pop((target, action_type), ()):
+                table.scenes.pop(scene, None)
+
+    def compile_module(self, module: ModuleType) -> None:
+        """
+        Compiles the actions of every scene of the module, collecting all errors into one exception.
+        :param module: scene module
+        :return: None
+        """
+        errors = []
+
+        for name, value in vars(module).items():
+            if isinstance(value, Scene) and value not in self.scenes:
+                try:
+                    self.compile_scene(value, f'{module.__name__}.{name}')
+                except ActionError as e:
+                    errors.append(str(e))
+
+        if errors:
+            raise ActionError('\n'.join(errors))
+
+    def compile_scene(self, scene: Scene, name: str) -> Tuple[Action, ...]:
+        """
+        Compiles the actions of the scene.
+        :param scene: Scene
+        :param name: label of the scene used in error messages
+        :return: Tuple[Action, ...]
+        :raises ActionError: if an action has no handler or a malformed item
+        """
+        actions = []
+        errors = []
+        used = set()
+
+        for i, ((target, action_type, item), cond) in enumerate(scene.on_enter):
+            label = f'{name}.on_enter[{i}]'
+            kind = ACTIONS.get((target, action_type))
+            used.add((target, action_type))
+
+            if kind is None:
+                if target != 'game':
+                    errors.append(f'{label}: unknown action {target!r} {action_type!r}')
+                    continue
+
+                # Other game actions are up to the UI
+                kind, item = FORWARDED, (action_type, item)
+
+            elif kind.prepare is not None:
+                try:
+                    item = kind.prepare(item)
+                except (TypeError, ValueError, IndexError, KeyError) as e:
+                    errors.append(f'{label}: malformed item {item!r} of {target!r} {action_type!r}: {e}')
+                    continue
+
+            actions.append(Action(label, self.conditions.get(cond, label), kind, item))
+
+        if errors:
+            raise ActionError('\n'.join(errors))
+
+        self.scenes[scene] = actions = tuple(actions)
+
+        for key in used:
+            self.uses.setdefault(key, set()).add(scene)
+
+        return actions
+
+    def get(self, scene: Scene) -> Tuple[Action, ...]:
+        """
+        Returns the compiled actions of the scene, compiling them if it wasn't seen at load time.
+        :param scene: Scene
+        :return: Tuple[Action, ...]
+        """
+        actions = self.scenes.get(scene)
+
+        if actions is None:
+            actions = self.compile_scene(scene, f'{self.name}.{scene.id_}')
+
+        return actions
+
+
+def pair(item: Any) -> Tuple[Any, Any]:
+    name, value = item
+
+    return name, value
+
+
+def counted(item: Any) -> Tuple[str, int]:
+    """
+    Converts the (name, quantity) item of add-many, the quantity can be a string.
+    """
+    return item[0], int(item[1])
+
+
+def name_of(item: Any) -> str:
+    """
+    Returns the variable name of an item, which can also be a (name, ...) tuple.
+    """
+    return item if isinstance(item, str) else item[0]
+
+
+def register_bag(target: str) -> None:
+    """
+    Registers the actions of a bag of stacking items (the inventory, the modifiers).
+    :param target: name of the bag in the batch
+    :return: None
+    """
+    # The getter of the batch property, called directly: the handlers run for every action
+    bag = getattr(ActionBatch, target).fget
+
+    def add(batch: ActionBatch, item: str) -> None:
+        bag(batch).add(item)
+
+    def add_many(batch: ActionBatch, item: Tuple[str, int]) -> None:
+        name, count = item
+        bag(batch).add(name, count)
+
+    def remove(batch: ActionBatch, item: str) -> None:
+        bag(batch).remove(item)
+
+    def remove_all(batch: ActionBatch, item: str) -> None:
+        bag(batch).remove_all(item)
+
+    def clear(batch: ActionBatch, item: Any) -> None:
+        bag(batch).clear()
+
+    register_action(target, 'add', add)
+    register_action(target, 'add-many', add_many, prepare=counted)
+    register_action(target, 'remove', remove)
+    register_action(target, 'remove-all', remove_all)
+    register_action(target, 'clear', clear)
+
+
+register_bag('inventory')
+register_bag('modifiers')
+
+
+@register_action('variables', 'add', prepare=pair)
+@register_action('variables', 'update', prepare=pair)
+def set_variable(batch: ActionBatch, item: Tuple[str, Any]) -> None:
+    batch.variables[item[0]] = item[1]
+
+
+@register_action('variables', 'remove', prepare=name_of)
+def remove_variable(batch: ActionBatch, item: str) -> None:
+    del batch.variables[item]
+
+
+@register_action('variables', 'clear')
+def clear_variables(batch: ActionBatch, item: Any) -> None:
+    batch.variables = {}
+
+
+@register_action('variables', 'inc', prepare=pair)
+def increment_variable(batch: ActionBatch, item: Tuple[str, Any]) -> None:
+    batch.variables[item[0]] += item[1]
+
+
+@register_action('variables', 'dec', prepare=pair)
+def decrement_variable(batch: ActionBatch, item: Tuple[str, Any]) -> None:
+    batch.variables[item[0]] -= item[1]
+
+
+@register_action('variables', 'set', prepare=pair)
+async def evaluate_variable(batch: ActionBatch, item: Tuple[str, str]) -> None:
+    batch.variables[item[0]] = await batch.engine.resolver.evaluate(item[1], batch.context)
+
+
+@register_action('game', 'goto', commit=True)
+async def goto(batch: ActionBatch, item: str) -> bool:
+    await batch.engine.enter(item)
+
+    return False
+
+
+@register_action('game', 'restart', commit=True)
+async def restart(batch: ActionBatch, item: Any) -> bool:
+    engine = batch.engine
+    engine.reset()
+    engine.restarts += 1
+    await engine.enter()
+
+    return False
+
+
+async def leave(batch: ActionBatch, action_type: str, item: Any) -> bool:
+    """
+    Leaves the game screen (destroy) or the game (exit), the handler does the rest.
+    :return: bool — always False
+    """
+    engine = batch.engine
+    engine.finished = action_type == 'exit'
+    engine.resolved = None
+    await engine.handler(action_type, item)
+
+    return False
+
+
+@register_action('game', 'exit', commit=True)
+async def exit_game(batch: ActionBatch, item: Any) -> bool:
+    return await leave(batch, 'exit', item)
+
+
+@register_action('game', 'destroy', commit=True)
+async def destroy(batch: ActionBatch, item: Any) -> bool:
+    return await leave(batch, 'destroy', item)
+
+
+async def forward(batch: ActionBatch, item: Tuple[str, Any]) -> bool:
+    """
+    Passes a game action to the engine's handler (the UI, or the headless one).
+    :param item: (action type, item of the action)
+    :return: bool — False if the handler has taken over
+    """
+    return bool(await batch.engine.handler(*item))
+
+
+FORWARDED = ActionType(forward, commit=True)
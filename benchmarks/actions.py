@@ -0,0 +1,126 @@
+"""
+Micro-benchmark of running on_enter actions: the compiled actions of actions.ActionTable run as one batch,
+against the chain of string comparisons they used to go through, with the context refreshed after every action.
+Run from the repository root: python benchmarks/actions.py
+"""
+import asyncio
+import sys
+import time
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from classes import Scene  # noqa: E402
+from engine import Engine  # noqa: E402
+
+RUNS = 20000
+
+
+class LegacyEngine(Engine):
+    async def run_actions(self, context) -> bool:
+        """
+        The on_enter loop as it used to be (only the state actions).
+        """
+        conditions = self.resolver.conditions
+
+        for action, cond in self.player.current.on_enter:
+            matched = conditions.evaluate(cond, context.namespace)
+
+            if conditions.get(cond).is_async:
+                matched = await matched
+
+            if matched:
+                target, action_type, item = action
+
+                if target == 'inventory':
+                    if action_type == 'add':
+                        self.player.inventory.add(item)
+                    elif action_type == 'add-many':
+                        self.player.inventory.add(item[0], int(item[1]))
+                    elif action_type == 'remove':
+                        self.player.inventory.remove(item)
+                    elif action_type == 'remove-all':
+                        self.player.inventory.remove_all(item)
+                    elif action_type == 'clear':
+                        self.player.inventory.clear()
+
+                    context.invalidate(inventory=True)
+
+                elif target == 'modifiers':
+                    if action_type == 'add':
+                        self.modifiers.add(item)
+                    elif action_type == 'add-many':
+                        self.modifiers.add(item[0], int(item[1]))
+                    elif action_type == 'remove':
+                        self.modifiers.remove(item)
+                    elif action_type == 'remove-all':
+                        self.modifiers.remove_all(item)
+                    elif action_type == 'clear':
+                        self.modifiers.clear()
+
+                    context.invalidate(modifiers=True)
+
+                elif target == 'variables':
+                    if action_type == 'add':
+                        self.variables[item[0]] = item[1]
+                    elif action_type == 'inc':
+                        self.variables[item[0]] += item[1]
+
+                    context.invalidate(variables=True)
+
+        return True
+
+
+def story() -> types.ModuleType:
+    module = types.ModuleType('bench_actions')
+    module.MY_VARS = {}
+    module.GLOBAL_ADDITIONS = []
+    module.GLOBAL_IMAGES = []
+    module.first = Scene(
+        id_='first',
+        header='First',
+        text='A scene with the actions of a busy one.',
+        exits=[('Again', ('first', 'True'))],
+        on_enter=[
+            (('inventory', 'add', 'money'), 'True'),
+            (('inventory', 'add-many', ('arrow', '5')), 'invdict.get("money", 0) < 1000000'),
+            (('inventory', 'remove-all', 'arrow'), 'True'),
+            (('modifiers', 'add', 'visited'), 'True'),
+            (('modifiers', 'add-many', ('luck', 2)), '"visited" in mods'),
+            (('modifiers', 'remove', 'luck'), 'modsdict.get("luck", 0) > 0'),
+            (('variables', 'add', ('steps', 0)), '"steps" not in vars'),
+            (('variables', 'inc', ('steps', 1)), 'True'),
+        ]
+    )
+
+    return module
+
+
+def measure(cls) -> float:
+    engine = cls(story(), seed=0)
+    asyncio.run(engine.enter())
+
+    async def run():
+        for _ in range(RUNS):
+            await engine.run_actions(engine.context)
+
+    start = time.perf_counter()
+    asyncio.run(run())
+
+    return (time.perf_counter() - start) / RUNS
+
+
+def main():
+    # Rounds of the two alternate, so a busy machine slows both down alike
+    rounds = [(measure(LegacyEngine), measure(Engine)) for _ in range(7)]
+    legacy = min(legacy for legacy, _ in rounds)
+    compiled = min(compiled for _, compiled in rounds)
+
+    print(f'8 actions, {RUNS} runs:')
+    print(f'  string dispatch  {legacy * 1e6:7.2f} us/scene')
+    print(f'  compiled batch   {compiled * 1e6:7.2f} us/scene, x{legacy / compiled:.1f}')
+
+
+if __name__ == '__main__':
+    main()
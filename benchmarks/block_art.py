@@ -0,0 +1,57 @@
+"""
+Micro-benchmark of utils.image_to_block_art against the former per-pixel implementation.
+Run from the repository root: python benchmarks/block_art.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import BLOCK_CHARS, image_to_block_art, reduce  # noqa: E402
+
+
+def legacy_image_to_block_art(img, output_width=100, output_height=None):
+    """
+    The per-pixel implementation image_to_block_art used to have.
+    """
+    img = img.convert('L')
+
+    aspect_ratio = img.height / img.width
+    if output_height is None:
+        output_height = int(output_width * aspect_ratio * 0.5)
+
+    img = img.resize((output_width, output_height), Image.Resampling.LANCZOS)
+    pixels = np.array(img)
+
+    block_art = ''
+    for row in pixels:
+        for pixel in row:
+            block_index = int(pixel / 255 * (len(BLOCK_CHARS) - 1))
+            block_art += BLOCK_CHARS[block_index]
+        block_art += '\n'
+
+    return block_art
+
+
+def main():
+    image = reduce(Path('assets') / 'boar.jpeg', 400)
+
+    for width in (100, 400):
+        assert image_to_block_art(image, width) == legacy_image_to_block_art(image, width)
+
+        number = 20
+        legacy = timeit.timeit(lambda: legacy_image_to_block_art(image, width), number=number) / number
+        vectorized = timeit.timeit(lambda: image_to_block_art(image, width), number=number) / number
+
+        print(
+            f'width {width:>3}: legacy {legacy * 1000:8.2f} ms, '
+            f'vectorized {vectorized * 1000:8.2f} ms, x{legacy / vectorized:.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Micro-benchmark of classes.ItemBag against the plain lists the inventory and the modifiers used to be.
+Run from the repository root: python benchmarks/inventory.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from classes import ItemBag  # noqa: E402
+
+
+def legacy_inventory_dict(inventory):
+    """
+    The recount inventory_dict() and modifiers_dict() used to do on every transition.
+    """
+    result = {}
+
+    for item in inventory:
+        if item in result:
+            result[item] += 1
+        else:
+            result[item] = 1
+
+    return result
+
+
+def main():
+    for coins in (10, 1000, 100000):
+        items = ['money'] * coins + ['key', 'map']
+
+        def legacy():
+            inventory = list(items)
+            inventory.extend(['money' for _ in range(10)])
+            inventory.remove('key')
+            legacy_inventory_dict(inventory).get('money', 0) >= 10
+            inventory = [i for i in inventory if i != 'money']
+
+        bag = ItemBag.load({'money': coins, 'key': 1, 'map': 1})
+
+        def counted():
+            bag.add('money', 10)
+            bag.remove('key')
+            bag.as_dict().get('money', 0) >= 10
+            bag.remove_all('money')
+            bag.add('money', coins)
+            bag.add('key')
+
+        number = 200
+        legacy_time = timeit.timeit(legacy, number=number) / number
+        counted_time = timeit.timeit(counted, number=number) / number
+
+        print(
+            f'{coins:>6} coins: list {legacy_time * 1e6:10.2f} us, '
+            f'ItemBag {counted_time * 1e6:8.2f} us, x{legacy_time / counted_time:.0f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark of saving and loading against the history length: the former bson saves with whole scenes
+in the history against the versioned id-based saves (plain and zlib-compressed), and the cost of an autosave
+written as a whole save against a record appended to the journal.
+Run from the repository root: python benchmarks/saves.py
+"""
+import asyncio
+import importlib
+import sys
+import tempfile
+import timeit
+from dataclasses import asdict
+from pathlib import Path
+
+import bson
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import saves  # noqa: E402
+from classes import Scene  # noqa: E402
+from engine import Engine  # noqa: E402
+from journal import Journal  # noqa: E402
+from registry import SceneRegistry  # noqa: E402
+
+
+def legacy_state(engine: Engine, history) -> dict:
+    """
+    The state the save handlers used to write.
+    """
+    return {
+        'current': engine.player.current.id_,
+        'inventory': list(engine.player.inventory),
+        'previous': '',
+        'modifiers': list(engine.modifiers),
+        'variables': engine.variables,
+        'history': [asdict(item) for item in history]
+    }
+
+
+def main():
+    module = importlib.import_module('scenes.scenes_en')
+    scenes = list(SceneRegistry.for_module(module))
+
+    for length in (10, 1000, 10000):
+        engine = Engine(module, seed=0, history_size=length)
+        engine.player.current = scenes[0]
+        engine.player.inventory.add('money', 9)
+        engine.modifiers.add('overpray', 3)
+        history = [scenes[i % len(scenes)] for i in range(length)]
+        engine.player.history.ids.extend(scene.id_ for scene in history)
+
+        number = max(1, 1000 // length)
+        print(f'history of {length} scenes:')
+
+        legacy = bson.dumps(legacy_state(engine, history))
+        report(
+            'bson, whole scenes',
+            len(legacy),
+            timeit.timeit(lambda: bson.dumps(legacy_state(engine, history)), number=number) / number,
+            timeit.timeit(lambda: [Scene(**item) for item in bson.loads(legacy)['history']], number=number) / number
+        )
+
+        for compress in (False, True):
+            data = saves.dumps(engine.state(), compress)
+            report(
+                f'v{saves.SAVE_VERSION}, ids' + (', zlib' if compress else ''),
+                len(data),
+                timeit.timeit(lambda: saves.dumps(engine.state(), compress), number=number) / number,
+                timeit.timeit(lambda: engine.restore(saves.loads(data)), number=number) / number
+            )
+
+        asyncio.run(engine.enter(engine.player.current.id_))
+
+        with tempfile.TemporaryDirectory() as directory:
+            manager = saves.SaveManager(Path(directory), legacy=None)
+            journal = manager.journal(saves.AUTOSAVE, snapshot_every=10 ** 9)
+            journal.snapshot(engine.state(), 0)
+            before = Journal.mark(engine)
+
+            def append():
+                journal.record(engine, 0, before, engine.state)
+                journal.flush()
+
+            number = 100
+            autosave = timeit.timeit(lambda: manager.save(saves.AUTOSAVE, engine.state()), number=number) / number
+            record = timeit.timeit(append, number=number) / number
+            print(f'  autosave: whole save {autosave * 1000:8.2f} ms, journal record {record * 1000:8.2f} ms')
+
+
+def report(name: str, size: int, save: float, load: float) -> None:
+    print(f'  {name:<20} {size:>10} bytes, save {save * 1000:8.2f} ms, load {load * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Memory benchmark of classes.Scene against the former dataclass with a __dict__ and list fields:
+10000 scenes shaped like the ones of the story, in two languages.
+Run from the repository root: python benchmarks/scenes.py
+"""
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from classes import Scene  # noqa: E402
+
+SCENES = 10000
+LANGUAGES = ('en', 'nl')
+
+
+@dataclass
+class LegacyScene:
+    """
+    Scene as it used to be.
+    """
+    id_: str
+    header: str
+    text: str
+    exits: List[tuple[str, tuple[str, str]]]
+    image: str = ''
+    on_enter: List[tuple[tuple, str]] = field(default_factory=list)
+    if_texts: List[tuple[str, str]] = field(default_factory=list)
+    if_text_additions: List[tuple[str, str]] = field(default_factory=list)
+    if_images: List[tuple[str, str]] = field(default_factory=list)
+    speaker: str = ''
+    if_speakers: List[tuple[str, str]] = field(default_factory=list)
+    enable_formatting: bool = True
+    sanitize: bool = False
+
+
+def story(cls, language: str) -> list:
+    """
+    Builds the scenes of one language. Every string is built at runtime, as separate modules don't share them.
+    """
+    return [
+        cls(
+            id_=f'scene_{i}',
+            header=f'{language} header {i}',
+            text=f'{language} text of the scene {i}',
+            exits=[
+                (f'{language} back', (f'scene_{max(i - 1, 0)}', ''.join(['True']))),
+                (f'{language} forward', (f'scene_{i + 1}', f'"key-{i % 10}" in inventory')),
+            ],
+            on_enter=[
+                (('modifiers', 'add', f'visited-{i % 100}'), ''.join(['True'])),
+            ] if i % 3 == 0 else [],
+            if_texts=[
+                (f'{language} other text {i}', f'"key-{i % 10}" not in inventory'),
+            ] if i % 2 == 0 else [],
+        )
+        for i in range(SCENES)
+    ]
+
+
+def measure(cls) -> int:
+    tracemalloc.start()
+    stories = [story(cls, language) for language in LANGUAGES]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del stories
+
+    return size
+
+
+def main():
+    legacy = measure(LegacyScene)
+    compact = measure(Scene)
+
+    print(f'{SCENES} scenes in {len(LANGUAGES)} languages:')
+    print(f'  dataclass with lists {legacy / 1024 / 1024:8.2f} MiB, {legacy / SCENES / len(LANGUAGES):6.0f} bytes/scene')
+    print(f'  slotted Scene        {compact / 1024 / 1024:8.2f} MiB, {compact / SCENES / len(LANGUAGES):6.0f} bytes/scene')
+    print(f'  saved {(1 - compact / legacy) * 100:.0f}%')
+
+
+if __name__ == '__main__':
+    main()
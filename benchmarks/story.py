@@ -0,0 +1,108 @@
+"""
+Benchmark of loading a story against its size: importing the scene module (and indexing it and compiling
+its conditions, as the game does at startup) against opening its compiled story bundle.
+Memory is the private memory of the process, the mapped bundle is shared between processes.
+Every measurement runs in a fresh interpreter; the module is imported once beforehand, so its .pyc is cached.
+Run from the repository root: python benchmarks/story.py
+"""
+import importlib
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT))
+
+PACKAGE = 'bench_scenes'
+MODULE = f'{PACKAGE}.scenes_big'
+
+CHILD = '''
+import importlib, resource, sys, time
+
+def rss():
+    # Private memory: resident pages minus the shared ones (the pages of a mapped bundle are shared)
+    with open('/proc/self/statm') as file:
+        resident, shared = file.read().split()[1:3]
+
+    return (int(resident) - int(shared)) * resource.getpagesize()
+
+sys.path[:0] = [{root!r}, {directory!r}]
+from conditions import ConditionCache
+from registry import SceneRegistry
+import story
+
+before = rss()
+start = time.perf_counter()
+module = importlib.import_module({module!r}) if {mode!r} == 'source' else story.load_story({module!r})
+registry = SceneRegistry.for_module(module)
+ConditionCache.for_module(module)
+registry['scene_0']
+print(time.perf_counter() - start, rss() - before)
+'''
+
+
+def write_story(path: Path, scenes: int) -> None:
+    lines = ['from classes import Scene', '']
+
+    for i in range(scenes):
+        lines.append(f'''scene_{i} = Scene(
+    id_='scene_{i}',
+    header='Scene {i}',
+    text='The text of the scene {i}, long enough to look like a paragraph of a real story.',
+    exits=[
+        ('Back', ('scene_{max(i - 1, 0)}', 'True')),
+        ('Forward', ('scene_{min(i + 1, scenes - 1)}', '"key-{i % 10}" in inventory')),
+        ('Pray', ('scene_0', 'rnum > {i % 100}')),
+    ],
+    on_enter=[
+        (('modifiers', 'add', 'visited-{i % 100}'), 'True'),
+    ],
+    if_texts=[
+        ('Another text of the scene {i}.', '"visited-{i % 100}" in mods'),
+    ],
+)
+''')
+
+    lines.append('MY_VARS = {}')
+    path.write_text('\n'.join(lines), 'utf-8')
+
+
+def measure(directory: str, mode: str) -> tuple:
+    code = CHILD.format(root=str(ROOT), directory=directory, module=MODULE, mode=mode)
+    seconds, rss = subprocess.run(
+        [sys.executable, '-c', code], check=True, capture_output=True, text=True
+    ).stdout.split()
+
+    return float(seconds), int(rss)
+
+
+def main():
+    from story import compile_story, story_path
+
+    for scenes in (1000, 10000, 50000):
+        with tempfile.TemporaryDirectory() as directory:
+            package = Path(directory) / PACKAGE
+            package.mkdir()
+            (package / '__init__.py').write_text('')
+            write_story(package / 'scenes_big.py', scenes)
+
+            # Caches the .pyc and compiles the bundle
+            measure(directory, 'source')
+            sys.path.insert(0, directory)
+            size = compile_story(importlib.import_module(MODULE), story_path(MODULE))
+            sys.path.remove(directory)
+
+            for name in [name for name in sys.modules if name.startswith(PACKAGE)]:
+                del sys.modules[name]
+
+            print(f'{scenes} scenes (bundle of {size // 1024} KiB):')
+
+            for mode in ('source', 'story'):
+                seconds, rss = measure(directory, mode)
+                print(f'  {mode:<7} load {seconds * 1000:9.2f} ms, private memory +{rss / 1024 / 1024:7.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
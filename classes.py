@@ -1,11 +1,25 @@
+import sys
+from collections import Counter, deque
 from dataclasses import dataclass, field
-from typing import List
+from itertools import islice
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
 
 
-@dataclass
+def _pairs(items: Iterable[Tuple[str, str]]) -> Tuple[Tuple[str, str], ...]:
+    """
+    Converts (value, condition) pairs to a tuple, interning the conditions (they repeat across scenes and languages).
+    """
+    return tuple((value, sys.intern(cond)) for value, cond in items)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
 class Scene:
     """
     A class to represent a scene in the game.
+    Scenes are immutable and compact: the list arguments are stored as tuples (empty ones share the same tuple),
+    and ids, exit targets and conditions are interned, so very large stories in several languages stay small.
+    Scenes compare by identity.
     name — the name of the scene.
     text — the text that will be displayed in the scene.
     exits — a dictionary with the names of the exits and the objs of the scenes to which they lead.
@@ -22,53 +36,282 @@ class Scene:
     id_: str
     header: str
     text: str
-    exits: List[tuple[str, tuple[str, str]]]
+    exits: Sequence[Tuple[str, Tuple[str, str]]]
     image: str = ''
-    on_enter: List[tuple[tuple, str]] = field(default_factory=list)
-    if_texts: List[tuple[str, str]] = field(default_factory=list)
-    if_text_additions: List[tuple[str, str]] = field(default_factory=list)
-    if_images: List[tuple[str, str]] = field(default_factory=list)
+    on_enter: Sequence[Tuple[tuple, str]] = ()
+    if_texts: Sequence[Tuple[str, str]] = ()
+    if_text_additions: Sequence[Tuple[str, str]] = ()
+    if_images: Sequence[Tuple[str, str]] = ()
     speaker: str = ''
-    if_speakers: List[tuple[str, str]] = field(default_factory=list)
+    if_speakers: Sequence[Tuple[str, str]] = ()
     enable_formatting: bool = True
     sanitize: bool = False
 
+    def __post_init__(self):
+        values = {
+            'id_': sys.intern(self.id_),
+            'exits': tuple((label, (sys.intern(target), sys.intern(cond))) for label, (target, cond) in self.exits),
+            'on_enter': tuple(
+                ((sys.intern(target), sys.intern(action_type), item), sys.intern(cond))
+                for (target, action_type, item), cond in self.on_enter
+            ),
+            'if_texts': _pairs(self.if_texts),
+            'if_text_additions': _pairs(self.if_text_additions),
+            'if_images': _pairs(self.if_images),
+            'if_speakers': _pairs(self.if_speakers),
+        }
 
-@dataclass
-class Player:
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+
+class ItemBag:
     """
-    A class to represent a player in the game.
-    name — the name of the player.
-    inventory — a dictionary with the names of the items in the inventory and their quantity.
+    A class to represent items which stack (the inventory, the modifiers).
+    Items are kept as counts, so adding, removing and counting don't depend on how many items there are.
+    It still behaves like the list it replaced: iteration yields every item as many times as there are
+    copies of it, len() is the total number of items, `in`, indexing, count(), append() and remove() work as before.
+    The copies of an item are kept together, in the order the items were first added.
+    counts — the number of copies of every item (items with no copies left are removed).
     """
-    current: Scene = None
-    inventory: List[str] = field(default_factory=list)
-    previous: Scene = None
-    history: List[Scene] = None
+    __slots__ = ('counts', 'total', '_view')
 
-    def inventory_dict(self):
+    def __init__(self, items: Iterable[str] = ()):
+        self.counts: Counter = Counter()
+        self.total = 0
+        self._view: Optional[Mapping[str, int]] = None
+        self.extend(items)
+
+    @classmethod
+    def load(cls, data: Union[Dict[str, int], List[str], None]) -> 'ItemBag':
         """
-        Returns the inventory as a dictionary.
-        :return: Dict[str, int]
+        Creates the bag from the saved counts, or from a list of items (saves made before the counts).
+        :param data: counts by item or list of items
+        :return: ItemBag
+        """
+        bag = cls()
+
+        if isinstance(data, Mapping):
+            for item, count in data.items():
+                bag.add(item, int(count))
+        elif data:
+            bag.extend(data)
+
+        return bag
+
+    def add(self, item: str, count: int = 1) -> None:
+        """
+        Adds copies of the item.
+        :param item: name of the item
+        :param count: number of copies
+        :return: None
+        """
+        if count > 0:
+            self.counts[item] += count
+            self.total += count
+
+    def append(self, item: str) -> None:
+        self.add(item)
+
+    def extend(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def remove(self, item: str, count: int = 1) -> None:
         """
-        if not self.inventory:
-            return {}
+        Removes copies of the item.
+        :param item: name of the item
+        :param count: number of copies
+        :return: None
+        :raises ValueError: if there are fewer copies than removed (nothing is removed then)
+        """
+        have = self.counts.get(item, 0)
+
+        if have < count:
+            raise ValueError(f'{item!r} x{count} is not in the bag')
+
+        if have == count:
+            del self.counts[item]
+        else:
+            self.counts[item] = have - count
+
+        self.total -= count
+
+    def remove_all(self, item: str) -> int:
+        """
+        Removes every copy of the item.
+        :param item: name of the item
+        :return: int — the number of copies removed
+        """
+        count = self.counts.pop(item, 0)
+        self.total -= count
+
+        return count
 
-        result = {}
+    def clear(self) -> None:
+        self.counts.clear()
+        self.total = 0
 
-        for item in self.inventory:
-            if item in result:
-                result[item] += 1
-            else:
-                result[item] = 1
+    def copy(self) -> 'ItemBag':
+        bag = ItemBag.__new__(ItemBag)
+        # Counter.copy() goes through Counter.__init__ and Counter.update(), a plain dict copy is three times as fast
+        bag.counts = counts = Counter.__new__(Counter)
+        dict.update(counts, self.counts)
+        bag.total = self.total
+        bag._view = None
 
-        return result
+        return bag
 
-    def inventory_with_count(self):
+    def count(self, item: str) -> int:
+        return self.counts.get(item, 0)
+
+    def as_dict(self) -> Mapping[str, int]:
+        """
+        Returns a read-only view of the counts (updated along with the bag).
+        :return: Mapping[str, int]
         """
-        Returns the inventory with the quantity of each item removing duplicates (they'll stack).
+        if self._view is None:
+            self._view = MappingProxyType(self.counts)
+
+        return self._view
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.counts
+
+    def __len__(self) -> int:
+        return self.total
+
+    def __iter__(self) -> Iterator[str]:
+        return self.counts.elements()
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        # Indexing walks the bag, like History does; it is only kept for conditions written for the list
+        return list(self.counts.elements())[index]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ItemBag):
+            return self.counts == other.counts
+
+        if isinstance(other, list):
+            return self.counts == Counter(other)
+
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'ItemBag({dict(self.counts)!r})'
+
+
+class History:
+    """
+    A class to represent the scenes the player has visited, most recent last.
+    Only the ids of the last `size` scenes are kept; indexing and iteration still give Scene objects,
+    which are looked up by their ids (so the history follows the language of the game).
+    ids — the ids of the kept scenes (a ring buffer, the oldest ids are dropped).
+    visits — how many times every scene has been visited, including the dropped visits.
+    lookup — returns the scene by its id.
+    """
+    __slots__ = ('ids', 'visits', 'lookup')
+
+    def __init__(self, ids: Iterable[str] = (), size: int = 100, lookup: Callable[[str], Scene] = None,
+                 visits: Mapping[str, int] = None):
+        self.ids: deque = deque(maxlen=max(size, 1))
+        self.visits: Counter = Counter(visits or {})
+        self.lookup = lookup
+
+        for scene_id in ids:
+            self.ids.append(scene_id)
+
+            if visits is None:
+                self.visits[scene_id] += 1
+
+    @property
+    def size(self) -> int:
+        return self.ids.maxlen
+
+    def append(self, scene: Union[Scene, str]) -> None:
+        """
+        Records a visit of the scene.
+        :param scene: Scene or its id
+        :return: None
+        """
+        scene_id = scene if isinstance(scene, str) else scene.id_
+        self.ids.append(scene_id)
+        self.visits[scene_id] += 1
+
+    def visited(self, scene_id: str) -> int:
+        """
+        Returns how many times the scene has been visited.
+        :param scene_id: id of the scene
+        :return: int
+        """
+        return self.visits.get(scene_id, 0)
+
+    def last_ids(self, n: int = 1, skip: int = 0) -> List[str]:
+        """
+        Returns the ids of the last n scenes, oldest first.
+        :param n: number of scenes
+        :param skip: number of the most recent scenes to leave out
         :return: List[str]
         """
-        result = self.inventory_dict()
+        ids = list(islice(reversed(self.ids), skip, skip + n))
+        ids.reverse()
+
+        return ids
 
-        return '\n'.join([f'{k} x{v}' for k, v in result.items()])
+    def last(self, n: int = 1, skip: int = 0) -> List[Scene]:
+        """
+        Returns the last n scenes, oldest first.
+        :param n: number of scenes
+        :param skip: number of the most recent scenes to leave out
+        :return: List[Scene]
+        """
+        return [self.lookup(scene_id) for scene_id in self.last_ids(n, skip)]
+
+    def choice(self, rng, skip: int = 0) -> Scene:
+        """
+        Returns a random kept scene.
+        :param rng: random generator (`random` in conditions)
+        :param skip: number of the most recent scenes to leave out
+        :return: Scene
+        :raises IndexError: if there are no scenes to choose from
+        """
+        if len(self.ids) <= skip:
+            raise IndexError('no scenes to choose from')
+
+        return self.lookup(self.ids[-1 - skip - rng.randrange(len(self.ids) - skip)])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[Scene]:
+        return (self.lookup(scene_id) for scene_id in self.ids)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Scene, List[Scene]]:
+        if isinstance(index, slice):
+            return [self.lookup(scene_id) for scene_id in list(self.ids)[index]]
+
+        return self.lookup(self.ids[index])
+
+    def __repr__(self) -> str:
+        return f'History({list(self.ids)!r})'
+
+
+@dataclass
+class Player:
+    """
+    A class to represent a player in the game.
+    name — the name of the player.
+    inventory — the names of the items in the inventory and their quantity.
+    history — the scenes visited.
+    """
+    current: Scene = None
+    inventory: ItemBag = field(default_factory=ItemBag)
+    previous: Scene = None
+    history: Optional[History] = None
+
+    def inventory_dict(self):
+        """
+        Returns the inventory as a dictionary.
+        :return: Mapping[str, int]
+        """
+        return self.inventory.as_dict()
@@ -0,0 +1,233 @@
+import ast
+from types import CodeType, ModuleType
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from classes import Scene
+
+
+class ConditionError(Exception):
+    """
+    Raised when a condition (or any other evaluated string) of a scene module can't be compiled.
+    """
+
+
+class Condition:
+    """
+    A condition string compiled once into a code object.
+    source — the original condition string.
+    code — the compiled expression (None for statement blocks, which are still run through meval).
+    is_async — whether evaluating the condition returns an awaitable.
+    """
+    __slots__ = ('source', 'code', 'is_async')
+
+    def __init__(self, source: str, filename: str = '<condition>'):
+        self.source = source
+        self.code: Optional[CodeType] = None
+
+        try:
+            tree = ast.parse(source.strip(), filename, 'eval')
+        except SyntaxError as expression_error:
+            # Not an expression, but meval also accepts statement blocks
+            try:
+                ast.parse(source, filename, 'exec')
+            except SyntaxError:
+                raise ConditionError(
+                    f'{filename}: {source!r}: {expression_error.msg}'
+                ) from expression_error
+
+            self.is_async = True
+            return
+
+        self.is_async = any(isinstance(node, ast.Await) for node in ast.walk(tree))
+        self.code = compile(
+            tree,
+            filename,
+            'eval',
+            flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT if self.is_async else 0
+        )
+
+    @classmethod
+    def precompiled(cls, source: str, code: Optional[CodeType], is_async: bool) -> 'Condition':
+        """
+        Returns a condition compiled beforehand (see story.py).
+        :param source: the original condition string
+        :param code: the compiled expression (None for statement blocks)
+        :param is_async: whether evaluating the condition returns an awaitable
+        :return: Condition
+        """
+        condition = cls.__new__(cls)
+        condition.source = source
+        condition.code = code
+        condition.is_async = is_async
+
+        return condition
+
+    def evaluate(self, namespace: Dict[str, Any]) -> Any:
+        """
+        Evaluates the condition against the namespace.
+        Returns an awaitable if the condition is asynchronous.
+        :param namespace: names visible to the condition
+        :return: Any
+        """
+        if self.code is None:
+            # Statement blocks are rare, meval is only imported when one is evaluated
+            from meval import meval
+
+            return meval(
+                self.source,
+                {'__name__': __name__, '__package__': __package__},
+                **{k: v for k, v in namespace.items() if not k.startswith('__')}
+            )
+
+        return eval(self.code, namespace)
+
+
+def iter_scene_sources(name: str, scene: Scene) -> Iterator[Tuple[str, str]]:
+    """
+    Yields every evaluated string of a scene with a label pointing to its origin.
+    :param name: variable name of the scene
+    :param scene: Scene
+    :return: Iterator[Tuple[str, str]]
+    """
+    for i, (_, (target, cond)) in enumerate(scene.exits):
+        yield f'{name}.exits[{i}]', cond
+
+        if target.startswith('!'):
+            yield f'{name}.exits[{i}].target', target[1:]
+
+    for i, ((target, action_type, item), cond) in enumerate(scene.on_enter):
+        yield f'{name}.on_enter[{i}]', cond
+
+        if target == 'variables' and action_type == 'set':
+            yield f'{name}.on_enter[{i}].set', item[1]
+
+    for field_name in ('if_texts', 'if_text_additions', 'if_images', 'if_speakers'):
+        for i, (_, cond) in enumerate(getattr(scene, field_name)):
+            yield f'{name}.{field_name}[{i}]', cond
+
+
+def iter_sources(module: ModuleType) -> Iterator[Tuple[str, str]]:
+    """
+    Yields every evaluated string of a scene module with a label pointing to its origin.
+    :param module: scene module (scenes.scenes_<lang>)
+    :return: Iterator[Tuple[str, str]]
+    """
+    for name, value in vars(module).items():
+        if isinstance(value, Scene):
+            yield from iter_scene_sources(name, value)
+
+    for field_name in ('GLOBAL_ADDITIONS', 'GLOBAL_IMAGES'):
+        for i, (_, cond) in enumerate(getattr(module, field_name, [])):
+            yield f'{field_name}[{i}]', cond
+
+    for var, formula in getattr(module, 'MY_VARS', {}).items():
+        yield f'MY_VARS[{var!r}]', formula
+
+
+class ConditionCache:
+    """
+    Compiled conditions of a single scene module.
+    Every module is compiled once, when it is first requested, so broken conditions
+    are reported at load time instead of in the middle of the game.
+    """
+    _modules: Dict[str, 'ConditionCache'] = {}
+
+    def __init__(self, name: str):
+        self.name = name
+        self.conditions: Dict[str, Condition] = {}
+
+    @classmethod
+    def for_module(cls, module: ModuleType) -> 'ConditionCache':
+        """
+        Returns the cache of the module, compiling it on first use.
+        :param module: scene module
+        :return: ConditionCache
+        """
+        cache = cls._modules.get(module.__name__)
+
+        if cache is None:
+            cache = cls(module.__name__)
+            cache.compile_module(module)
+            cls._modules[module.__name__] = cache
+
+        return cache
+
+    @classmethod
+    def discard(cls, name: str) -> None:
+        """
+        Drops the compiled conditions of the module (when it is unloaded).
+        :param name: name of the scene module
+        :return: None
+        """
+        cls._modules.pop(name, None)
+
+    def compile_module(self, module: ModuleType) -> None:
+        """
+        Compiles every condition of the module, collecting all errors into one exception.
+        :param module: scene module
+        :return: None
+        """
+        errors = []
+
+        for label, source in iter_sources(module):
+            try:
+                self.get(source, f'{module.__name__}.{label}')
+            except ConditionError as e:
+                errors.append(str(e))
+
+        if errors:
+            raise ConditionError('\n'.join(errors))
+
+    def prime(self, conditions: Iterable[Condition]) -> None:
+        """
+        Adds conditions compiled beforehand (the conditions of a story bundle, when their scene is materialized).
+        :param conditions: compiled conditions
+        :return: None
+        """
+        for condition in conditions:
+            self.conditions.setdefault(condition.source, condition)
+
+    def get(self, source: str, filename: str = '<condition>') -> Condition:
+        """
+        Returns the compiled condition, compiling it if it wasn't seen at load time.
+        :param source: condition string
+        :param filename: label used in error messages
+        :return: Condition
+        """
+        condition = self.conditions.get(source)
+
+        if condition is None:
+            condition = self.conditions[source] = Condition(source, filename)
+
+        return condition
+
+    def evaluate(self, source: str, namespace: Dict[str, Any]) -> Any:
+        """
+        Evaluates a condition synchronously (returns an awaitable for asynchronous ones).
+        :param source: condition string
+        :param namespace: names visible to the condition
+        :return: Any
+        """
+        return self.get(source).evaluate(namespace)
+
+    async def select(self, pairs: List[Tuple[Any, str]], namespace: Dict[str, Any]) -> List[Any]:
+        """
+        Returns the values of the (value, condition) pairs whose conditions are met.
+        Only asynchronous conditions are awaited.
+        :param pairs: list of (value, condition) tuples
+        :param namespace: names visible to the conditions
+        :return: List[Any]
+        """
+        result = []
+
+        for value, source in pairs:
+            condition = self.get(source)
+            matched = condition.evaluate(namespace)
+
+            if condition.is_async:
+                matched = await matched
+
+            if matched:
+                result.append(value)
+
+        return result
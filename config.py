@@ -0,0 +1,250 @@
+import importlib.util
+import os
+import tomllib
+from dataclasses import dataclass, field, fields, replace
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+from saves import write_atomic
+
+CONFIG_PATH = Path('config.toml')
+
+# Environment variables overriding the keys of the config file, e.g. QUEST_HISTORY_SIZE=500
+ENV_PREFIX = 'QUEST_'
+
+# Minimal values of the numeric keys
+MINIMUMS = {
+    'prefetch_depth': 0,
+    'prefetch_memory': 0,
+    'render_cache_entries': 1,
+    'render_disk_cache': 0,
+    'resident_languages': 1,
+    'history_size': 1,
+    'save_slots': 1,
+    'journal_snapshot_every': 1,
+}
+
+
+class ConfigError(Exception):
+    """
+    Raised when the config file can't be read or has a wrong key or value.
+    """
+
+
+@dataclass
+class GameConfig:
+    """
+    A class to represent config.toml (see the guide for the keys).
+    The file is read once; values can be overridden with QUEST_<KEY> environment variables, which are never
+    written back. update() changes keys and save() writes the file atomically, only if something has changed.
+    path — the config file.
+    """
+    name: str = ''
+    color: str = 'green'
+    background: str = 'black'
+    utilise_inventory: bool = True
+    utilise_saveload: bool = True
+    language: str = 'en'
+    languages: List[str] = field(default_factory=lambda: ['en'])
+    credits: str = ''
+
+    prefetch_depth: int = 1
+    prefetch_memory: int = 16
+    render_cache_entries: int = 64
+    render_disk_cache: int = 32
+    resident_languages: int = 2
+    history_size: int = 100
+
+    compress_saves: bool = False
+    save_slots: int = 3
+    autosave: bool = True
+    journal: bool = True
+    journal_snapshot_every: int = 50
+
+    path: Optional[Path] = field(default=None, repr=False, compare=False)
+    # Contents of the file (without the environment overrides) and whether they differ from it
+    _data: Dict[str, Any] = field(default_factory=dict, repr=False, compare=False)
+    _changed: bool = field(default=False, repr=False, compare=False)
+
+    @classmethod
+    def keys(cls) -> Dict[str, Any]:
+        """
+        Returns the config keys with their types.
+        :return: Dict[str, Any]
+        """
+        return {f.name: f.type for f in fields(cls) if f.name != 'path' and not f.name.startswith('_')}
+
+    @classmethod
+    def load(cls, path: Path = CONFIG_PATH, environ: Mapping[str, str] = None) -> 'GameConfig':
+        """
+        Reads and validates the config file, applying the environment overrides.
+        :param path: Path to the config file
+        :param environ: environment variables (os.environ by default)
+        :return: GameConfig
+        :raises ConfigError: if the file can't be read or is invalid
+        """
+        path = Path(path)
+
+        try:
+            data = tomllib.loads(path.read_text('utf-8'))
+        except (OSError, tomllib.TOMLDecodeError) as e:
+            raise ConfigError(f'{path}: {e}') from e
+
+        keys = cls.keys()
+        unknown = set(data) - set(keys)
+
+        if unknown:
+            raise ConfigError(f'{path}: unknown keys: {", ".join(sorted(unknown))}')
+
+        values = {key: check(key, value, keys[key]) for key, value in data.items()}
+        environ = os.environ if environ is None else environ
+
+        for key, kind in keys.items():
+            variable = ENV_PREFIX + key.upper()
+
+            if variable in environ:
+                values[key] = parse_env(variable, environ[variable], kind)
+
+        config = cls(**values, path=path, _data=data)
+        config.validate()
+
+        return config
+
+    def validate(self) -> None:
+        """
+        Checks the values which depend on each other or on the game files.
+        :return: None
+        :raises ConfigError: if a value is invalid
+        """
+        from textual.color import Color, ColorParseError
+
+        for key, minimum in MINIMUMS.items():
+            if getattr(self, key) < minimum:
+                raise ConfigError(f'{key} must be at least {minimum}, not {getattr(self, key)}')
+
+        for key in ('color', 'background'):
+            try:
+                Color.parse(getattr(self, key))
+            except ColorParseError as e:
+                raise ConfigError(f'{key}: {e}') from e
+
+        if not self.languages:
+            raise ConfigError('languages must not be empty')
+
+        from story import story_path
+
+        for lang in self.languages:
+            name = f'scenes.scenes_{lang}'
+
+            if not story_path(name).is_file() and importlib.util.find_spec(name) is None:
+                raise ConfigError(f'languages: there is no scenes/scenes_{lang}.py')
+
+        if self.language not in self.languages:
+            raise ConfigError(f'language {self.language!r} is not one of the languages {self.languages}')
+
+    def update(self, **changes: Any) -> bool:
+        """
+        Changes keys of the config (save() writes them into the file).
+        A change which is only valid together with the environment overrides (e.g. a language added by
+        QUEST_LANGUAGES) takes effect, but isn't written: the file has to load on its own.
+        :param changes: new values by key
+        :return: bool — whether the changes will be written into the file
+        :raises ConfigError: if a key is unknown or a value is invalid
+        """
+        keys = self.keys()
+        unknown = set(changes) - set(keys)
+
+        if unknown:
+            raise ConfigError(f'unknown keys: {", ".join(sorted(unknown))}')
+
+        # Validating a copy, so an invalid change leaves the config as it was
+        changes = {key: check(key, value, keys[key]) for key, value in changes.items()}
+        replace(self, **changes).validate()
+
+        for key, value in changes.items():
+            setattr(self, key, value)
+
+        data = {**self._data, **changes}
+
+        try:
+            type(self)(**data).validate()
+        except ConfigError:
+            return False
+
+        if data != self._data:
+            self._data = data
+            self._changed = True
+
+        return True
+
+    def save(self) -> bool:
+        """
+        Writes the changed keys into the config file atomically. Does nothing if nothing has changed.
+        :return: bool — whether the file was written
+        :raises ConfigError: if the file would be invalid without the environment overrides
+        """
+        if not self._changed or self.path is None:
+            return False
+
+        # The file has to load on its own, without the environment overrides of this run
+        type(self)(**self._data).validate()
+
+        import tomli_w
+
+        write_atomic(self.path, tomli_w.dumps(self._data).encode('utf-8'))
+        self._changed = False
+
+        return True
+
+
+def check(key: str, value: Any, kind: Any) -> Any:
+    """
+    Checks the type of the value of the key.
+    :param key: config key
+    :param value: value
+    :param kind: type of the key (bool, int, str or List[str])
+    :return: Any — the value
+    :raises ConfigError: if the value has a wrong type
+    """
+    if kind is bool:
+        valid, name = isinstance(value, bool), 'true or false'
+    elif kind is int:
+        valid, name = isinstance(value, int) and not isinstance(value, bool), 'an integer'
+    elif kind is str:
+        valid, name = isinstance(value, str), 'a string'
+    else:
+        valid, name = isinstance(value, list) and all(isinstance(item, str) for item in value), 'a list of strings'
+
+    if not valid:
+        raise ConfigError(f'{key} must be {name}, not {value!r}')
+
+    return value
+
+
+def parse_env(variable: str, value: str, kind: Any) -> Any:
+    """
+    Converts the value of an environment variable to the type of its key.
+    :param variable: name of the variable
+    :param value: value of the variable
+    :param kind: type of the key
+    :return: Any
+    :raises ConfigError: if the value can't be converted
+    """
+    if kind is bool:
+        if value.lower() in ('1', 'true', 'yes', 'on'):
+            return True
+        if value.lower() in ('0', 'false', 'no', 'off'):
+            return False
+
+        raise ConfigError(f'{variable} must be true or false, not {value!r}')
+
+    if kind is int:
+        try:
+            return int(value)
+        except ValueError as e:
+            raise ConfigError(f'{variable} must be an integer, not {value!r}') from e
+
+    if kind is str:
+        return value
+
+    return [item.strip() for item in value.split(',') if item.strip()]
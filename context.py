@@ -0,0 +1,62 @@
+import random
+from typing import Any, Dict
+
+
+class EvalContext:
+    """
+    A class to represent the names visible to conditions, formatting and MY_VARS formulas
+    during a single scene transition.
+    The context is built once per transition; invdict and modsdict are read-only views of the counts,
+    invalidate() rebinds the names after an action has changed (or replaced) the underlying state.
+    owner — an object with player, modifiers and variables attributes (the game).
+    rng — the random generator exposed as `random` (the random module by default).
+    namespace — the dictionary conditions are evaluated against.
+    """
+
+    def __init__(self, owner, scenes, system, my_vars: Dict[str, str], rng=random, random_number: int = None):
+        self.owner = owner
+        self.namespace: Dict[str, Any] = {
+            'scenes': scenes,
+            'random': rng,
+            'rnum': rng.randint(0, 100) if random_number is None else random_number,
+            'SYS': system,
+            'MY': my_vars,
+        }
+
+        self.invalidate(inventory=True, modifiers=True, variables=True)
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self.__dict__['namespace'][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def invalidate(self, inventory: bool = False, modifiers: bool = False, variables: bool = False) -> None:
+        """
+        Refreshes the parts of the namespace which could have been changed.
+        :param inventory: player's inventory was changed
+        :param modifiers: modifiers were changed
+        :param variables: variables were changed (or replaced)
+        :return: None
+        """
+        namespace = self.namespace
+        namespace['player'] = self.owner.player
+
+        if inventory:
+            namespace['inventory'] = self.owner.player.inventory
+            namespace['invdict'] = self.owner.player.inventory_dict()
+
+        if modifiers:
+            namespace['mods'] = self.owner.modifiers
+            namespace['modsdict'] = self.owner.modifiers_dict()
+
+        if variables:
+            namespace['vars'] = self.owner.variables
+
+    def format(self, text: str) -> str:
+        """
+        Formats the text with the names of the context.
+        :param text: text to format
+        :return: str
+        """
+        return text.format_map(self.namespace)
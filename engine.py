@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import importlib
+import random
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import scenes
+from actions import ActionBatch, ActionError
+from classes import History, ItemBag, Player, Scene
+from context import EvalContext
+from registry import SceneRegistry
+from resolver import PhaseTimer, ResolvedScene, SceneResolver
+from saves import SaveError, pack_random, unpack_random
+
+
+class ChoiceError(Exception):
+    """
+    Raised when a step takes an exit the current scene doesn't have.
+    """
+
+
+@dataclass
+class SceneCollection:
+    RESTART: Scene
+
+
+SYSTEM_SCENES = SceneCollection(
+    RESTART=Scene(
+        id_='RESTART',
+        header='RESTART',
+        text='RESTART',
+        exits=[],
+        on_enter=[
+            (('game', 'restart', ''), 'True')
+        ]
+    )
+)
+
+
+class Engine:
+    """
+    A class to run the game without any UI.
+    It keeps the game state, resolves scenes and runs on_enter actions; the game actions which need
+    a UI (notify, save, load, destroy, exit) are passed to the handler, and so are the failed actions (error).
+    module — scene module (scenes.scenes_<lang>).
+    random — the random generator conditions see as `random` (seeded for reproducible runs).
+    handler — async callable receiving (action type, item), returns False if it has taken over.
+    history_size — how many visited scenes player.history keeps.
+    resolved — the current scene resolved against the state (None if the game screen was destroyed).
+    finished — whether the game was exited.
+    """
+
+    def __init__(self, module: ModuleType, seed: Any = None, timer: PhaseTimer = None,
+                 handler: Callable[[str, Any], Awaitable[bool]] = None, history_size: int = 100):
+        self.resolver = SceneResolver(module, timer)
+        self.random = random.Random(seed)
+        self.handler = handler or self.headless_handler
+        self.history_size = history_size
+
+        self.player = Player()
+        self.player.history = self.new_history()
+        self.modifiers = ItemBag()
+        self.variables: Dict[str, Any] = {}
+
+        self.resolved: Optional[ResolvedScene] = None
+        self.context: Optional[EvalContext] = None
+        self.finished = False
+        self.restarts = 0
+        self.notifications: List[str] = []
+        self.saved: Optional[dict] = None
+
+    @property
+    def module(self) -> ModuleType:
+        return self.resolver.module
+
+    @module.setter
+    def module(self, module: ModuleType) -> None:
+        if module is not self.resolver.module:
+            self.resolver = SceneResolver(module, self.resolver.timer)
+
+    @property
+    def registry(self) -> SceneRegistry:
+        return self.resolver.registry
+
+    def switch_module(self, module: ModuleType) -> str:
+        """
+        Switches to another scene module (language) keeping the game state: the current and the previous
+        scenes and the history are remapped to the scenes with the same ids.
+        :param module: scene module to switch to
+        :return: str — the id of the current scene in the new module ('first' if it has no such scene)
+        """
+        self.module = module
+        registry = self.registry
+
+        if self.player.current is not None:
+            self.player.current = registry.get(self.player.current.id_) or registry['first']
+
+        if self.player.previous is not None:
+            self.player.previous = registry.get(self.player.previous.id_)
+
+        history = self.player.history
+        history.ids = deque((i for i in history.ids if i in registry), maxlen=history.size)
+
+        return self.player.current.id_ if self.player.current else 'first'
+
+    def scene(self, scene_id: str) -> Scene:
+        """
+        Returns the scene of the current module by its id.
+        :param scene_id: id of the scene
+        :return: Scene
+        """
+        return self.registry[scene_id]
+
+    def new_history(self, ids: Iterable[str] = (), visits: Mapping[str, int] = None) -> History:
+        """
+        Returns a history resolving its ids through the current module.
+        :param ids: ids of the visited scenes, oldest first
+        :param visits: visit counts (counted from the ids if None)
+        :return: History
+        """
+        return History(ids, self.history_size, self.scene, visits)
+
+    def modifiers_dict(self):
+        """
+        Returns the modifiers as a dictionary.
+        :return: Mapping[str, int]
+        """
+        return self.modifiers.as_dict()
+
+    def reset(self) -> None:
+        """
+        Resets the game state (the random generator keeps going).
+        :return: None
+        """
+        self.player = Player()
+        self.player.history = self.new_history()
+        self.modifiers = ItemBag()
+        self.variables = {}
+        self.resolved = None
+        self.finished = False
+
+    def state(self) -> dict:
+        """
+        Returns the game state in the save format (see saves.py): scene ids, counts, variables
+        and the state of the random generator.
+        :return: dict
+        """
+        return {
+            'current': self.player.current.id_,
+            'inventory': dict(self.player.inventory.counts),
+            'previous': self.player.previous.id_ if self.player.previous else '',
+            'modifiers': dict(self.modifiers.counts),
+            'variables': dict(self.variables),
+            'history': list(self.player.history.ids),
+            'visits': dict(self.player.history.visits),
+            'random': pack_random(self.random)
+        }
+
+    def check(self, data: dict) -> None:
+        """
+        Checks that the saved state can be restored into the current story.
+        :param data: saved state
+        :return: None
+        :raises SaveError: if the story no longer has the scene the save was made in
+        """
+        if data['current'] not in self.registry:
+            raise SaveError(f'the save was made in the scene {data["current"]!r}, which the story no longer has')
+
+    def restore(self, data: dict) -> None:
+        """
+        Restores the game state from the save format (the current scene has to be entered afterwards).
+        Older saves have to be upgraded with saves.migrate first (saves.loads does it).
+        The previous scene and the history skip scenes removed from the story since the save was made.
+        :param data: saved state
+        :return: None
+        :raises SaveError: if the story no longer has the current scene (the state is left as it was)
+        """
+        self.check(data)
+        registry = self.registry
+
+        self.player.current = registry[data['current']]
+        self.player.inventory = ItemBag.load(data['inventory'])
+        self.player.previous = registry.get(data['previous']) if data['previous'] else None
+        self.modifiers = ItemBag.load(data['modifiers'])
+        self.variables = dict(data['variables'])
+        self.player.history = self.new_history(
+            [i for i in data['history'] if i in registry], data.get('visits')
+        )
+
+        if data.get('random'):
+            unpack_random(self.random, data['random'])
+
+    def available_exits(self) -> List[Tuple[int, str, str]]:
+        """
+        Returns the visible exits of the current scene as (index in the scene, label, target) tuples.
+        :return: List[Tuple[int, str, str]]
+        """
+        return self.resolved.exits if self.resolved else []
+
+    async def enter(self, target: str = 'first', run_actions: bool = False, random_number: int = None) -> bool:
+        """
+        Enters the scene and resolves it into self.resolved.
+        :param target: id of the scene or !expression
+        :param run_actions: whether to run on_enter actions of the scene
+        :param random_number: rnum of the transition (drawn from the random generator if None)
+        :return: bool — False if an action has taken over (goto, restart, load, etc.)
+        """
+        resolver = self.resolver
+        context = EvalContext(self, scenes, SYSTEM_SCENES, resolver.my_vars, self.random, random_number)
+
+        self.player.current = await resolver.target(target, context)
+        await resolver.update_variables(context)
+
+        resolved = await resolver.resolve(self.player.current, context)
+
+        if run_actions:
+            try:
+                taken_over = not await self.run_actions(context)
+            except ActionError as e:
+                # The changes of the failed batch are dropped, the scene is shown without them
+                await self.handler('error', str(e))
+                taken_over = False
+
+            if taken_over:
+                return False
+
+        self.resolved = await resolver.resolve_exits(resolved, context)
+        self.context = context
+
+        return True
+
+    async def step(self, choice_index: int) -> Optional[ResolvedScene]:
+        """
+        Takes one of the available exits.
+        :param choice_index: position of the exit in available_exits()
+        :return: Optional[ResolvedScene] — the scene the game is in afterwards
+        :raises ChoiceError: if there is no such exit (the game is left as it was)
+        """
+        exits = self.available_exits()
+
+        if not 0 <= choice_index < len(exits):
+            scene_id = self.player.current.id_ if self.player.current else None
+            raise ChoiceError(f'there is no exit {choice_index} in {scene_id}, it has {len(exits)} exits')
+
+        _, _, target = exits[choice_index]
+        self.player.previous = self.player.current
+
+        if target == 'EXIT':
+            self.finished = True
+            await self.handler('exit', '')
+            return self.resolved
+
+        if await self.enter(target, run_actions=True):
+            self.player.history.append(self.player.current)
+
+        return self.resolved
+
+    async def run_actions(self, context: EvalContext) -> bool:
+        """
+        Runs on_enter actions of the current scene as one batch (see actions.ActionBatch): their conditions
+        see the state the scene was entered with and their changes are committed at once.
+        :param context: context of the transition
+        :return: bool — False if an action has taken over (goto, restart, load, etc.)
+        """
+        actions = self.resolver.actions.get(self.player.current)
+
+        # Most scenes have no actions, there is nothing to snapshot then
+        return await ActionBatch(self, context).run(actions) if actions else True
+
+    async def headless_handler(self, action_type: str, item: Any) -> bool:
+        """
+        Handles the UI game actions without a UI: notifications are collected, saves are kept in memory,
+        failed actions are raised (so playthroughs and the explorer report them).
+        :param action_type: notify, save, load, destroy, exit or error
+        :param item: item of the action (the message for error)
+        :return: bool — False if the action has taken over
+        :raises ActionError: for error
+        """
+        if action_type == 'error':
+            raise ActionError(item)
+
+        if action_type == 'notify':
+            self.notifications.append(item if isinstance(item, str) else ' '.join(item))
+
+        elif action_type == 'save':
+            self.saved = self.state()
+
+        elif action_type == 'load' and self.saved:
+            self.restore(self.saved)
+            await self.enter(self.saved['current'])
+            return False
+
+        return True
+
+
+async def playthrough(module: ModuleType, seed: Any, max_steps: int, script: List[int] = None) -> Tuple[str, int]:
+    """
+    Plays the game once, choosing exits by the script or at random.
+    A playthrough ends when the game is exited or restarted, when there are no exits, or after max_steps.
+    :param module: scene module
+    :param seed: seed of both the game and the choices
+    :param max_steps: maximal number of steps
+    :param script: positions of the exits to take, in order (random choices if None)
+    :return: Tuple[str, int] — the id of the final scene and the number of steps taken
+    :raises ChoiceError: if an exit of the script isn't available (the message names the step)
+    """
+    engine = Engine(module, seed)
+    chooser = random.Random(seed)
+    await engine.enter()
+
+    for steps in range(max_steps):
+        exits = engine.available_exits()
+
+        if engine.finished or not exits or (script is not None and steps >= len(script)):
+            return engine.player.current.id_, steps
+
+        scene_id = engine.player.current.id_
+
+        try:
+            await engine.step(script[steps] if script is not None else chooser.randrange(len(exits)))
+        except ChoiceError as e:
+            raise ChoiceError(f'step {steps + 1}: {e}') from e
+
+        if engine.restarts:
+            return scene_id, steps + 1
+
+    return engine.player.current.id_, max_steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs headless playthroughs of the game.')
+    parser.add_argument('--language', default='en', help='language of the scenes module')
+    parser.add_argument('--runs', type=int, default=1000, help='number of playthroughs')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first playthrough')
+    parser.add_argument('--max-steps', type=int, default=200, help='maximal steps per playthrough')
+    parser.add_argument('--script', help='comma-separated exit positions to take instead of random ones')
+    args = parser.parse_args()
+
+    module = importlib.import_module(f'scenes.scenes_{args.language}')
+    script = [int(i) for i in args.script.split(',')] if args.script else None
+
+    async def run_all():
+        results = []
+
+        for run in range(args.runs):
+            try:
+                results.append(await playthrough(module, args.seed + run, args.max_steps, script))
+            except ChoiceError as e:
+                raise ChoiceError(f'run {run + 1} (seed {args.seed + run}), {e}') from e
+
+        return results
+
+    start = time.perf_counter()
+
+    try:
+        results = asyncio.run(run_all())
+    except ChoiceError as e:
+        print(f'Bad script: {e}')
+        exit(1)
+
+    elapsed = time.perf_counter() - start
+
+    endings = Counter(scene_id for scene_id, _ in results)
+    steps = sum(count for _, count in results)
+
+    print(f'{args.runs} playthroughs, {steps} steps in {elapsed:.2f} s')
+    print(f'{args.runs / elapsed:.0f} playthroughs/s, {steps / elapsed:.0f} steps/s')
+
+    for scene_id, count in endings.most_common():
+        print(f'{scene_id}: {count}')
+
+
+if __name__ == '__main__':
+    main()
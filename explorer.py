@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import importlib
+import multiprocessing
+import os
+import pickle
+import time
+from collections import Counter
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from classes import ItemBag
+from engine import Engine
+from registry import SceneRegistry
+
+# (scene id, previous scene id, inventory counts, modifier counts, variables)
+State = Tuple[str, str, tuple, tuple, tuple]
+
+_module: Optional[ModuleType] = None
+
+
+def canonical(engine: Engine) -> State:
+    """
+    Returns the state of the engine in a hashable form which doesn't depend on the order of items.
+    History isn't a part of the state: it only matters for !expressions and is kept separately.
+    :param engine: Engine
+    :return: State
+    """
+    return (
+        engine.player.current.id_,
+        engine.player.previous.id_ if engine.player.previous else '',
+        tuple(sorted(engine.player.inventory.counts.items())),
+        tuple(sorted(engine.modifiers.counts.items())),
+        tuple(sorted((k, v if isinstance(v, (int, float, str, bool, type(None))) else repr(v))
+                     for k, v in engine.variables.items())),
+    )
+
+
+def restore(engine: Engine, state: State, history: List[str]) -> None:
+    """
+    Puts the engine into the state.
+    :param engine: Engine
+    :param state: canonical state
+    :param history: ids of the scenes visited on the way to the state
+    :return: None
+    """
+    scene_id, previous_id, inventory, modifiers, variables = state
+    registry = engine.registry
+
+    engine.player.current = registry[scene_id]
+    engine.player.previous = registry[previous_id] if previous_id else None
+    engine.player.inventory = ItemBag.load(dict(inventory))
+    engine.player.history = engine.new_history(history)
+    engine.modifiers = ItemBag.load(dict(modifiers))
+    engine.variables = dict(variables)
+
+
+def _init_worker(language: str) -> None:
+    global _module
+    _module = importlib.import_module(f'scenes.scenes_{language}')
+
+
+async def _expand(module: ModuleType, state: State, history: List[str], samples: int) -> dict:
+    """
+    Takes every visible exit of the state with several random seeds.
+    :return: dict with the visible exits, the children, the endings and the errors of the state
+    """
+    result = {'exits': set(), 'children': [], 'endings': [], 'errors': []}
+    for sample in range(samples):
+        engine = Engine(module, seed=f'{state!r}/{sample}')
+        restore(engine, state, history)
+
+        try:
+            await engine.enter(state[0])
+        except Exception as e:
+            result['errors'].append((state[0], None, repr(e)))
+            continue
+
+        exits = engine.available_exits()
+
+        for position, (index, _, _) in enumerate(exits):
+            result['exits'].add(index)
+
+            # The same seed as the parent's, so the child draws the same rnum and sees the same exits:
+            # positions only mean the same exit in the same exit list
+            child = Engine(module, seed=f'{state!r}/{sample}')
+            restore(child, state, history)
+
+            try:
+                await child.enter(state[0])
+
+                if child.available_exits() != exits:
+                    raise RuntimeError('the exits differ between runs with the same seed')
+
+                await child.step(position)
+            except Exception as e:
+                result['errors'].append((state[0], index, repr(e)))
+                continue
+
+            if child.restarts:
+                result['endings'].append((state[0], 'restart'))
+            elif child.finished:
+                result['endings'].append((state[0], 'exit'))
+            elif child.resolved is not None:
+                result['children'].append((canonical(child), list(child.player.history.ids)))
+
+    return result
+
+
+def expand_chunk(chunk: List[Tuple[State, List[str]]], samples: int) -> List[Tuple[State, dict]]:
+    """
+    Expands a part of the frontier (runs in a worker process).
+    :param chunk: list of (state, history) tuples
+    :param samples: number of random seeds every exit is taken with
+    :return: List[Tuple[State, dict]]
+    """
+    async def run():
+        return [(state, await _expand(_module, state, history, samples)) for state, history in chunk]
+
+    return asyncio.run(run())
+
+
+def explore(language: str = 'en', max_depth: int = 50, memory_mb: int = 256, samples: int = 3,
+            processes: int = None) -> dict:
+    """
+    Breadth-first search over the game states reachable from the first scene.
+    Visited states are deduplicated by their canonical form; the frontier of each depth is split
+    across a process pool. Exits depending on random are taken with several seeds.
+    :param language: language of the scenes module
+    :param max_depth: maximal number of transitions from the first scene
+    :param memory_mb: approximate memory budget of the visited states and of the frontier (the states waiting
+        to be expanded, with the histories kept alongside them), measured by their pickled size
+    :param samples: number of random seeds every exit is taken with
+    :param processes: size of the process pool (CPU count by default)
+    :return: dict with the report
+    """
+    module = importlib.import_module(f'scenes.scenes_{language}')
+
+    async def first():
+        engine = Engine(module, seed=0)
+        await engine.enter()
+        return canonical(engine)
+
+    start = asyncio.run(first())
+    visited: Set[State] = {start}
+    budget = memory_mb * 1024 * 1024
+    # Pickled sizes of the visited states and of the histories of the frontier being expanded
+    used = len(pickle.dumps(start))
+    frontier_used = len(pickle.dumps([]))
+    frontier = [(start, [])]
+
+    scenes_seen: Set[str] = {start[0]}
+    exits_seen: Set[Tuple[str, int]] = set()
+    dead_ends: Set[str] = set()
+    endings: Counter = Counter()
+    errors: Dict[Tuple[str, Any], str] = {}
+    depth = 0
+    truncated = False
+
+    workers = processes or os.cpu_count() or 1
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(language,)) as pool:
+        while frontier and depth < max_depth and not truncated:
+            size = max(1, len(frontier) // (workers * 4))
+            chunks = [frontier[i:i + size] for i in range(0, len(frontier), size)]
+            next_frontier = []
+            next_used = 0
+
+            for expanded in pool.starmap(expand_chunk, [(chunk, samples) for chunk in chunks]):
+                for state, result in expanded:
+                    exits_seen.update((state[0], index) for index in result['exits'])
+
+                    if not result['exits'] and not result['errors']:
+                        dead_ends.add(state[0])
+
+                    endings.update(result['endings'])
+
+                    for scene_id, index, error in result['errors']:
+                        errors.setdefault((scene_id, index), error)
+
+                    for child, history in result['children']:
+                        if child in visited:
+                            continue
+
+                        state_size = len(pickle.dumps(child))
+                        history_size = len(pickle.dumps(history))
+
+                        if used + state_size + frontier_used + next_used + history_size > budget:
+                            truncated = True
+                            break
+
+                        used += state_size
+                        next_used += history_size
+                        visited.add(child)
+                        scenes_seen.add(child[0])
+                        next_frontier.append((child, history))
+
+            frontier = next_frontier
+            frontier_used = next_used
+            depth += 1
+
+    registry = SceneRegistry.for_module(module)
+    all_scenes = set(registry.ids())
+    all_exits = {(scene.id_, index) for scene in registry for index in range(len(scene.exits))}
+
+    return {
+        'states': len(visited),
+        'depth': depth,
+        'complete': not frontier and not truncated,
+        'unreachable': sorted(all_scenes - scenes_seen),
+        'unused_exits': sorted(all_exits - exits_seen),
+        'dead_ends': sorted(dead_ends),
+        'endings': endings,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Explores every reachable state of the story.')
+    parser.add_argument('--language', default='en', help='language of the scenes module')
+    parser.add_argument('--max-depth', type=int, default=50, help='maximal number of transitions')
+    parser.add_argument('--memory', type=int, default=256, help='memory budget of visited and frontier states, MiB')
+    parser.add_argument('--samples', type=int, default=3, help='random seeds every exit is taken with')
+    parser.add_argument('--processes', type=int, default=None, help='size of the process pool')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = explore(args.language, args.max_depth, args.memory, args.samples, args.processes)
+    elapsed = time.perf_counter() - start
+
+    print(f'{report["states"]} states, depth {report["depth"]} in {elapsed:.2f} s'
+          + ('' if report['complete'] else ' (stopped by the depth limit or the memory budget)'))
+    print(f'Unreachable scenes: {", ".join(report["unreachable"]) or "none"}')
+    print(f'Dead ends: {", ".join(report["dead_ends"]) or "none"}')
+    print(f'Exits never shown: {", ".join(f"{s}.exits[{i}]" for s, i in report["unused_exits"]) or "none"}')
+    print('Endings:')
+
+    for (scene_id, kind), count in report['endings'].most_common():
+        print(f'  {scene_id} ({kind}): {count}')
+
+    for (scene_id, index), error in report['errors'].items():
+        print(f'Error in {scene_id}' + (f'.exits[{index}]' if index is not None else '') + f': {error}')
+
+
+if __name__ == '__main__':
+    main()
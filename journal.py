@@ -0,0 +1,283 @@
+import argparse
+import asyncio
+import importlib
+import json
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from saves import SAVE_VERSION, write_atomic
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+JOURNAL_VERSION = 1
+
+# (inventory counts, modifier counts, variables) before a transition
+Mark = Tuple[Dict[str, int], Dict[str, int], Dict[str, Any]]
+
+
+class JournalError(Exception):
+    """
+    Raised when a journal can't be read or its replay doesn't reproduce the recorded transitions.
+    """
+
+
+def counts_delta(before: Mapping[str, int], after: Mapping[str, int]) -> Dict[str, int]:
+    """
+    Returns how the counts changed.
+    :param before: counts before the transition
+    :param after: counts after the transition
+    :return: Dict[str, int] — differences of the changed counts
+    """
+    delta = {item: count - before.get(item, 0) for item, count in after.items() if count != before.get(item, 0)}
+    delta.update({item: -count for item, count in before.items() if item not in after})
+
+    return delta
+
+
+class Journal:
+    """
+    A class to write an append-only journal of the transitions of a save slot.
+    The journal starts with a snapshot of the game state; every transition then appends a small record
+    (the position of the exit taken, rnum of the transition and the changes of the inventory, the modifiers and
+    the variables). Every `snapshot_every` transitions the journal is compacted into a new snapshot, which bounds
+    both its size and the replay time. Records are only used to check the replay: transitions are deterministic
+    given the state of the random generator, so replaying the exits reproduces the game exactly.
+    Writes are done in order by a single background thread.
+    path — the journal file (JSON lines).
+    snapshot_every — how many records are appended before the journal is compacted.
+    on_snapshot — called (in the writer thread) with the snapshot record after it is written.
+    """
+
+    def __init__(self, path: Path, snapshot_every: int = 50,
+                 on_snapshot: Callable[[Dict[str, Any]], None] = None):
+        self.path = Path(path)
+        self.snapshot_every = max(snapshot_every, 1)
+        self.on_snapshot = on_snapshot
+        self.count = 0
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix='journal')
+
+    @staticmethod
+    def mark(engine: 'Engine') -> Mark:
+        """
+        Remembers what a transition can change, to be passed to record() afterwards.
+        :param engine: Engine
+        :return: Mark
+        """
+        return dict(engine.player.inventory.counts), dict(engine.modifiers.counts), dict(engine.variables)
+
+    def snapshot(self, state: Dict[str, Any], random_number: int, language: str = '') -> Future:
+        """
+        Replaces the journal with a snapshot of the game state.
+        :param state: game state (Engine.state(), may have playtime)
+        :param random_number: rnum of the transition the state was reached with
+        :param language: language of the game
+        :return: Future
+        """
+        record = {
+            'v': JOURNAL_VERSION,
+            'snapshot': {'version': SAVE_VERSION, **state},
+            'rnum': random_number,
+            'language': language,
+            'at': time.time(),
+        }
+        self.count = 0
+
+        return self.executor.submit(self._write_snapshot, record)
+
+    def _write_snapshot(self, record: Dict[str, Any]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.path, (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8'))
+
+        if self.on_snapshot:
+            self.on_snapshot(record)
+
+    def record(self, engine: 'Engine', position: int, before: Mark, state: Callable[[], Dict[str, Any]],
+               language: str = '', playtime: float = None) -> Future:
+        """
+        Appends the record of a transition, or compacts the journal into a snapshot when it is due.
+        :param engine: Engine after the transition
+        :param position: position of the exit taken in available_exits()
+        :param before: Journal.mark() from before the transition
+        :param state: returns the game state for the snapshot (with playtime)
+        :param language: language of the game
+        :param playtime: how long the game has been played
+        :return: Future
+        """
+        if self.count + 1 >= self.snapshot_every:
+            return self.snapshot(state(), engine.context.rnum, language)
+
+        inventory, modifiers, variables = before
+        record: Dict[str, Any] = {'exit': position, 'scene': engine.player.current.id_, 'rnum': engine.context.rnum}
+
+        for key, delta in (
+            ('inv', counts_delta(inventory, engine.player.inventory.counts)),
+            ('mods', counts_delta(modifiers, engine.modifiers.counts)),
+            ('vars', {k: v for k, v in engine.variables.items() if k not in variables or variables[k] != v}),
+            ('unset', [k for k in variables if k not in engine.variables]),
+        ):
+            if delta:
+                record[key] = delta
+
+        if playtime is not None:
+            record['t'] = playtime
+
+        record['at'] = time.time()
+        self.count += 1
+
+        return self.executor.submit(self._append, json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+
+    def _append(self, line: str) -> None:
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(line + '\n')
+
+    def flush(self) -> None:
+        """
+        Waits until everything submitted is written.
+        :return: None
+        """
+        self.executor.submit(lambda: None).result()
+
+    @staticmethod
+    def read(path: Path) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Reads the snapshot and the records of the journal.
+        A truncated last line (the game was killed in the middle of appending) is ignored.
+        :param path: Path to the journal
+        :return: Tuple[Dict[str, Any], List[Dict[str, Any]]]
+        """
+        try:
+            lines = Path(path).read_text('utf-8').splitlines()
+        except OSError as e:
+            raise JournalError(f'can\'t read the journal: {e}') from e
+
+        records = []
+
+        for number, line in enumerate(lines):
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                if number == len(lines) - 1:
+                    break
+
+                raise JournalError(f'the journal is corrupted at line {number + 1}') from e
+
+        if not records or 'snapshot' not in records[0]:
+            raise JournalError('the journal has no snapshot')
+
+        if records[0].get('v', 0) > JOURNAL_VERSION:
+            raise JournalError('the journal was made by a newer version of the game')
+
+        return records[0], records[1:]
+
+    @staticmethod
+    def tail(path: Path) -> Optional[Dict[str, Any]]:
+        """
+        Returns the last complete record of the journal (or its snapshot), reading only the end of the file.
+        :param path: Path to the journal
+        :return: Optional[Dict[str, Any]]
+        """
+        try:
+            with open(path, 'rb') as file:
+                file.seek(0, 2)
+                size = file.tell()
+                file.seek(max(0, size - 8192))
+                lines = file.read().splitlines()
+        except OSError:
+            return None
+
+        for line in reversed(lines):
+            try:
+                return json.loads(line)
+            except ValueError:
+                continue
+
+        return None
+
+
+async def replay(engine: 'Engine', snapshot: Dict[str, Any], records: List[Dict[str, Any]],
+                 on_step: Callable[[int, Dict[str, Any]], None] = None) -> int:
+    """
+    Restores the snapshot into the engine and replays the recorded transitions, checking every one of them.
+    :param engine: Engine (its handler gets the game actions of the replayed scenes)
+    :param snapshot: the snapshot record of the journal
+    :param records: the transition records of the journal
+    :param on_step: called with the number and the record of every replayed transition
+    :return: int — number of transitions replayed
+    :raises JournalError: if a transition doesn't match its record (the engine is left after that transition)
+    """
+    state = snapshot['snapshot']
+    engine.restore(state)
+
+    # Entering the saved scene again must not move the random generator on
+    rng = engine.random.getstate()
+    await engine.enter(state['current'], random_number=snapshot.get('rnum'))
+    engine.random.setstate(rng)
+
+    for number, record in enumerate(records, 1):
+        before = Journal.mark(engine)
+        exits = engine.available_exits()
+
+        if record['exit'] >= len(exits):
+            raise JournalError(f'transition {number}: there is no exit {record["exit"]} in {engine.player.current.id_}')
+
+        await engine.step(record['exit'])
+
+        expected = {
+            'scene': record['scene'],
+            'rnum': record['rnum'],
+            'inv': record.get('inv', {}),
+            'mods': record.get('mods', {}),
+            'vars': record.get('vars', {}),
+            'unset': record.get('unset', []),
+        }
+        actual = {
+            'scene': engine.player.current.id_,
+            'rnum': engine.context.rnum if engine.context else None,
+            'inv': counts_delta(before[0], engine.player.inventory.counts),
+            'mods': counts_delta(before[1], engine.modifiers.counts),
+            'vars': {k: v for k, v in engine.variables.items() if k not in before[2] or before[2][k] != v},
+            'unset': [k for k in before[2] if k not in engine.variables],
+        }
+
+        for key, value in expected.items():
+            if actual[key] != value:
+                raise JournalError(f'transition {number}: {key} is {actual[key]!r}, the journal has {value!r}')
+
+        if on_step:
+            on_step(number, record)
+
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays a save journal headlessly, checking every transition.')
+    parser.add_argument('journal', type=Path, help='path to the journal (saves/<slot>.journal)')
+    parser.add_argument('--language', help='language of the scenes module (the one of the snapshot by default)')
+    args = parser.parse_args()
+
+    from engine import Engine
+
+    snapshot, records = Journal.read(args.journal)
+    language = args.language or snapshot.get('language') or 'en'
+    engine = Engine(importlib.import_module(f'scenes.scenes_{language}'))
+
+    def show(number: int, record: Dict[str, Any]) -> None:
+        changes = ', '.join(f'{key}={record[key]}' for key in ('inv', 'mods', 'vars', 'unset') if key in record)
+        print(f'{number:>5}: exit {record["exit"]} -> {record["scene"]}' + (f' ({changes})' if changes else ''))
+
+    print(f'snapshot: {snapshot["snapshot"]["current"]}, {len(records)} transitions')
+
+    try:
+        asyncio.run(replay(engine, snapshot, records, show))
+    except JournalError as e:
+        print(f'Replay diverged: {e}')
+        exit(1)
+
+    print(f'Replayed, the game is in {engine.player.current.id_}')
+
+
+if __name__ == '__main__':
+    main()
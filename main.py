@@ -1,54 +1,83 @@
-import tomli_w
+import time
+
+# Startup is measured from here, before the imports (python main.py --startup-timings)
+STARTUP_BEGIN = time.perf_counter()
+
 from textual import work
+from textual.worker import get_current_worker
 from textual.app import App, ComposeResult
 from textual.containers import Horizontal, Vertical
 from textual.screen import Screen, ModalScreen
 from textual.widget import Widget
 from textual.widgets import Footer, Label, Button
+from datetime import datetime
 from pathlib import Path
-import random
-from dataclasses import dataclass
+import asyncio
+import sys
 
 from textual.reactive import reactive
 
-from classes import Player, Scene
-from utils import reduce, image_to_block_art
+from actions import ActionError, ActionTable
+from config import ConfigError, GameConfig
+from engine import Engine
+from journal import Journal, JournalError, replay
+from registry import SceneRegistry
+from resolver import PhaseTimer
+from manifest import AssetManifest
+from render import BUNDLE, Prefetcher, RenderCache, build_assets, iter_images
+import saves
 
-import tomllib
-import bson
 
-import scenes
+class StartupTimer:
+    """
+    A class to measure the phases of the startup (python main.py --startup-timings).
+    begin — when the startup began (time.perf_counter()).
+    phases — durations of the phases in seconds, in order; every phase lasts since the end of the previous one.
+    """
 
-from meval import meval
+    def __init__(self, begin: float):
+        self.begin = begin
+        self.end = begin
+        self.phases = {}
 
-from rich.markup import escape
+    def mark(self, phase: str) -> None:
+        """
+        Ends the phase.
+        :param phase: name of the phase
+        :return: None
+        """
+        now = time.perf_counter()
+        self.phases[phase] = now - self.end
+        self.end = now
 
-CONFIG = tomllib.loads(Path('config.toml').read_text('utf-8'))
+    def report(self) -> str:
+        """
+        Returns the durations of the phases and of the whole startup, one per line.
+        :return: str
+        """
+        lines = [f'{phase:<12} {seconds * 1000:8.1f} ms' for phase, seconds in self.phases.items()]
+        lines.append(f'{"total":<12} {(self.end - self.begin) * 1000:8.1f} ms')
 
-COLOR = CONFIG['color']
-BACKGROUND = CONFIG['background']
-UTILISE_INVENTORY = CONFIG['utilise_inventory']
-UTILISE_SAVELOAD = CONFIG['utilise_saveload']
-GAME_NAME = CONFIG['name']
-CREDITS = CONFIG['credits']
+        return '\n'.join(lines)
 
 
-@dataclass
-class SceneCollection:
-    RESTART: Scene
+STARTUP = StartupTimer(STARTUP_BEGIN)
+STARTUP.mark('import')
 
+CONFIG = GameConfig.load()
+
+COLOR = CONFIG.color
+BACKGROUND = CONFIG.background
+UTILISE_INVENTORY = CONFIG.utilise_inventory
+UTILISE_SAVELOAD = CONFIG.utilise_saveload
+GAME_NAME = CONFIG.name
+CREDITS = CONFIG.credits
+
+SAVES = saves.SaveManager(slots=CONFIG.save_slots, compress=CONFIG.compress_saves)
+AUTOSAVE = CONFIG.autosave
+JOURNAL = CONFIG.journal
+JOURNAL_SNAPSHOT_EVERY = CONFIG.journal_snapshot_every
 
-SYSTEM_SCENES = SceneCollection(
-    RESTART=Scene(
-        id_='RESTART',
-        header='RESTART',
-        text='RESTART',
-        exits=[],
-        on_enter=[
-            (('game', 'restart', ''), 'True')
-        ]
-    )
-)
 
 COLORS = {
     'back': BACKGROUND,
@@ -56,11 +85,36 @@ COLORS = {
     'img': COLOR
 }
 
-LANGUAGES = CONFIG['languages']
+LANGUAGES = CONFIG.languages
+
+TIMER = PhaseTimer()
+
+MANIFEST = AssetManifest()
+RENDER_CACHE = RenderCache(
+    memory_entries=CONFIG.render_cache_entries,
+    disk_bytes=CONFIG.render_disk_cache * 1024 * 1024,
+    memory_bytes=CONFIG.prefetch_memory * 1024 * 1024,
+    manifest=MANIFEST
+)
+PREFETCHER = Prefetcher(
+    RENDER_CACHE,
+    depth=CONFIG.prefetch_depth,
+    memory_bytes=CONFIG.prefetch_memory * 1024 * 1024 // 2
+)
+
+SceneRegistry.resident = CONFIG.resident_languages
+STARTUP.mark('config')
+
+# Indexing scenes and compiling conditions and actions of the configured language right away, so broken ones are
+# reported before the game starts (other languages are loaded when the player switches to them)
+ActionTable.for_module(SceneRegistry.for_language(CONFIG.language).module)
+STARTUP.mark('scenes')
 
 
 class ImageBar(Widget):
-    image = reactive('', recompose=True)
+    image = reactive('')
+
+    PLACEHOLDER = '...'
 
     def compose(self) -> ComposeResult:
         yield Horizontal(
@@ -71,20 +125,71 @@ class ImageBar(Widget):
             id='image'
         )
 
+    def watch_image(self, image: str) -> None:
+        if self.is_mounted:
+            self.query_one(Label).update(image)
 
-class MainText(Widget):
-    text = reactive('', recompose=True)
-    inventory = reactive('', recompose=True)
-    speaker = reactive('', recompose=True)
+    def show(self, path: Path = None) -> None:
+        """
+        Shows the image, rendering it in a worker thread if it isn't cached yet.
+        Until the art is ready the placeholder is displayed.
+        :param path: Path to the image (None to clear)
+        :return: None
+        """
+        if path is None:
+            self.workers.cancel_group(self, 'image')
+            self.image = ''
+            return
 
-    def compose(self) -> ComposeResult:
-        text = self.text
+        art = RENDER_CACHE.peek(path)
+
+        if art is not None:
+            self.workers.cancel_group(self, 'image')
+            self.image = art
+            return
+
+        self.image = self.PLACEHOLDER
+        self.render_image(path)
 
+    @work(thread=True, exclusive=True, group='image')
+    def render_image(self, path: Path) -> None:
+        start = time.perf_counter()
+        art = RENDER_CACHE.get(path)
+
+        # The player could have already moved on to another scene
+        if not get_current_worker().is_cancelled:
+            self.app.call_from_thread(self.rendered, art, time.perf_counter() - start)
+
+    def rendered(self, art: str, seconds: float) -> None:
+        """
+        Shows the art rendered by the worker and adds the render time to the timings of the transition.
+        :param art: block art
+        :param seconds: how long rendering took
+        :return: None
+        """
+        self.image = art
+        TIMER.add_late('render', seconds)
+        self.log(render=f'{seconds * 1000:.2f} ms')
+
+
+class MainText(Widget):
+    text = reactive('')
+    inventory = reactive('')
+    speaker = reactive('')
+
+    def full_text(self) -> str:
+        """
+        Returns the text with the speaker above it.
+        :return: str
+        """
         if self.speaker:
-            text = f'[underline2]{self.speaker}[/]\n\n{text}'
+            return f'[underline2]{self.speaker}[/]\n\n{self.text}'
+
+        return self.text
 
+    def compose(self) -> ComposeResult:
         text_widget = Label(
-            text,
+            self.full_text(),
             classes='text width75 center height100',
             id='text'
         )
@@ -105,6 +210,44 @@ class MainText(Widget):
                 Button(id='x', classes='no-display')
             )
 
+    def update_labels(self) -> None:
+        """
+        Updates the existing labels in place (before mount compose picks the values up).
+        :return: None
+        """
+        if not self.is_mounted:
+            return
+
+        self.query_one('#text', Label).update(self.full_text())
+
+        if UTILISE_INVENTORY:
+            self.query_one('#inventory', Label).update(self.inventory)
+
+    def show(self, text: str, speaker: str, inventory: str = None) -> None:
+        """
+        Shows the scene's text, speaker and inventory with a single update.
+        :param text: text of the scene
+        :param speaker: name of the speaker
+        :param inventory: inventory listing (unchanged if None)
+        :return: None
+        """
+        self.set_reactive(MainText.text, text)
+        self.set_reactive(MainText.speaker, speaker)
+
+        if inventory is not None:
+            self.set_reactive(MainText.inventory, inventory)
+
+        self.update_labels()
+
+    def watch_text(self) -> None:
+        self.update_labels()
+
+    def watch_inventory(self) -> None:
+        self.update_labels()
+
+    def watch_speaker(self) -> None:
+        self.update_labels()
+
 
 class CreditsScreen(Screen):
     def compose(self) -> ComposeResult:
@@ -134,12 +277,30 @@ class LangScreen(ModalScreen[str]):
         )
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
-        lang = event.button.id.split('_')[1]
-        config = tomllib.loads(Path('config.toml').read_text('utf-8'))
-        config['language'] = lang
-        Path('config.toml').write_text(tomli_w.dumps(config))
-        self.notify(eval(f'scenes.scenes_{lang}.RESTART_NEEDED'))
-        self.dismiss(lang)
+        self.dismiss(event.button.id.split('_')[1])
+
+
+class SlotScreen(ModalScreen[str]):
+    """Screen to allow user to choose a save slot."""
+    def __init__(self, slots: list[tuple[str, str]], back: str):
+        super().__init__()
+        self.slots = slots
+        self.back = back
+
+    def compose(self) -> ComposeResult:
+        yield Vertical(
+            *(
+                Button(
+                    label,
+                    id=f'slot_{slot}',
+                ) for slot, label in self.slots
+            ),
+            Button(self.back, id='slot-back'),
+            classes='height100 center'
+        )
+
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        self.dismiss('' if event.button.id == 'slot-back' else event.button.id.split('_', 1)[1])
 
 
 class QuestApp(App):
@@ -253,34 +414,61 @@ class QuestApp(App):
     }
     """
 
-    player = Player()
-    player.history = []
-    modifiers = []
-    variables = {}
+    BINDINGS = [
+        ('f3', 'timings', 'Timings'),
+        ('f4', 'language', 'Language'),
+    ]
+
+    # Constants of the language module the static buttons are labelled with
+    BUTTON_LABELS = {
+        'start': 'START',
+        'load-mainscreen': 'LOAD',
+        'credits': 'CREDITS',
+        'lang': 'LANGUAGE',
+        'exit': 'EXIT',
+        'save': 'SAVE_SHORT',
+        'load': 'LOAD_SHORT',
+    }
 
-    def __init__(self):
+    def __init__(self, startup_timings: bool = False):
         super().__init__()
 
+        # Exit as soon as the startup is over (python main.py --startup-timings)
+        self.startup_timings = startup_timings
         self.languages = LANGUAGES
-        config = tomllib.loads(Path('config.toml').read_text('utf-8'))
-        self.language = config['language']
+        self.start_playtime()
+        self.journal = SAVES.journal(saves.AUTOSAVE, JOURNAL_SNAPSHOT_EVERY) if AUTOSAVE and JOURNAL else None
+        # Set when the whole state has been replaced (a new game, a load): the journal can't follow it with a record,
+        # it starts anew with the next transition, so the old autosave is kept until the player makes a move
+        self.state_replaced = False
+        self.language = CONFIG.language
+
+        self.engine = Engine(
+            self.registry.module,
+            timer=TIMER,
+            handler=self.game_action,
+            history_size=CONFIG.history_size
+        )
 
-    def modifiers_dict(self):
+    @property
+    def registry(self) -> SceneRegistry:
+        return SceneRegistry.for_language(self.language)
+
+    def inventory_listing(self, invdict: dict) -> str:
         """
-        Returns the modifiers as a dictionary.
-        :return: Dict[str, int]
+        Returns the inventory with localised item names, one item per line.
+        :param invdict: inventory as a dictionary of counts
+        :return: str
         """
-        if not self.modifiers:
-            return {}
-
-        result = {}
-        for item in self.modifiers:
-            if item in result:
-                result[item] += 1
-            else:
-                result[item] = 1
+        items_loctable = self.registry.constant('ITEMS')
 
-        return result
+        return '\n'.join(
+            [
+                f'{items_loctable[k]} x{v}'
+                for k, v in
+                invdict.items()
+            ]
+        ) if invdict else self.registry.constant('EMPTY')
 
     NOTIFICATION_TIMEOUT = 2
 
@@ -289,6 +477,249 @@ class QuestApp(App):
         self.screen.styles.border = ('heavy', self.colors['text'])
         self.screen.styles.align = ('center', 'middle')
 
+        TIMER.hooks.append(self.log_timings)
+        self.call_after_refresh(self.first_paint)
+
+    def first_paint(self) -> None:
+        """
+        Runs once the main menu has been painted: the assets are only indexed and the banner is only rendered now,
+        so they don't hold the menu back.
+        :return: None
+        """
+        STARTUP.mark('first paint')
+        self.load_assets()
+
+    @work(thread=True, exclusive=True, group='banner')
+    def load_assets(self) -> None:
+        MANIFEST.refresh()
+        missing, unused = MANIFEST.check(iter_images(self.registry.module))
+
+        if missing:
+            self.call_from_thread(
+                self.notify, f'Missing assets: {", ".join(missing)}', severity='warning', timeout=10
+            )
+
+        if unused:
+            self.log(unused_assets=unused)
+
+        banner_file = MANIFEST.banner()
+        art = RENDER_CACHE.get(banner_file) if banner_file else ''
+        self.call_from_thread(self.show_banner, art)
+
+    def show_banner(self, art: str) -> None:
+        """
+        Fills the banner in, if the main menu is still shown.
+        :param art: block art of the banner ('' if there is none)
+        :return: None
+        """
+        STARTUP.mark('banner')
+
+        for banner in self.query('#banner'):
+            banner.image = art
+            banner.display = bool(art)
+
+        if self.startup_timings:
+            self.exit()
+
+    def log_timings(self, scene_id: str, durations: dict) -> None:
+        self.log(scene=scene_id, **{phase: f'{seconds * 1000:.2f} ms' for phase, seconds in durations.items()})
+
+    def action_timings(self) -> None:
+        """Shows how long the phases of the last transition took."""
+        self.notify(TIMER.report(), title='Timings', timeout=10)
+
+    def action_language(self) -> None:
+        """Lets the player switch the language, in the menu or in the middle of the game."""
+        if len(self.languages) > 1:
+            self.push_screen(LangScreen(languages=self.languages), callback=self.switch_language)
+
+    async def switch_language(self, lang: str) -> None:
+        """
+        Switches the language without restarting: the current scene is shown again in the new language
+        and the labels of the static buttons are updated in place.
+        :param lang: language to switch to
+        :return: None
+        """
+        if not lang or lang == self.language:
+            return
+
+        self.language = lang
+        current = self.engine.switch_module(self.registry.module)
+
+        if CONFIG.update(language=lang):
+            self.write_config()
+        else:
+            self.notify(f'{lang} is only available through the environment, it is not saved', severity='warning')
+
+        for button_id, constant in self.BUTTON_LABELS.items():
+            for button in self.query(f'#{button_id}'):
+                button.label = self.registry.constant(constant)
+
+        if self.engine.resolved is not None and self.query(MainText):
+            await self.compose_game_screen(current)
+
+            if not self.state_replaced:
+                self.journal_snapshot()
+
+        self.set_focus(self.query_one('.no-display'))
+
+    def start_playtime(self, playtime: float = 0.0) -> None:
+        self.playtime_base = playtime
+        self.session_start = time.monotonic()
+
+    def playtime(self) -> float:
+        return self.playtime_base + time.monotonic() - self.session_start
+
+    def game_state(self) -> dict:
+        """
+        Returns the game state to save, with the playtime.
+        :return: dict
+        """
+        return {**self.engine.state(), 'playtime': self.playtime()}
+
+    def slot_label(self, slot: str, info: saves.SlotInfo | None) -> str:
+        """
+        Returns the label of the slot: the scene, when it was saved and the playtime.
+        :param slot: name of the slot
+        :param info: metadata of the slot (None if it is empty)
+        :return: str
+        """
+        if info is None:
+            return f'{slot}: {self.registry.constant("EMPTY")}'
+
+        scene = self.registry.get(info.scene)
+        played = int(info.playtime)
+
+        return (
+            f'{slot}: {scene.header if scene else info.scene} — '
+            f'{datetime.fromtimestamp(info.timestamp):%Y-%m-%d %H:%M} — '
+            f'{played // 3600}:{played // 60 % 60:02}:{played % 60:02}'
+        )
+
+    async def choose_slot(self, saving: bool) -> str:
+        """
+        Lets the player choose a slot (the autosave and the checkpoint can only be loaded).
+        :param saving: whether the slot is chosen to save into
+        :return: str — name of the slot ('' if the player went back)
+        """
+        index = await asyncio.to_thread(SAVES.index)
+        names = SAVES.names()
+
+        if not saving:
+            names = [slot for slot in (saves.AUTOSAVE, saves.CHECKPOINT) if slot in index] + names
+
+        return await self.push_screen_wait(
+            SlotScreen(
+                [(slot, self.slot_label(slot, index.get(slot))) for slot in names],
+                self.registry.constant('BACK', 'Back')
+            )
+        )
+
+    async def write_save(self, slot: str) -> bool:
+        """
+        Saves the game into the slot in a background thread.
+        :param slot: name of the slot
+        :return: bool — whether the game was saved
+        """
+        try:
+            await asyncio.to_thread(SAVES.save, slot, self.game_state())
+        except OSError as e:
+            self.notify(str(e), severity='error')
+            return False
+
+        return True
+
+    async def read_save(self, slot: str) -> dict | None:
+        """
+        Reads the save of the slot in a background thread (saves of older versions are upgraded),
+        notifying the player if it can't be read.
+        :param slot: name of the slot
+        :return: dict | None
+        """
+        try:
+            data = await asyncio.to_thread(SAVES.load, slot)
+        except (OSError, saves.SaveError) as e:
+            self.notify(str(e), severity='error')
+            return None
+
+        self.start_playtime(data.get('playtime', 0.0))
+
+        return data
+
+    async def restore_game(self, data: dict) -> bool:
+        """
+        Restores the loaded state into the engine, replaying the journal of the save if it has one.
+        Notifies the player if the save doesn't fit the story any more (the game is left as it was then).
+        :param data: loaded state
+        :return: bool — whether the state was restored
+        """
+        journal = data.pop('journal', None)
+
+        try:
+            self.engine.check(data)
+        except saves.SaveError as e:
+            self.notify(str(e), severity='error')
+            return False
+
+        if journal is None:
+            self.engine.restore(data)
+            return True
+
+        # Game actions of the replayed scenes have already been shown when they were played
+        handler = self.engine.handler
+        self.engine.handler = self.engine.headless_handler
+
+        try:
+            await replay(self.engine, journal['snapshot'], journal['records'])
+        except (JournalError, saves.SaveError, ActionError, KeyError) as e:
+            # KeyError: a scene of the journal was removed from the story
+            self.notify(str(e), severity='error')
+            self.engine.restore(data)
+        finally:
+            self.engine.handler = handler
+
+        return True
+
+    @work(thread=True, exclusive=True, group='config')
+    def write_config(self) -> None:
+        try:
+            CONFIG.save()
+        except (OSError, ConfigError) as e:
+            self.call_from_thread(self.notify, str(e), severity='error')
+
+    @work(thread=True, exclusive=True, group='autosave')
+    def autosave(self, state: dict) -> None:
+        try:
+            SAVES.save(saves.AUTOSAVE, state)
+        except OSError as e:
+            self.call_from_thread(self.notify, str(e), severity='error')
+
+    def journal_snapshot(self) -> None:
+        """
+        Starts the autosave journal anew from the current state.
+        :return: None
+        """
+        if self.journal and self.engine.context:
+            self.journal.snapshot(self.game_state(), self.engine.context.rnum, self.language)
+
+    def autosave_step(self, position: int, before) -> None:
+        """
+        Autosaves after a transition: appends it to the journal, or rewrites the whole autosave without one.
+        :param position: position of the exit taken
+        :param before: Journal.mark() from before the transition
+        :return: None
+        """
+        if not AUTOSAVE:
+            return
+
+        if self.journal is None:
+            self.autosave(self.game_state())
+        elif self.state_replaced:
+            self.journal_snapshot()
+            self.state_replaced = False
+        else:
+            self.journal.record(self.engine, position, before, self.game_state, self.language, self.playtime())
+
     async def destroy(self) -> None:
         buttons = self.query(Button)
 
@@ -340,243 +771,27 @@ class QuestApp(App):
         except Exception:
             pass
 
-    async def compose_game_screen(self, screen_id: str = 'first'):
-        random_number = random.randint(0, 100)
-
-        self.player.current = await meval(
-            f'scenes.scenes_{self.language}.{screen_id}'
-            if screen_id[0] != '!' else screen_id[1:],
-            globals(),
-            scenes=scenes,
-            player=self.player,
-            random=random,
-            SYS=SYSTEM_SCENES
-        )
-
-        my_vars = eval(f'scenes.scenes_{self.language}.MY_VARS')
-
-        for var, formula in my_vars.items():
-            self.variables[var] = await meval(
-                formula,
-                globals(),
-                player=self.player,
-                mods=self.modifiers,
-                modsdict=self.modifiers_dict(),
-                vars=self.variables,
-                scenes=scenes,
-                inventory=self.player.inventory,
-                invdict=self.player.inventory_dict(),
-                random=random,
-                rnum=random_number,
-                SYS=SYSTEM_SCENES
-            )
-
-        image_bar = ImageBar(classes='height60', id='image-bar')
-
-        await self.mount(image_bar)
-
-        main_text = MainText(classes='height25')
-
-        text = self.player.current.text
-
-        for t, cond in self.player.current.if_texts:
-            if await meval(
-                    cond,
-                    globals(),
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars
-            ):
-                text = t
-
-        text += '\n'
-
-        for t, cond in self.player.current.if_text_additions:
-            if await meval(
-                    cond,
-                    globals(),
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars
-            ):
-                text += '\n' + t
-
-        for t, cond in eval(f'scenes.scenes_{self.language}.GLOBAL_ADDITIONS'):
-            if await meval(
-                    cond,
-                    globals(),
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars
-            ):
-                text += '\n' + t
-
-        img = self.player.current.image
-
-        for t, cond in self.player.current.if_images:
-            if await meval(
-                    cond,
-                    globals(),
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars
-            ):
-                img = t
-
-        for t, cond in eval(f'scenes.scenes_{self.language}.GLOBAL_IMAGES'):
-            if await meval(
-                    cond,
-                    globals(),
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars
-            ):
-                img = t
-
-        image_bar.image = image_to_block_art(
-            reduce(Path('assets') / Path(img), 400)
-        ) if self.player.current.image else ''
-
-        speaker = self.player.current.speaker
-
-        for t, cond in self.player.current.if_speakers:
-            if await meval(
-                cond,
-                globals(),
-                player=self.player,
-                mods=self.modifiers,
-                modsdict=self.modifiers_dict(),
-                vars=self.variables,
-                scenes=scenes,
-                inventory=self.player.inventory,
-                invdict=self.player.inventory_dict(),
-                random=random,
-                rnum=random_number,
-                SYS=SYSTEM_SCENES,
-                MY=my_vars
-            ):
-                speaker = t
-
-        items_loctable = eval(f'scenes.scenes_{self.language}.ITEMS')
-        main_text.inventory = '\n'.join(
-            [
-                f'{items_loctable[k]} x{v}'
-                for k, v in
-                self.player.inventory_dict().items()
-            ]
-        ) if self.player.inventory_dict() else eval(f'scenes.scenes_{self.language}.EMPTY')
-
-        if self.player.current.sanitize:
-            text = escape(text)
-
-        if self.player.current.enable_formatting:
-            text = text.format(
-                player=self.player,
-                mods=self.modifiers,
-                modsdict=self.modifiers_dict(),
-                vars=self.variables,
-                scenes=scenes,
-                inventory=self.player.inventory,
-                invdict=self.player.inventory_dict(),
-                random=random,
-                rnum=random_number,
-                SYS=SYSTEM_SCENES,
-                MY=my_vars
-            )
-
-        main_text.text = text
-        main_text.speaker = speaker
-
-        await self.mount(main_text)
-
-        if UTILISE_INVENTORY:
-            main_text.inventory = self.player.inventory_with_count()
+    async def mount_game_screen(self) -> None:
+        """
+        Mounts the game layout (image, text and the exits bar) unless it is already there.
+        :return: None
+        """
+        if self.query(MainText):
+            return
 
-        choices = [
-            Button(
-                k.format(
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars
-                ) if self.player.current.enable_formatting else k,
-                id=f'button{i}'
-            ) for i, (k, (v, cond)) in enumerate(self.player.current.exits)
-            if await meval(
-                cond,
-                globals(),
-                player=self.player,
-                mods=self.modifiers,
-                modsdict=self.modifiers_dict(),
-                vars=self.variables,
-                scenes=scenes,
-                inventory=self.player.inventory,
-                invdict=self.player.inventory_dict(),
-                random=random,
-                rnum=random_number,
-                SYS=SYSTEM_SCENES,
-                MY=my_vars
-            )
-        ]
+        await self.mount(ImageBar(classes='height60', id='image-bar'))
+        await self.mount(MainText(classes='height25'))
 
         if UTILISE_SAVELOAD:
             await self.mount(
                 Horizontal(
                     Horizontal(
-                        *choices,
                         classes='center width80',
                         id='buttons'
                     ),
                     Vertical(
-                        Button(eval(f'scenes.scenes_{self.language}.SAVE_SHORT'), id='save', classes='margin0'),
-                        Button(eval(f'scenes.scenes_{self.language}.LOAD_SHORT'), id='load', classes='margin0'),
+                        Button(self.registry.constant('SAVE_SHORT'), id='save', classes='margin0'),
+                        Button(self.registry.constant('LOAD_SHORT'), id='load', classes='margin0'),
                         classes='center width20 no-padding',
                         id='save-load'
                     ),
@@ -587,23 +802,90 @@ class QuestApp(App):
         else:
             await self.mount(
                 Horizontal(
-                    *choices,
                     classes='center height15',
                     id='buttons'
                 )
             )
 
-    def compose(self) -> ComposeResult:
-        banner = ImageBar(classes='height60', id='image-bar')
+    async def reconcile_exits(self, labels: list[str]) -> None:
+        """
+        Shows the exit buttons reusing the existing ones: they are relabelled in place,
+        and only the difference is mounted or removed.
+        Button ids are positions of the exits in engine.available_exits().
+        :param labels: labels of the visible exits
+        :return: None
+        """
+        bar = self.query_one('#buttons')
+        buttons = list(bar.query_children(Button))
+
+        for button, label in zip(buttons, labels):
+            button.label = label
+
+        if len(buttons) > len(labels):
+            await bar.remove_children(buttons[len(labels):])
+        elif len(labels) > len(buttons):
+            await bar.mount(
+                *(
+                    Button(label, id=f'button{slot}')
+                    for slot, label in enumerate(labels)
+                    if slot >= len(buttons)
+                )
+            )
+
+    async def compose_game_screen(self, screen_id: str = 'first') -> None:
+        """
+        Enters the scene (without on_enter actions) and shows it.
+        :param screen_id: id of the scene or !expression
+        :return: None
+        """
+        await self.engine.enter(screen_id)
+        await self.show_scene()
 
-        for file in Path('assets').rglob('*'):
-            if file.is_file() and file.suffix in ['.png', '.jpg', '.jpeg'] and file.name.split('.')[0] == 'banner':
-                banner.image = image_to_block_art(
-                    reduce(file, 400)
+    async def show_scene(self) -> None:
+        """
+        Shows the scene the engine is in, mounting the game layout if needed.
+        :return: None
+        """
+        resolved = self.engine.resolved
+
+        self.prefetch([target for _, _, target in resolved.exits])
+
+        with TIMER.measure('mount'):
+            await self.mount_game_screen()
+
+        with self.batch_update():
+            # Only a cached art is shown right away, the render time is added by the worker (render)
+            with TIMER.measure('images'):
+                self.query_one(ImageBar).show(MANIFEST.file(resolved.image, wait=False) if resolved.image else None)
+
+            with TIMER.measure('mount'):
+                self.query_one(MainText).show(
+                    resolved.text,
+                    resolved.speaker,
+                    self.inventory_listing(self.engine.context.invdict)
                 )
+                await self.reconcile_exits([label for _, label, _ in resolved.exits])
 
-        if banner.image:
-            yield banner
+        TIMER.finish(resolved.scene.id_)
+
+    @work(thread=True, exclusive=True, group='prefetch')
+    def prefetch(self, targets: list[str]) -> None:
+        """
+        Renders the images of the scenes behind the visible exits in the background.
+        :param targets: ids of the target scenes
+        :return: None
+        """
+        if PREFETCHER.depth < 1:
+            return
+
+        worker = get_current_worker()
+        PREFETCHER.run(self.engine.module, targets, lambda: worker.is_cancelled)
+
+    def compose(self) -> ComposeResult:
+        # Filled in by load_assets() after the menu is painted
+        banner = ImageBar(classes='height60', id='banner')
+        banner.display = False
+        yield banner
 
         if GAME_NAME:
             yield Label(
@@ -613,7 +895,7 @@ class QuestApp(App):
 
         children = [
             Button(
-                eval(f'scenes.scenes_{self.language}.START'),
+                self.registry.constant('START'),
                 classes='margin0',
                 id='start',
             )
@@ -622,7 +904,7 @@ class QuestApp(App):
         if UTILISE_SAVELOAD:
             children.append(
                 Button(
-                    eval(f'scenes.scenes_{self.language}.LOAD'),
+                    self.registry.constant('LOAD'),
                     classes='margin0',
                     id='load-mainscreen',
                 )
@@ -631,7 +913,7 @@ class QuestApp(App):
         if CREDITS:
             children.append(
                 Button(
-                    eval(f'scenes.scenes_{self.language}.CREDITS'),
+                    self.registry.constant('CREDITS'),
                     classes='margin0',
                     id='credits',
                 )
@@ -640,7 +922,7 @@ class QuestApp(App):
         if len(self.languages) > 1:
             children.append(
                 Button(
-                    eval(f'scenes.scenes_{self.language}.LANGUAGE'),
+                    self.registry.constant('LANGUAGE'),
                     classes='margin0',
                     id='lang',
                 )
@@ -648,7 +930,7 @@ class QuestApp(App):
 
         children.append(
             Button(
-                eval(f'scenes.scenes_{self.language}.EXIT'),
+                self.registry.constant('EXIT'),
                 classes='margin0',
                 id='exit',
             )
@@ -664,7 +946,7 @@ class QuestApp(App):
         yield nd
         nd.focus()
 
-        self.player.current = eval(f'scenes.scenes_{self.language}.first')
+        self.engine.player.current = self.registry['first']
 
         yield Footer()
 
@@ -673,7 +955,6 @@ class QuestApp(App):
     @work
     async def on_button_pressed(self, event: Button.Pressed):
         button = event.button
-        random_number = random.randint(0, 100)
 
         if button.id == 'exit':
             exit(0)
@@ -689,505 +970,126 @@ class QuestApp(App):
             return
 
         if button.id == 'start':
+            self.start_playtime()
             await self.destroy()
             await self.compose_game_screen()
+            self.state_replaced = True
             self.set_focus(self.query_one('.no-display'))
             return
 
         if button.id == 'save':
-            data = {
-                'current': self.player.current.id_,
-                'inventory': self.player.inventory,
-                'previous': self.player.previous.id_ if self.player.previous else '',
-                'modifiers': self.modifiers,
-                'variables': self.variables,
-                'history': [item.__dict__ for item in self.player.history]
-            }
-
-            data_dumped = bson.dumps(data)
-            Path('save.json').write_bytes(data_dumped)
-
-            self.notify(await meval(f'scenes.scenes_{self.language}.SAVED', globals(), scenes=scenes))
+            slot = await self.choose_slot(saving=True)
+
+            if slot and await self.write_save(slot):
+                self.notify(self.registry.constant('SAVED'))
+
             self.set_focus(self.query_one('.no-display'))
             return
 
         if button.id == 'load-mainscreen':
-            data = bson.loads(Path('save.json').read_bytes())
-
-            self.player.current = await meval(
-                f'scenes.scenes_{self.language}.{data["current"]}',
-                globals(),
-                scenes=scenes,
-                player=self.player,
-                random=random,
-            )
+            slot = await self.choose_slot(saving=False)
+            data = await self.read_save(slot) if slot else None
 
-            self.player.inventory = data['inventory']
-
-            self.player.previous = await meval(
-                f'scenes.scenes_{self.language}.{data["previous"]}',
-                globals(),
-                scenes=scenes,
-            ) if data['previous'] else None
-
-            self.modifiers = data['modifiers']
-            self.variables = data['variables']
-
-            self.history = [Scene(**item) for item in data['history']]
+            if data is None or not await self.restore_game(data):
+                self.set_focus(self.query_one('.no-display'))
+                return
 
             await self.destroy()
-            await self.compose_game_screen(data['current'])
+            await self.compose_game_screen(self.engine.player.current.id_)
+            self.state_replaced = True
             self.set_focus(self.query_one('.no-display'))
-            self.notify(await meval(f'scenes.scenes_{self.language}.LOADED', globals(), scenes=scenes))
+            self.notify(self.registry.constant('LOADED'))
             return
 
         if button.id == 'load':
-            data = bson.loads(Path('save.json').read_bytes())
-
-            self.player.current = await meval(
-                f'scenes.scenes_{self.language}.{data["current"]}',
-                globals(),
-                scenes=scenes,
-                player=self.player,
-                random=random,
-            )
-
-            self.player.inventory = data['inventory']
-
-            self.player.previous = await meval(
-                f'scenes.scenes_{self.language}.{data["previous"]}',
-                globals(),
-                scenes=scenes,
-            ) if data['previous'] else None
-
-            self.modifiers = data['modifiers']
-            self.variables = data['variables']
+            slot = await self.choose_slot(saving=False)
+            data = await self.read_save(slot) if slot else None
 
-            self.history = [Scene(**item) for item in data['history']]
+            if data is None or not await self.restore_game(data):
+                self.set_focus(self.query_one('.no-display'))
+                return
 
-            items_loctable = eval(f'scenes.scenes_{self.language}.ITEMS')
-            self.query_one(MainText).inventory = '\n'.join(
-                [
-                    f'{items_loctable[k]} x{v}'
-                    for k, v in
-                    self.player.inventory_dict().items()
-                ]
-            ) if self.player.inventory_dict() else eval(f'scenes.scenes_{self.language}.EMPTY')
-
-            await self.destroy_game_screen()
-            await self.compose_game_screen(data['current'])
+            await self.compose_game_screen(self.engine.player.current.id_)
+            self.state_replaced = True
             self.set_focus(self.query_one('.no-display'))
             self.notify('Loaded!')
             return
 
         if button.id == 'lang':
-            lang = await self.push_screen_wait(
-                LangScreen(languages=self.languages),
-            )
-            self.language = lang
-
-            config = tomllib.loads(Path('config.toml').read_text('utf-8'))
-            config['language'] = lang
-            Path('config.toml').write_text(tomli_w.dumps(config))
-
+            self.action_language()
             return
 
-        if button.id.startswith('lang_'):
+        if button.id.startswith('lang_') or button.id.startswith('slot'):
             return
 
-        choice = list(self.player.current.exits)[int(button.id[6:])]
-        self.player.previous = self.player.current
+        self.set_focus(self.query_one('.no-display'))
 
-        if choice[1][0] == 'EXIT':
-            exit(0)
+        position = int(button.id[6:])
+        before = Journal.mark(self.engine) if self.journal else None
 
-        self.player.current = await meval(
-            f'scenes.scenes_{self.language}.{choice[1][0]}'
-            if choice[1][0][0] != '!' else choice[1][0][1:],
-            globals(),
-            scenes=scenes,
-            player=self.player,
-            random=random,
-            SYS=SYSTEM_SCENES
-        )
+        await self.engine.step(position)
 
-        my_vars = eval(f'scenes.scenes_{self.language}.MY_VARS')
-
-        for var, formula in my_vars.items():
-            self.variables[var] = await meval(
-                formula,
-                globals(),
-                player=self.player,
-                mods=self.modifiers,
-                modsdict=self.modifiers_dict(),
-                vars=self.variables,
-                scenes=scenes,
-                inventory=self.player.inventory,
-                invdict=self.player.inventory_dict(),
-                random=random,
-                rnum=random_number,
-                SYS=SYSTEM_SCENES
-            )
+        if self.engine.resolved is not None:
+            await self.show_scene()
+            self.autosave_step(position, before)
 
-        self.set_focus(self.query_one('.no-display'))
+    async def game_action(self, action_type: str, item) -> bool:
+        """
+        Handles the game actions of on_enter which need the UI, and reports the failed actions.
+        :param action_type: notify, save, load, destroy, exit or error
+        :param item: item of the action
+        :return: bool — False if the action has taken over
+        """
+        if action_type == 'exit':
+            exit()
 
-        text = self.player.current.text
-
-        for t, cond in self.player.current.if_texts:
-            if await meval(
-                    cond,
-                    globals(),
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars
-            ):
-                text = t
-
-        text += '\n'
-
-        for t, cond in self.player.current.if_text_additions:
-            if await meval(
-                    cond,
-                    globals(),
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars
-            ):
-                text += '\n' + t
-
-        for t, cond in eval(f'scenes.scenes_{self.language}.GLOBAL_ADDITIONS'):
-            if await meval(
-                    cond,
-                    globals(),
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars
-            ):
-                text += '\n' + t
-
-        img = self.player.current.image
-
-        for t, cond in self.player.current.if_images:
-            if await meval(
-                    cond,
-                    globals(),
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars
-            ):
-                img = t
-
-        for t, cond in eval(f'scenes.scenes_{self.language}.GLOBAL_IMAGES'):
-            if await meval(
-                    cond,
-                    globals(),
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars
-            ):
-                img = t
-
-        self.query_one(ImageBar).image = image_to_block_art(
-            reduce(Path('assets') / Path(img), 400)
-        ) if self.player.current.image else ''
-
-        main_text = self.query_one(MainText)
-
-        speaker = self.player.current.speaker
-
-        for t, cond in self.player.current.if_speakers:
-            if await meval(
-                cond,
-                globals(),
-                player=self.player,
-                mods=self.modifiers,
-                modsdict=self.modifiers_dict(),
-                vars=self.variables,
-                scenes=scenes,
-                inventory=self.player.inventory,
-                invdict=self.player.inventory_dict(),
-                random=random,
-                rnum=random_number,
-                SYS=SYSTEM_SCENES,
-                MY=my_vars
-            ):
-                speaker = t
-
-        if self.player.current.sanitize:
-            text = escape(text)
-
-        if self.player.current.enable_formatting:
-            text = text.format(
-                player=self.player,
-                mods=self.modifiers,
-                modsdict=self.modifiers_dict(),
-                vars=self.variables,
-                scenes=scenes,
-                inventory=self.player.inventory,
-                invdict=self.player.inventory_dict(),
-                random=random,
-                rnum=random_number,
-                SYS=SYSTEM_SCENES,
-                MY=my_vars
-            )
+        elif action_type == 'destroy':
+            await self.destroy_game_screen()
+            return False
 
-        main_text.text = text
-        main_text.speaker = speaker
-
-        for action, cond in self.player.current.on_enter:
-            if await meval(
-                    cond,
-                    globals(),
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars,
-            ):
-                target, action_type, item = action
-
-                if target == 'inventory':
-                    if action_type == 'add':
-                        self.player.inventory.append(item)
-                    if action_type == 'add-many':
-                        self.player.inventory.extend([item[0] for _ in range(int(item[1]))])
-                    elif action_type == 'remove':
-                        self.player.inventory.remove(item)
-                    elif action_type == 'remove-all':
-                        self.player.inventory = [i for i in self.player.inventory if i != item]
-                    elif action_type == 'clear':
-                        self.player.inventory = []
-
-                elif target == 'modifiers':
-                    if action_type == 'add':
-                        self.modifiers.append(item)
-                    elif action_type == 'add-many':
-                        self.modifiers.extend([item for _ in range(int(item[1]))])
-                    elif action_type == 'remove':
-                        self.modifiers.remove(item)
-                    elif action_type == 'remove-all':
-                        self.modifiers = [i for i in self.modifiers if i != item]
-                    elif action_type == 'clear':
-                        self.modifiers = []
-
-                elif target == 'variables':
-                    if action_type == 'add':
-                        self.variables[item[0]] = item[1]
-                    elif action_type == 'remove':
-                        del self.variables[item[0]]
-                    elif action_type == 'clear':
-                        self.variables = {}
-                    elif action_type == 'update':
-                        self.variables[item[0]] = item[1]
-                    elif action_type == 'inc':
-                        self.variables[item[0]] += item[1]
-                    elif action_type == 'dec':
-                        self.variables[item[0]] -= item[1]
-                    elif action_type == 'set':
-                        self.variables[item[0]] = await meval(
-                            item[1],
-                            globals(),
-                            player=self.player,
-                            mods=self.modifiers,
-                            modsdict=self.modifiers_dict(),
-                            vars=self.variables,
-                            scenes=scenes,
-                            inventory=self.player.inventory,
-                            invdict=self.player.inventory_dict(),
-                            random=random,
-                            rnum=random_number
-                        )
-
-                elif target == 'game':
-                    if action_type == 'exit':
-                        exit()
-
-                    elif action_type == 'goto':
-                        await self.destroy_game_screen()
-                        await self.compose_game_screen(item)
-                        self.set_focus(self.query_one('.no-display'))
-                        return
-
-                    elif action_type == 'restart':
-                        self.player = Player()
-                        self.player.history = []
-                        self.player.current = await meval(
-                            f'scenes.scenes_{self.language}.first',
-                            globals(),
-                            scenes=scenes,
-                            player=self.player,
-                            random=random,
-                        )
-                        await self.destroy_game_screen()
-                        await self.compose_game_screen()
-                        self.modifiers = []
-                        self.variables = {}
-                        self.set_focus(self.query_one('.no-display'))
-                        return
-
-                    elif action_type == 'destroy':
-                        await self.destroy_game_screen()
-                        return
-
-                    elif action_type == 'load':
-                        data = bson.loads(Path('save.json').read_bytes())
-
-                        self.player.current = await meval(
-                            f'scenes.scenes_{self.language}.{data["current"]}',
-                            globals(),
-                            scenes=scenes,
-                            player=self.player,
-                            random=random,
-                        )
-
-                        self.player.inventory = data['inventory']
-
-                        self.player.previous = await meval(
-                            f'scenes.{data["previous"]}',
-                            globals(),
-                            scenes=scenes,
-                        ) if data['previous'] else None
-
-                        self.modifiers = data['modifiers']
-                        self.variables = data['variables']
-
-                        self.history = [Scene(**item) for item in data['history']]
-
-                        await self.destroy_game_screen()
-                        await self.compose_game_screen(data['current'])
-
-                        self.set_focus(self.query_one('.no-display'))
-
-                        if item != 'silent':
-                            self.notify('Loaded!')
-
-                        return
-
-                    elif action_type == 'save':
-                        data = {
-                            'current': self.player.current.id_,
-                            'inventory': self.player.inventory,
-                            'previous': self.player.previous.id_ if self.player.previous else '',
-                            'modifiers': self.modifiers,
-                            'variables': self.variables,
-                            'history': [item.__dict__ for item in self.history]
-                        }
-
-                        data_dumped = bson.dumps(data)
-                        Path('save.json').write_bytes(data_dumped)
-
-                        if item != 'silent':
-                            self.notify('Saved!')
-
-                        self.set_focus(self.query_one('.no-display'))
-                        return
-
-                    elif action_type == 'notify':
-                        self.notify(item if isinstance(item, str) else ' '.join(item))
-
-        items_loctable = eval(f'scenes.scenes_{self.language}.ITEMS')
-        self.query_one(MainText).inventory = '\n'.join(
-            [
-                f'{items_loctable[k]} x{v}'
-                for k, v in
-                self.player.inventory_dict().items()
-            ]
-        ) if self.player.inventory_dict() else eval(f'scenes.scenes_{self.language}.EMPTY')
+        elif action_type == 'load':
+            data = await self.read_save(saves.CHECKPOINT)
 
-        buttons = self.query(Button)
+            if data is None or not await self.restore_game(data):
+                return True
 
-        for b in buttons:
-            if b.id.startswith('button'):
-                await b.remove()
+            await self.engine.enter(data['current'])
+            self.state_replaced = True
 
-        choices = [
-            Button(
-                k.format(
-                    player=self.player,
-                    mods=self.modifiers,
-                    modsdict=self.modifiers_dict(),
-                    vars=self.variables,
-                    scenes=scenes,
-                    inventory=self.player.inventory,
-                    invdict=self.player.inventory_dict(),
-                    random=random,
-                    rnum=random_number,
-                    SYS=SYSTEM_SCENES,
-                    MY=my_vars
-                ) if self.player.current.enable_formatting else k,
-                id=f'button{i}'
-            ) for i, (k, (v, cond)) in enumerate(self.player.current.exits)
-            if await meval(
-                cond,
-                globals(),
-                player=self.player,
-                mods=self.modifiers,
-                modsdict=self.modifiers_dict(),
-                vars=self.variables,
-                scenes=scenes,
-                inventory=self.player.inventory,
-                invdict=self.player.inventory_dict(),
-                random=random,
-                rnum=random_number,
-                SYS=SYSTEM_SCENES,
-                MY=my_vars
-            )
-        ]
+            if item != 'silent':
+                self.notify('Loaded!')
+
+            return False
 
-        button_bar = self.query_one('#buttons')
-        await button_bar.mount(*choices)
+        elif action_type == 'save':
+            # write_save() has already reported a failure
+            if await self.write_save(saves.CHECKPOINT) and item != 'silent':
+                self.notify('Saved!')
 
-        self.player.history.append(self.player.current)
+        elif action_type == 'notify':
+            self.notify(item if isinstance(item, str) else ' '.join(item))
 
-        self.refresh()
+        elif action_type == 'error':
+            # An action of the scene failed, the scene is shown without the changes of its actions
+            self.notify(item, title='Scene error', severity='error', timeout=10)
+
+        return True
 
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ['build-assets']:
+        entries, missing = build_assets()
+
+        for name in missing:
+            print(f'Missing asset: {name}')
+
+        print(f'Pre-rendered {len(entries)} images into {BUNDLE}')
+        exit(0)
+
+    if sys.argv[1:] == ['--startup-timings']:
+        QuestApp(startup_timings=True).run(headless=True)
+        print(STARTUP.report())
+        exit(0)
+
     app = QuestApp()
     app.run()
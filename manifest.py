@@ -0,0 +1,285 @@
+import hashlib
+import importlib
+import json
+import os
+import pkgutil
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from saves import write_atomic
+
+ASSETS_DIR = Path('assets')
+MANIFEST_NAME = '.manifest.json'
+MANIFEST_VERSION = 1
+
+IMAGE_SUFFIXES = ['.png', '.jpg', '.jpeg']
+
+
+@dataclass
+class AssetInfo:
+    """
+    A class to represent a file of the assets folder in the manifest.
+    name — the logical name scenes refer to the file by (its path relative to the assets folder, with / separators).
+    size — the size of the file in bytes.
+    mtime — the modification time of the file in nanoseconds (the entry is measured again when it changes).
+    digest — SHA-256 of the contents, identical files have the same one.
+    width — the width of an image in pixels (0 for other files).
+    height — the height of an image in pixels (0 for other files).
+    """
+    name: str
+    size: int
+    mtime: int
+    digest: str
+    width: int = 0
+    height: int = 0
+
+
+def is_image(name: str) -> bool:
+    return Path(name).suffix.lower() in IMAGE_SUFFIXES
+
+
+class AssetManifest:
+    """
+    A class to index the assets folder, so assets are looked up by their logical names instead of
+    scanning the folder and opening paths blindly.
+    The manifest is kept in the assets folder; on refresh only files with a changed size or mtime are hashed and
+    measured again. Files with identical contents are deduplicated: every lookup resolves to one canonical file
+    per content hash, so such files are read, rendered and cached once.
+    directory — the assets folder.
+    path — the manifest file (dotfiles are not indexed).
+    assets — AssetInfo by logical name (None until the manifest is first needed).
+    canonical — the canonical name by content hash.
+    snapshot — (assets, canonical) of the last complete refresh, replaced as a whole: lookups read it without
+    the lock, so the UI never waits for a refresh hashing files in a worker.
+    """
+
+    def __init__(self, directory: Path = ASSETS_DIR, path: Path = None):
+        self.directory = Path(directory)
+        self.path = Path(path) if path else self.directory / MANIFEST_NAME
+        self.assets: Optional[Dict[str, AssetInfo]] = None
+        self.canonical: Dict[str, str] = {}
+        self.snapshot: Optional[Tuple[Dict[str, AssetInfo], Dict[str, str]]] = None
+        # Refreshed from a worker thread while the UI may already look assets up
+        self.lock = threading.RLock()
+
+    def read(self) -> Dict[str, AssetInfo]:
+        """
+        Reads the manifest file, returns no entries if it is missing, corrupted or of another version.
+        :return: Dict[str, AssetInfo]
+        """
+        try:
+            data = json.loads(self.path.read_bytes())
+
+            if data.get('version') != MANIFEST_VERSION:
+                return {}
+
+            return {name: AssetInfo(name, **info) for name, info in data['assets'].items()}
+        except (OSError, ValueError, TypeError, KeyError):
+            return {}
+
+    def scan(self) -> Iterator[Tuple[str, os.stat_result]]:
+        """
+        Yields the logical name and the stat of every file of the assets folder.
+        :return: Iterator[Tuple[str, os.stat_result]]
+        """
+        for root, directories, files in os.walk(self.directory):
+            directories[:] = [directory for directory in directories if not directory.startswith('.')]
+
+            for file in files:
+                if not file.startswith('.'):
+                    path = Path(root) / file
+                    yield path.relative_to(self.directory).as_posix(), path.stat()
+
+    def measure(self, name: str, stat: os.stat_result) -> AssetInfo:
+        """
+        Hashes the file and reads the dimensions of an image (they stay 0 in builds without Pillow).
+        :param name: logical name
+        :param stat: stat of the file
+        :return: AssetInfo
+        """
+        file = self.directory / name
+        info = AssetInfo(name, stat.st_size, stat.st_mtime_ns, hashlib.sha256(file.read_bytes()).hexdigest())
+
+        if is_image(name):
+            try:
+                from PIL import Image
+
+                with Image.open(file) as image:
+                    info.width, info.height = image.size
+            except (ImportError, OSError):
+                pass
+
+        return info
+
+    def refresh(self) -> bool:
+        """
+        Brings the manifest up to date with the assets folder and writes it if anything has changed.
+        :return: bool — whether anything has changed
+        """
+        with self.lock:
+            known = self.assets if self.assets is not None else self.read()
+            assets = {}
+            changed = False
+
+            for name, stat in self.scan():
+                info = known.get(name)
+
+                if info is None or info.size != stat.st_size or info.mtime != stat.st_mtime_ns:
+                    info = self.measure(name, stat)
+                    changed = True
+
+                assets[name] = info
+
+            changed = changed or set(known) != set(assets)
+            canonical: Dict[str, str] = {}
+
+            for name in sorted(assets):
+                canonical.setdefault(assets[name].digest, name)
+
+            self.assets, self.canonical = assets, canonical
+            self.snapshot = (assets, canonical)
+
+            if changed:
+                try:
+                    write_atomic(self.path, json.dumps({
+                        'version': MANIFEST_VERSION,
+                        'assets': {name: {k: v for k, v in asdict(info).items() if k != 'name'}
+                                   for name, info in assets.items()}
+                    }, ensure_ascii=False).encode('utf-8'))
+                except OSError:
+                    pass
+
+            return changed
+
+    def ensure(self) -> Dict[str, AssetInfo]:
+        snapshot = self.snapshot
+
+        if snapshot is not None:
+            return snapshot[0]
+
+        with self.lock:
+            if self.snapshot is None:
+                self.refresh()
+
+            return self.snapshot[0]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ensure()
+
+    def get(self, name: str) -> Optional[AssetInfo]:
+        return self.ensure().get(name)
+
+    def file(self, name: str, wait: bool = True) -> Optional[Path]:
+        """
+        Returns the file of the asset: the canonical one of the files with the same contents.
+        :param name: logical name
+        :param wait: whether to wait for the first refresh; if not, the file of the name itself is returned until
+            the manifest is ready
+        :return: Optional[Path] — None if there is no such asset
+        """
+        if not wait and self.snapshot is None:
+            return self.directory / name
+
+        self.ensure()
+        assets, canonical = self.snapshot
+        info = assets.get(name)
+
+        return self.directory / canonical[info.digest] if info else None
+
+    def digest(self, path: Path, wait: bool = True) -> Optional[str]:
+        """
+        Returns the content hash of a file of the assets folder without reading it.
+        :param path: Path to the file
+        :param wait: whether to wait for the first refresh (if not, None is returned until the manifest is ready)
+        :return: Optional[str] — None if the file isn't in the manifest
+        """
+        if not wait and self.snapshot is None:
+            return None
+
+        try:
+            name = Path(path).relative_to(self.directory).as_posix()
+        except ValueError:
+            return None
+
+        info = self.ensure().get(name)
+
+        return info.digest if info else None
+
+    def banner_name(self) -> Optional[str]:
+        """
+        Returns the logical name of the banner (an image named banner.*), if there is one.
+        :return: Optional[str]
+        """
+        for name in sorted(self.ensure()):
+            if is_image(name) and Path(name).name.split('.')[0] == 'banner':
+                return name
+
+        return None
+
+    def banner(self) -> Optional[Path]:
+        name = self.banner_name()
+
+        return self.file(name) if name else None
+
+    def duplicates(self) -> List[List[str]]:
+        """
+        Returns the groups of assets with identical contents.
+        :return: List[List[str]]
+        """
+        groups: Dict[str, List[str]] = {}
+
+        for name, info in sorted(self.ensure().items()):
+            groups.setdefault(info.digest, []).append(name)
+
+        return [names for names in groups.values() if len(names) > 1]
+
+    def check(self, names: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """
+        Compares the assets with the ones referenced.
+        :param names: logical names of the referenced assets
+        :return: Tuple[List[str], List[str]] — referenced assets which don't exist, and images nothing refers to
+            (the banner is always used)
+        """
+        assets = self.ensure()
+        names = set(names)
+        names.add(self.banner_name())
+
+        missing = sorted(name for name in names if name and name not in assets)
+        unused = sorted(name for name in assets if is_image(name) and name not in names)
+
+        return missing, unused
+
+
+def main():
+    from render import iter_images
+    import scenes
+
+    manifest = AssetManifest()
+    manifest.refresh()
+    print(f'{len(manifest.assets)} assets in {manifest.directory}, manifest: {manifest.path}')
+
+    for names in manifest.duplicates():
+        print(f'Identical: {", ".join(names)} (stored once)')
+
+    referenced = set()
+
+    for module_info in pkgutil.iter_modules(scenes.__path__):
+        if module_info.name.startswith('scenes_'):
+            referenced.update(iter_images(importlib.import_module(f'scenes.{module_info.name}')))
+
+    missing, unused = manifest.check(referenced)
+
+    for name in missing:
+        print(f'Missing asset: {name}')
+
+    for name in unused:
+        print(f'Unused asset: {name}')
+
+    if missing:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+import importlib
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from types import ModuleType
+from typing import Any, Dict, Iterator, List, Optional
+
+from actions import ActionTable
+from classes import Scene
+from conditions import ConditionCache
+
+
+class RegistryError(Exception):
+    """
+    Raised when the scenes of a module can't be indexed (clashing ids, variable names differing from the ids,
+    exits leading nowhere).
+    """
+
+
+class SceneRegistry:
+    """
+    Index of the scenes and constants of a single scene module.
+    Every module is scanned once, when it is first requested; scenes can then be looked up
+    both by their id_ and by the name of the variable they are assigned to.
+    Language modules are imported on first use, and only the `resident` most recently used ones
+    are kept loaded: the rest are dropped together with their compiled conditions.
+    module — scene module (scenes.scenes_<lang>).
+    by_id — scenes by id_.
+    by_name — scenes by variable name.
+    constants — every other public name of the module (ITEMS, EMPTY, SAVE_SHORT, etc.).
+    """
+    _modules: OrderedDict[str, 'SceneRegistry'] = OrderedDict()
+    # Registries are also looked up from the prefetch worker thread
+    _lock = threading.RLock()
+    # Unloaded modules which threads may still hold: their registries are never kept again
+    _evicted: 'weakref.WeakSet[ModuleType]' = weakref.WeakSet()
+    resident = 2
+
+    def __init__(self, module: ModuleType):
+        self.module = module
+        self.by_id: Dict[str, Scene] = {}
+        self.by_name: Dict[str, Scene] = {}
+        self.constants: Dict[str, Any] = {}
+
+    @classmethod
+    def for_module(cls, module: ModuleType) -> 'SceneRegistry':
+        """
+        Returns the registry of the module, scanning it on first use.
+        A module unloaded by evict() gets a registry which isn't kept, so a thread still holding it
+        can't shadow the module imported anew under the same name.
+        :param module: scene module
+        :return: SceneRegistry
+        """
+        with cls._lock:
+            registry = cls._modules.get(module.__name__)
+
+            if registry is None or registry.module is not module:
+                registry = StoryRegistry(module) if hasattr(module, '__bundle__') else cls(module)
+                registry.scan()
+
+                if module in cls._evicted:
+                    return registry
+
+                cls._modules[module.__name__] = registry
+
+            cls._modules.move_to_end(module.__name__)
+            cls.evict()
+
+        return registry
+
+    @classmethod
+    def for_language(cls, language: str) -> 'SceneRegistry':
+        """
+        Returns the registry of the language module, loading it on first use
+        from its story bundle (see story.py) if it is up to date, or importing it otherwise.
+        :param language: language code
+        :return: SceneRegistry
+        """
+        name = f'scenes.scenes_{language}'
+        module = sys.modules.get(name)
+
+        if module is None:
+            from story import load_story
+
+            module = load_story(name) or importlib.import_module(name)
+
+        return cls.for_module(module)
+
+    @classmethod
+    def evict(cls) -> None:
+        """
+        Unloads the least recently used language modules over the resident cap.
+        Objects still referring to an unloaded module keep it alive, it is just imported anew next time.
+        :return: None
+        """
+        with cls._lock:
+            while len(cls._modules) > max(cls.resident, 1):
+                name, registry = cls._modules.popitem(last=False)
+                cls._evicted.add(registry.module)
+                ConditionCache.discard(name)
+                ActionTable.discard(name)
+                sys.modules.pop(name, None)
+
+                package, _, attribute = name.rpartition('.')
+
+                if package in sys.modules and hasattr(sys.modules[package], attribute):
+                    delattr(sys.modules[package], attribute)
+
+    def scan(self) -> None:
+        """
+        Indexes the scenes and the constants of the module and validates them,
+        collecting all errors into one exception.
+        :return: None
+        """
+        errors = []
+        name = self.module.__name__
+
+        for var, value in vars(self.module).items():
+            if var.startswith('_') or isinstance(value, ModuleType):
+                continue
+
+            if isinstance(value, Scene):
+                if value.id_ in self.by_id and self.by_id[value.id_] is not value:
+                    errors.append(f'{name}.{var}: id {value.id_!r} is already used by another scene')
+
+                self.by_name[var] = value
+                self.by_id.setdefault(value.id_, value)
+            elif not isinstance(value, type):
+                self.constants[var] = value
+
+        for var, scene in self.by_name.items():
+            if var in self.by_id and self.by_id[var] is not scene:
+                errors.append(f'{name}.{var}: variable name is the id of another scene')
+            elif var != scene.id_ and self.by_name.get(scene.id_) is not scene:
+                # Aliases of a scene assigned to its id as well are fine
+                errors.append(f'{name}.{var}: variable name differs from the id {scene.id_!r} of its scene')
+
+        for var, scene in self.by_name.items():
+            for i, (_, (target, _)) in enumerate(scene.exits):
+                if not target.startswith('!') and target != 'EXIT' and target not in self:
+                    errors.append(f'{name}.{var}.exits[{i}]: no scene {target!r}')
+
+            for i, ((target, action_type, item), _) in enumerate(scene.on_enter):
+                if target == 'game' and action_type == 'goto' and not item.startswith('!') and item not in self:
+                    errors.append(f'{name}.{var}.on_enter[{i}]: no scene {item!r}')
+
+        if errors:
+            raise RegistryError('\n'.join(errors))
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.by_id or key in self.by_name
+
+    def __getitem__(self, key: str) -> Scene:
+        """
+        Returns the scene by its id_ or by its variable name.
+        :param key: id_ or variable name
+        :return: Scene
+        """
+        scene = self.by_id.get(key)
+
+        if scene is None:
+            scene = self.by_name.get(key)
+
+            if scene is None:
+                raise KeyError(f'{self.module.__name__}: no scene {key!r}')
+
+        return scene
+
+    def get(self, key: str, default: Optional[Scene] = None) -> Optional[Scene]:
+        """
+        Returns the scene by its id_ or by its variable name, or the default.
+        :param key: id_ or variable name
+        :param default: returned if there is no such scene
+        :return: Optional[Scene]
+        """
+        return self.by_id.get(key) or self.by_name.get(key, default)
+
+    def __iter__(self) -> Iterator[Scene]:
+        return iter(self.by_name.values())
+
+    def __len__(self) -> int:
+        return len(self.by_name)
+
+    def ids(self) -> List[str]:
+        """
+        Returns the ids of all scenes.
+        :return: List[str]
+        """
+        return list(self.by_id)
+
+    def constant(self, name: str, default: Any = None) -> Any:
+        """
+        Returns a constant of the module (ITEMS, EMPTY, SAVE_SHORT, etc.).
+        :param name: name of the constant
+        :param default: returned if the module doesn't define it
+        :return: Any
+        """
+        return self.constants.get(name, default)
+
+
+class StoryRegistry(SceneRegistry):
+    """
+    Index of a scene module loaded from a story bundle (see story.py).
+    The bundle was validated when it was compiled and has indexes of its own, so nothing is scanned:
+    a scene is built when it is first looked up, and its precompiled conditions are added to the condition cache.
+    bundle — the StoryBundle of the module.
+    """
+
+    def __init__(self, module: ModuleType):
+        super().__init__(module)
+        self.bundle = module.__bundle__
+        self.constants = dict(self.bundle.constants)
+        self.materialized: Dict[int, Scene] = {}
+
+    def scan(self) -> None:
+        pass
+
+    def materialize(self, number: int) -> Scene:
+        """
+        Returns the scene by its number in the bundle, building it on first use.
+        :param number: number of the scene
+        :return: Scene
+        """
+        scene = self.materialized.get(number)
+
+        if scene is None:
+            scene, conditions = self.bundle.scene(number)
+            ConditionCache.for_module(self.module).prime(conditions)
+            # The prefetch thread may have built it at the same time, only one copy is ever handed out
+            scene = self.materialized.setdefault(number, scene)
+
+        return scene
+
+    def __contains__(self, key: str) -> bool:
+        return self.bundle.find(key) is not None
+
+    def __getitem__(self, key: str) -> Scene:
+        number = self.bundle.find(key)
+
+        if number is None:
+            raise KeyError(f'{self.module.__name__}: no scene {key!r}')
+
+        return self.materialize(number)
+
+    def get(self, key: str, default: Optional[Scene] = None) -> Optional[Scene]:
+        number = self.bundle.find(key)
+
+        return default if number is None else self.materialize(number)
+
+    def __iter__(self) -> Iterator[Scene]:
+        return (self.materialize(number) for number in range(len(self.bundle)))
+
+    def __len__(self) -> int:
+        return len(self.bundle)
+
+    def ids(self) -> List[str]:
+        return list(self.bundle.keys(self.bundle.ids))
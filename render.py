@@ -0,0 +1,434 @@
+import hashlib
+import importlib
+import json
+import os
+import pkgutil
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from manifest import ASSETS_DIR, AssetManifest
+from registry import SceneRegistry
+from saves import write_atomic
+
+CACHE_DIR = Path('.hoofd_cache')
+BUNDLE = ASSETS_DIR / 'blockart.bundle'
+BUNDLE_VERSION = 2
+
+# Same as utils.BLOCK_CHARS, duplicated so lookups don't import PIL and NumPy
+DEFAULT_RAMP = ' ░▒▓█'
+
+
+def bundle_key(digest: str, width: int, reduce_width: int, ramp: str, mode: str) -> str:
+    """
+    Returns the key of a pre-rendered art in the bundle (identical images share it).
+    :param digest: content hash of the image
+    :return: str
+    """
+    return f'{digest}|{width}|{reduce_width}|{ramp}|{mode}'
+
+
+def load_bundle(path: Path = BUNDLE) -> Dict[str, str]:
+    """
+    Loads the bundle of pre-rendered arts, returns an empty one if there is none.
+    :param path: Path to the bundle
+    :return: Dict[str, str]
+    """
+    try:
+        data = json.loads(zlib.decompress(path.read_bytes()))
+    except (OSError, ValueError, zlib.error):
+        return {}
+
+    if data.get('version') != BUNDLE_VERSION:
+        return {}
+
+    return data['entries']
+
+
+def art_size(art: str) -> int:
+    """
+    Returns the approximate memory taken by the art.
+    :param art: block art
+    :return: int
+    """
+    # Block characters are stored with 2 bytes per character
+    return len(art) * 2
+
+
+class RenderCache:
+    """
+    A class to cache rendered block art.
+    Lookups go through the pre-rendered bundle and an in-memory LRU first, then through the on-disk
+    store, and only then the image is decoded and converted. Entries are keyed by the asset content hash and by
+    everything that affects the output (widths, character ramp, colour mode).
+    directory — the on-disk store (art from earlier sessions is reused).
+    bundle — pre-rendered arts made by build-assets, checked before everything else.
+    manifest — the asset manifest content hashes of the assets are taken from (they are computed if None).
+    memory_entries — how many arts are kept in memory.
+    memory_bytes — size cap of the arts kept in memory.
+    disk_bytes — size cap of the on-disk store, the least recently used files are evicted.
+    """
+
+    def __init__(self, directory: Path = CACHE_DIR, memory_entries: int = 64, disk_bytes: int = 32 * 1024 * 1024,
+                 bundle: Optional[Path] = BUNDLE, memory_bytes: int = 16 * 1024 * 1024,
+                 manifest: Optional[AssetManifest] = None):
+        self.directory = Path(directory)
+        self.manifest = manifest
+        self.bundle_path = bundle
+        self.bundle: Optional[Dict[str, str]] = None
+        self.memory_entries = memory_entries
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.memory: OrderedDict[str, str] = OrderedDict()
+        self.memory_used = 0
+        self.hashes: Dict[Tuple[str, int, int], str] = {}
+        # Arts are rendered in worker threads
+        self.lock = threading.RLock()
+
+    def content_hash(self, path: Path) -> str:
+        """
+        Returns the content hash of the file from the manifest, or hashes it (again only if it was modified).
+        :param path: Path to the file
+        :return: str
+        """
+        digest = self.manifest.digest(path) if self.manifest else None
+
+        if digest is not None:
+            return digest
+
+        stat = path.stat()
+        stamp = (str(path), stat.st_mtime_ns, stat.st_size)
+        digest = self.hashes.get(stamp)
+
+        if digest is None:
+            digest = hashlib.sha256(path.read_bytes()).hexdigest()
+
+            with self.lock:
+                self.hashes[stamp] = digest
+
+        return digest
+
+    @staticmethod
+    def key(digest: str, width: int, reduce_width: int, ramp: str, mode: str) -> str:
+        """
+        Returns the cache key of the render.
+        :return: str
+        """
+        return hashlib.sha256(f'{digest}|{width}|{reduce_width}|{ramp}|{mode}'.encode('utf-8')).hexdigest()
+
+    def get(self, path: Path, width: int = 100, reduce_width: int = 400, ramp: str = DEFAULT_RAMP,
+            mode: str = 'L') -> str:
+        """
+        Returns the block art of the image, rendering it on cache miss.
+        :param path: Path to the image
+        :param width: Width of the art in characters
+        :param reduce_width: Width the image is reduced to before conversion
+        :param ramp: Characters from darkest to lightest
+        :param mode: Colour mode the image is converted to
+        :return: str
+        """
+        path = Path(path)
+        art = self.from_bundle(path, width, reduce_width, ramp, mode)
+
+        if art is not None:
+            return art
+
+        key = self.key(self.content_hash(path), width, reduce_width, ramp, mode)
+
+        with self.lock:
+            art = self.memory.get(key)
+
+            if art is not None:
+                self.memory.move_to_end(key)
+                return art
+
+        file = self.directory / f'{key}.txt'
+
+        try:
+            art = file.read_text('utf-8')
+            os.utime(file)
+        except OSError:
+            art = render(path, width, reduce_width, ramp, mode)
+            self.store(file, art)
+
+        self.remember(key, art)
+
+        return art
+
+    def peek(self, path: Path, width: int = 100, reduce_width: int = 400, ramp: str = DEFAULT_RAMP,
+             mode: str = 'L') -> Optional[str]:
+        """
+        Returns the block art only if it is available without any file reads (bundle or memory).
+        :param path: Path to the image
+        :return: Optional[str]
+        """
+        path = Path(path)
+        # Called from the UI: the manifest isn't waited for while a worker refreshes it
+        art = self.from_bundle(path, width, reduce_width, ramp, mode, wait=False)
+
+        if art is not None:
+            return art
+
+        digest = self.manifest.digest(path, wait=False) if self.manifest else None
+
+        if digest is None:
+            try:
+                stat = path.stat()
+            except OSError:
+                return None
+
+            digest = self.hashes.get((str(path), stat.st_mtime_ns, stat.st_size))
+
+            if digest is None:
+                return None
+
+        with self.lock:
+            key = self.key(digest, width, reduce_width, ramp, mode)
+            art = self.memory.get(key)
+
+            if art is not None:
+                self.memory.move_to_end(key)
+
+            return art
+
+    def from_bundle(self, path: Path, width: int, reduce_width: int, ramp: str, mode: str,
+                    wait: bool = True) -> Optional[str]:
+        """
+        Returns the pre-rendered art from the bundle, if it is there.
+        :param wait: whether to wait for the manifest (see AssetManifest.digest)
+        :return: Optional[str]
+        """
+        if self.bundle is None:
+            self.bundle = load_bundle(self.bundle_path) if self.bundle_path else {}
+
+        # Arts are bundled by content hash, it is only known without reading the image through the manifest
+        digest = self.manifest.digest(path, wait) if self.bundle and self.manifest else None
+
+        if digest is None:
+            return None
+
+        return self.bundle.get(bundle_key(digest, width, reduce_width, ramp, mode))
+
+    def remember(self, key: str, art: str) -> None:
+        """
+        Puts the art into the in-memory LRU, evicting the least recently used entries.
+        :param key: cache key
+        :param art: block art
+        :return: None
+        """
+        with self.lock:
+            if key in self.memory:
+                self.memory_used -= art_size(self.memory[key])
+
+            self.memory[key] = art
+            self.memory.move_to_end(key)
+            self.memory_used += art_size(art)
+
+            while len(self.memory) > 1 and (
+                    len(self.memory) > self.memory_entries or self.memory_used > self.memory_bytes
+            ):
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_used -= art_size(evicted)
+
+    def store(self, file: Path, art: str) -> None:
+        """
+        Writes the art to the on-disk store and evicts old entries over the size cap.
+        :param file: Path of the entry
+        :param art: block art
+        :return: None
+        """
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            temp = file.with_suffix(f'.{threading.get_ident()}.tmp')
+            temp.write_text(art, 'utf-8')
+            os.replace(temp, file)
+        except OSError:
+            return
+
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used files until the store fits into its size cap.
+        :return: None
+        """
+        entries = []
+
+        for file in self.directory.glob('*.txt'):
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, file))
+
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, file in sorted(entries):
+            if total <= self.disk_bytes:
+                break
+
+            try:
+                file.unlink(missing_ok=True)
+            except OSError:
+                continue
+
+            total -= size
+
+
+def render(path: Path, width: int = 100, reduce_width: int = 400, ramp: str = DEFAULT_RAMP, mode: str = 'L') -> str:
+    """
+    Decodes the image and converts it to block art, bypassing every cache.
+    :param path: Path to the image
+    :return: str
+    """
+    from utils import image_to_block_art, reduce
+
+    return image_to_block_art(reduce(Path(path), reduce_width).convert(mode), width, ramp=ramp)
+
+
+class Prefetcher:
+    """
+    A class to render the images of the scenes the player can go to next, before they are visited.
+    cache — the cache the arts are rendered into.
+    depth — how many transitions ahead are looked at (1 — only the currently visible exits).
+    memory_bytes — how much art a single prefetch may put into the cache.
+    """
+
+    def __init__(self, cache: RenderCache, depth: int = 1, memory_bytes: int = 8 * 1024 * 1024):
+        self.cache = cache
+        self.depth = depth
+        self.memory_bytes = memory_bytes
+
+    def images(self, module, targets: List[str]) -> List[Path]:
+        """
+        Returns the images of the target scenes and of the scenes reachable from them, nearest first.
+        Computed targets (starting with !) can't be known in advance and are skipped.
+        :param module: scene module (scenes.scenes_<lang>)
+        :param targets: ids of the scenes behind the visible exits
+        :return: List[Path]
+        """
+        registry = SceneRegistry.for_module(module)
+        images = []
+        seen = set()
+        level = list(targets)
+
+        for _ in range(self.depth):
+            next_level = []
+
+            for target in level:
+                if target in seen or target.startswith('!'):
+                    continue
+
+                seen.add(target)
+                scene = registry.get(target)
+
+                if scene is None:
+                    continue
+
+                # Scenes without their own image don't show if_images either
+                for image in [scene.image, *(image for image, _ in scene.if_images)] if scene.image else []:
+                    path = self.cache.manifest.file(image) if self.cache.manifest else ASSETS_DIR / image
+
+                    if path is not None and path not in images:
+                        images.append(path)
+
+                next_level.extend(target for _, (target, _) in scene.exits)
+
+            level = next_level
+
+        return images
+
+    def run(self, module, targets: List[str], cancelled: Callable[[], bool] = lambda: False) -> int:
+        """
+        Renders the images of the reachable scenes into the cache until the budget is spent.
+        :param module: scene module (scenes.scenes_<lang>)
+        :param targets: ids of the scenes behind the visible exits
+        :param cancelled: returns True when the prefetch isn't needed anymore
+        :return: int — number of images prefetched
+        """
+        spent = 0
+        count = 0
+
+        for path in self.images(module, targets):
+            if cancelled() or spent >= self.memory_bytes:
+                break
+
+            if not path.is_file():
+                continue
+
+            spent += art_size(self.cache.get(path))
+            count += 1
+
+        return count
+
+
+def iter_images(module) -> Iterator[str]:
+    """
+    Yields every image a scene module references.
+    :param module: scene module (scenes.scenes_<lang>)
+    :return: Iterator[str]
+    """
+    bundle = getattr(module, '__bundle__', None)
+
+    if bundle is not None:
+        # Iterating a story registry would build every scene of the bundle
+        yield from bundle.images()
+        return
+
+    registry = SceneRegistry.for_module(module)
+
+    for scene in registry:
+        if scene.image:
+            yield scene.image
+
+        for image, _ in scene.if_images:
+            yield image
+
+    for image, _ in registry.constant('GLOBAL_IMAGES', []):
+        yield image
+
+
+def build_assets(path: Path = BUNDLE, manifest: Optional[AssetManifest] = None) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Pre-renders every image of every language module and the banner into the bundle.
+    Images with identical contents are rendered and stored once. The bundle replaces the old one atomically.
+    :param path: Path to the bundle
+    :param manifest: asset manifest (the one of the assets folder by default)
+    :return: Tuple[Dict[str, str], List[str]] — the rendered arts by key and the images missing from the assets
+    """
+    import scenes
+
+    manifest = manifest or AssetManifest()
+    manifest.refresh()
+    names = set()
+
+    for module_info in pkgutil.iter_modules(scenes.__path__):
+        if module_info.name.startswith('scenes_'):
+            names.update(iter_images(importlib.import_module(f'scenes.{module_info.name}')))
+
+    banner = manifest.banner_name()
+
+    if banner:
+        names.add(banner)
+
+    entries = {}
+    missing = []
+
+    for name in sorted(names):
+        info = manifest.get(name)
+
+        if info is None:
+            missing.append(name)
+            continue
+
+        key = bundle_key(info.digest, 100, 400, DEFAULT_RAMP, 'L')
+
+        if key not in entries:
+            entries[key] = render(manifest.file(name))
+
+    write_atomic(path, zlib.compress(json.dumps({'version': BUNDLE_VERSION, 'entries': entries}).encode('utf-8'), 9))
+
+    return entries, missing
@@ -0,0 +1,238 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from types import ModuleType
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from rich.markup import escape
+
+from actions import ActionTable
+from classes import Scene
+from conditions import ConditionCache
+from context import EvalContext
+from registry import SceneRegistry
+
+# render is the time images took to render in the worker thread, added when they are ready
+PHASES = ('conditions', 'formatting', 'images', 'render', 'mount')
+
+
+class PhaseTimer:
+    """
+    A class to measure how long every phase of a scene transition takes.
+    current — durations of the transition in progress, in seconds.
+    last — durations of the last finished transition.
+    total — durations summed over all finished transitions.
+    transitions — number of finished transitions.
+    hooks — callables receiving (scene id, durations) when a transition is finished.
+    """
+
+    def __init__(self):
+        self.current: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.last: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.total: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.transitions = 0
+        self.hooks: List[Callable[[str, Dict[str, float]], None]] = []
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        """
+        Adds the time spent inside the block to the phase.
+        :param phase: name of the phase
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.current[phase] = self.current.get(phase, 0.0) + time.perf_counter() - start
+
+    def finish(self, scene_id: str) -> None:
+        """
+        Finishes the transition, passing its durations to the hooks.
+        :param scene_id: id of the scene entered
+        :return: None
+        """
+        self.last = self.current
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.transitions += 1
+
+        for phase, seconds in self.last.items():
+            self.total[phase] = self.total.get(phase, 0.0) + seconds
+
+        for hook in self.hooks:
+            hook(scene_id, self.last)
+
+    def add_late(self, phase: str, seconds: float) -> None:
+        """
+        Adds the time of work which finished after its transition (e.g. rendering in a worker thread)
+        to the last transition.
+        :param phase: name of the phase
+        :param seconds: duration
+        :return: None
+        """
+        self.last[phase] = self.last.get(phase, 0.0) + seconds
+        self.total[phase] = self.total.get(phase, 0.0) + seconds
+
+    def report(self) -> str:
+        """
+        Returns the durations of the last transition and the averages, one phase per line.
+        :return: str
+        """
+        lines = []
+
+        for phase, seconds in self.last.items():
+            average = self.total.get(phase, 0.0) / self.transitions if self.transitions else 0.0
+            lines.append(f'{phase}: {seconds * 1000:.2f} ms (avg {average * 1000:.2f} ms)')
+
+        return '\n'.join(lines)
+
+
+@dataclass
+class ResolvedScene:
+    """
+    A class to represent a scene resolved against the game state, ready to be shown.
+    scene — the scene itself.
+    text — the final text (conditional texts and additions, sanitization and formatting applied).
+    speaker — the final speaker.
+    image — the final image, a path relative to the assets folder ('' if the scene has none).
+    exits — a list of (index of the exit in the scene, label, target) tuples of the visible exits.
+    """
+    scene: Scene
+    text: str
+    speaker: str
+    image: str
+    exits: List[Tuple[int, str, str]] = field(default_factory=list)
+
+
+class SceneResolver:
+    """
+    A class to resolve scenes of a language module against the game state.
+    It knows nothing about the UI: the game feeds it an EvalContext and shows the ResolvedScene.
+    module — scene module (scenes.scenes_<lang>).
+    registry — the index of the module's scenes.
+    actions — the compiled on_enter actions of the module's scenes.
+    timer — the PhaseTimer the phases are measured with.
+    """
+
+    def __init__(self, module: ModuleType, timer: PhaseTimer = None):
+        self.module = module
+        self.registry = SceneRegistry.for_module(module)
+        self.conditions = ConditionCache.for_module(module)
+        self.actions = ActionTable.for_module(module)
+        self.timer = timer or PhaseTimer()
+
+    @property
+    def my_vars(self) -> Dict[str, str]:
+        return self.module.MY_VARS
+
+    async def evaluate(self, source: str, context: EvalContext):
+        """
+        Evaluates a single expression, awaiting it only if it is asynchronous.
+        :param source: expression
+        :param context: context of the transition
+        :return: Any
+        """
+        value = self.conditions.evaluate(source, context.namespace)
+
+        if self.conditions.get(source).is_async:
+            value = await value
+
+        return value
+
+    async def target(self, target: str, context: EvalContext) -> Scene:
+        """
+        Returns the scene an exit leads to (targets starting with ! are expressions).
+        :param target: id of the scene or !expression
+        :param context: context of the transition
+        :return: Scene
+        """
+        with self.timer.measure('conditions'):
+            if target[0] == '!':
+                return await self.evaluate(target[1:], context)
+
+            return self.registry[target]
+
+    async def update_variables(self, context: EvalContext) -> None:
+        """
+        Recalculates MY_VARS formulas into the variables.
+        :param context: context of the transition
+        :return: None
+        """
+        with self.timer.measure('conditions'):
+            for var, formula in self.my_vars.items():
+                context.vars[var] = await self.evaluate(formula, context)
+
+    async def resolve(self, scene: Scene, context: EvalContext) -> ResolvedScene:
+        """
+        Resolves the text, the speaker and the image of the scene (exits are resolved separately,
+        because on_enter actions run in between).
+        :param scene: the scene entered
+        :param context: context of the transition
+        :return: ResolvedScene
+        """
+        select = self.conditions.select
+        namespace = context.namespace
+
+        with self.timer.measure('conditions'):
+            text = scene.text
+
+            for t in await select(scene.if_texts, namespace):
+                text = t
+
+            text += '\n'
+
+            for t in await select(scene.if_text_additions, namespace):
+                text += '\n' + t
+
+            for t in await select(self.module.GLOBAL_ADDITIONS, namespace):
+                text += '\n' + t
+
+            image = scene.image
+
+            for t in await select(scene.if_images, namespace):
+                image = t
+
+            for t in await select(self.module.GLOBAL_IMAGES, namespace):
+                image = t
+
+            speaker = scene.speaker
+
+            for t in await select(scene.if_speakers, namespace):
+                speaker = t
+
+        with self.timer.measure('formatting'):
+            if scene.sanitize:
+                text = escape(text)
+
+            if scene.enable_formatting:
+                text = context.format(text)
+
+        return ResolvedScene(
+            scene=scene,
+            text=text,
+            speaker=speaker,
+            image=image if scene.image else ''
+        )
+
+    async def resolve_exits(self, resolved: ResolvedScene, context: EvalContext) -> ResolvedScene:
+        """
+        Fills the visible exits of the resolved scene in.
+        :param resolved: the resolved scene
+        :param context: context of the transition
+        :return: ResolvedScene
+        """
+        scene = resolved.scene
+
+        with self.timer.measure('conditions'):
+            visible = await self.conditions.select(
+                [((i, k, v), cond) for i, (k, (v, cond)) in enumerate(scene.exits)],
+                context.namespace
+            )
+
+        with self.timer.measure('formatting'):
+            resolved.exits = [
+                (i, context.format(k) if scene.enable_formatting else k, v)
+                for i, k, v in visible
+            ]
+
+        return resolved
@@ -0,0 +1,435 @@
+import base64
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from array import array
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+SAVE_VERSION = 1
+INDEX_VERSION = 1
+
+SAVES_DIR = Path('saves')
+LEGACY_SAVE = Path('save.json')
+
+AUTOSAVE = 'autosave'
+CHECKPOINT = 'checkpoint'
+
+
+class SaveError(Exception):
+    """
+    Raised when a save can't be read (corrupted, or made by a newer version of the game).
+    """
+
+
+def pack_random(rng: random.Random) -> List[Any]:
+    """
+    Returns the state of the random generator in a compact JSON-friendly form.
+    :param rng: random generator
+    :return: List[Any] — [version, base64 of the Mersenne Twister state, gauss_next]
+    """
+    version, internal, gauss_next = rng.getstate()
+
+    return [version, base64.b64encode(array('I', internal).tobytes()).decode('ascii'), gauss_next]
+
+
+def unpack_random(rng: random.Random, packed: List[Any]) -> None:
+    """
+    Restores the state of the random generator packed by pack_random.
+    :param rng: random generator
+    :param packed: packed state
+    :return: None
+    """
+    version, internal, gauss_next = packed
+    rng.setstate((version, tuple(array('I', base64.b64decode(internal))), gauss_next))
+
+
+def _migrate_0(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    bson saves without a version: inventory and modifiers are lists of items,
+    history is a list of whole scenes, there are no visit counts and no random state.
+    """
+    def counts(items) -> Dict[str, int]:
+        if isinstance(items, dict):
+            return items
+
+        result: Dict[str, int] = {}
+
+        for item in items:
+            result[item] = result.get(item, 0) + 1
+
+        return result
+
+    history = [item if isinstance(item, str) else item['id_'] for item in data.get('history', [])]
+
+    return {
+        'version': 1,
+        'current': data['current'],
+        'previous': data.get('previous', ''),
+        'inventory': counts(data.get('inventory', [])),
+        'modifiers': counts(data.get('modifiers', [])),
+        'variables': data.get('variables', {}),
+        'history': history,
+        'visits': data.get('visits') or counts(history),
+        'random': None,
+    }
+
+
+# Migrations by the version they upgrade from
+MIGRATIONS: Dict[int, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    0: _migrate_0,
+}
+
+
+def migrate(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Upgrades the save to the current version.
+    :param data: save of any version
+    :return: Dict[str, Any]
+    """
+    version = data.get('version', 0)
+
+    if version > SAVE_VERSION:
+        raise SaveError(f'the save was made by a newer version of the game (save version {version})')
+
+    while version < SAVE_VERSION:
+        data = MIGRATIONS[version](data)
+        version = data['version']
+
+    return data
+
+
+def dumps(state: Dict[str, Any], compress: bool = False) -> bytes:
+    """
+    Serializes the game state (Engine.state()) into the current save format.
+    :param state: game state
+    :param compress: whether to compress the save with zlib
+    :return: bytes
+    """
+    data = json.dumps({'version': SAVE_VERSION, **state}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    return zlib.compress(data, 6) if compress else data
+
+
+def is_zlib(data: bytes) -> bool:
+    """
+    Checks the zlib header: deflate with a window of at most 32 KiB and a valid FCHECK.
+    :param data: contents of the save file
+    :return: bool
+    """
+    return len(data) >= 2 and data[0] & 0x0f == 8 and data[0] >> 4 <= 7 and (data[0] << 8 | data[1]) % 31 == 0
+
+
+def is_bson(data: bytes) -> bool:
+    """
+    Checks the bson framing: a little-endian length of the whole document and a terminating zero.
+    :param data: contents of the save file
+    :return: bool
+    """
+    return len(data) >= 5 and int.from_bytes(data[:4], 'little') == len(data) and data[-1] == 0
+
+
+def loads(data: bytes) -> Dict[str, Any]:
+    """
+    Reads a save of any version and format (JSON, zlib-compressed JSON, legacy bson) into the game state.
+    A bson document starts with its length, which can look like the start of the other formats,
+    so bson is tried whenever they can't be read.
+    :param data: contents of the save file
+    :return: Dict[str, Any]
+    """
+    error: Optional[Exception] = None
+
+    if data[:1] == b'{' or is_zlib(data):
+        try:
+            state = json.loads(data if data[:1] == b'{' else zlib.decompress(data))
+
+            # Versioned saves are JSON objects with a version, unversioned ones are bson
+            if isinstance(state, dict) and isinstance(state.get('version'), int):
+                return migrate(state)
+
+            error = ValueError('not a save')
+        except (ValueError, zlib.error) as e:
+            error = e
+
+    if error is None or is_bson(data):
+        try:
+            import bson
+
+            state = bson.loads(data)
+        except Exception as e:
+            error = error or e
+        else:
+            return migrate(state)
+
+    raise SaveError(f'the save is corrupted: {error}') from error
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """
+    Writes the file through a temporary file replacing the old one at once,
+    so a crash in the middle of writing leaves the previous version intact.
+    :param path: Path to the file
+    :param data: contents
+    :return: None
+    """
+    temp = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+
+    try:
+        with open(temp, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temp, path)
+    finally:
+        temp.unlink(missing_ok=True)
+
+
+@dataclass
+class SlotInfo:
+    """
+    A class to represent the metadata of a save slot, kept in the index file.
+    slot — the name of the slot.
+    scene — the id of the scene the game was saved in.
+    timestamp — when the game was saved (seconds since the epoch).
+    playtime — how long the game had been played when it was saved, in seconds.
+    size — the size of the save file in bytes.
+    """
+    slot: str
+    scene: str
+    timestamp: float
+    playtime: float = 0.0
+    size: int = 0
+
+
+class SaveManager:
+    """
+    A class to keep the saves in named slots: numbered ones chosen by the player, the autosave and the checkpoint
+    of the save/load game actions.
+    Every save is written atomically (temporary file + os.replace); the index file keeps the metadata of the slots,
+    so they can be listed without reading the saves. The methods do file I/O and are meant to be run in a thread.
+    directory — the folder of the saves and the index.
+    slots — the number of the numbered slots.
+    compress — whether the saves are compressed with zlib.
+    legacy — the single save file of older versions, imported into the first slot.
+    """
+
+    def __init__(self, directory: Path = SAVES_DIR, slots: int = 3, compress: bool = False,
+                 legacy: Optional[Path] = LEGACY_SAVE):
+        self.directory = Path(directory)
+        self.slots = slots
+        self.compress = compress
+        self.legacy = legacy
+        self.index_path = self.directory / 'index.json'
+        self._index: Optional[Dict[str, SlotInfo]] = None
+        self.lock = threading.RLock()
+
+    def names(self) -> List[str]:
+        """
+        Returns the names of the slots the player can save into.
+        :return: List[str]
+        """
+        return [str(i) for i in range(1, self.slots + 1)]
+
+    def path(self, slot: str) -> Path:
+        return self.directory / f'{slot}.sav'
+
+    def index(self) -> Dict[str, SlotInfo]:
+        """
+        Returns the metadata of the used slots, reading the index file on first use.
+        The index is rebuilt from the saves if it is missing or corrupted.
+        :return: Dict[str, SlotInfo]
+        """
+        with self.lock:
+            if self._index is None:
+                try:
+                    data = json.loads(self.index_path.read_bytes())
+
+                    if data.get('version') != INDEX_VERSION:
+                        raise ValueError(data.get('version'))
+
+                    self._index = {slot: SlotInfo(**info) for slot, info in data['slots'].items()}
+                except (OSError, ValueError, TypeError, KeyError):
+                    self._index = self.rebuild_index()
+
+                self.import_legacy()
+
+            for slot in list(self._index):
+                if self.journaled(slot):
+                    self.refresh_from_journal(slot)
+
+            return dict(self._index)
+
+    def refresh_from_journal(self, slot: str) -> None:
+        """
+        Updates the metadata of the slot from the last record of its journal
+        (the index is only rewritten when the journal is compacted).
+        :param slot: name of the slot
+        :return: None
+        """
+        from journal import Journal
+
+        record = Journal.tail(self.journal_path(slot))
+
+        if record is None:
+            return
+
+        info = self._index[slot]
+
+        if 'snapshot' in record:
+            info.scene = record['snapshot']['current']
+        else:
+            info.scene = record['scene']
+            info.playtime = record.get('t', info.playtime)
+
+        info.timestamp = record.get('at', info.timestamp)
+
+    def rebuild_index(self) -> Dict[str, SlotInfo]:
+        """
+        Reads every save of the folder to recreate the index.
+        :return: Dict[str, SlotInfo]
+        """
+        index = {}
+
+        for file in self.directory.glob('*.sav'):
+            try:
+                state = loads(file.read_bytes())
+                stat = file.stat()
+            except (OSError, SaveError):
+                continue
+
+            index[file.stem] = SlotInfo(file.stem, state['current'], stat.st_mtime, state.get('playtime', 0.0),
+                                        stat.st_size)
+
+        # Slots with only a journal; the rest of their metadata is read from the journal by index()
+        for file in self.directory.glob('*.journal'):
+            if file.stem not in index:
+                index[file.stem] = SlotInfo(file.stem, '', file.stat().st_mtime, size=file.stat().st_size)
+
+        return index
+
+    def import_legacy(self) -> None:
+        """
+        Copies the single save of older versions into the first slot, if that slot is empty.
+        The old file is left in place.
+        :return: None
+        """
+        if not self.legacy or not self.legacy.is_file() or self.names()[0] in self._index:
+            return
+
+        try:
+            state = loads(self.legacy.read_bytes())
+        except (OSError, SaveError):
+            return
+
+        self.save(self.names()[0], state, timestamp=self.legacy.stat().st_mtime)
+
+    def write_index(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        write_atomic(
+            self.index_path,
+            json.dumps(
+                {'version': INDEX_VERSION, 'slots': {slot: asdict(info) for slot, info in self._index.items()}},
+                ensure_ascii=False
+            ).encode('utf-8')
+        )
+
+    def save(self, slot: str, state: Dict[str, Any], timestamp: float = None) -> SlotInfo:
+        """
+        Writes the game state into the slot and updates the index.
+        :param slot: name of the slot
+        :param state: game state (Engine.state(), may have playtime)
+        :param timestamp: time of the save (now by default)
+        :return: SlotInfo
+        """
+        data = dumps(state, self.compress)
+
+        with self.lock:
+            if self._index is None:
+                self.index()
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            write_atomic(self.path(slot), data)
+
+            info = SlotInfo(slot, state['current'], timestamp or time.time(), state.get('playtime', 0.0), len(data))
+            self._index[slot] = info
+            self.write_index()
+
+        return info
+
+    def journal_path(self, slot: str) -> Path:
+        return self.directory / f'{slot}.journal'
+
+    def journal(self, slot: str, snapshot_every: int = 50):
+        """
+        Returns a journal writing into the slot (see journal.py), which keeps the index up to date.
+        :param slot: name of the slot
+        :param snapshot_every: how many transitions are appended before the journal is compacted
+        :return: Journal
+        """
+        from journal import Journal
+
+        def on_snapshot(record: Dict[str, Any]) -> None:
+            state = record['snapshot']
+
+            with self.lock:
+                if self._index is None:
+                    self.index()
+
+                self._index[slot] = SlotInfo(slot, state['current'], record['at'], state.get('playtime', 0.0),
+                                             self.journal_path(slot).stat().st_size)
+                self.write_index()
+
+        return Journal(self.journal_path(slot), snapshot_every, on_snapshot)
+
+    def journaled(self, slot: str) -> bool:
+        """
+        Returns whether the latest save of the slot is its journal.
+        :param slot: name of the slot
+        :return: bool
+        """
+        try:
+            journal = self.journal_path(slot).stat().st_mtime
+        except OSError:
+            return False
+
+        try:
+            return journal >= self.path(slot).stat().st_mtime
+        except OSError:
+            return True
+
+    def load(self, slot: str) -> Dict[str, Any]:
+        """
+        Reads the game state from the slot.
+        If the latest save of the slot is a journal, the state is its snapshot with the journal under 'journal'
+        (the transitions have to be replayed with journal.replay).
+        :param slot: name of the slot
+        :return: Dict[str, Any]
+        :raises SaveError: if the slot is empty or the save can't be read
+        """
+        if self.journaled(slot):
+            from journal import Journal, JournalError
+
+            try:
+                snapshot, records = Journal.read(self.journal_path(slot))
+            except JournalError as e:
+                raise SaveError(str(e)) from e
+
+            state = migrate(snapshot['snapshot'])
+            state['journal'] = {'snapshot': snapshot, 'records': records}
+
+            if records and 't' in records[-1]:
+                state['playtime'] = records[-1]['t']
+
+            return state
+
+        try:
+            data = self.path(slot).read_bytes()
+        except OSError as e:
+            raise SaveError(f'there is no save in the slot {slot!r}') from e
+
+        return loads(data)
@@ -1 +1,9 @@
-import scenes.scenes_en
+import importlib
+
+
+def __getattr__(name: str):
+    # Language modules are imported on first use (scenes.scenes_<lang>)
+    if name.startswith('scenes_'):
+        return importlib.import_module(f'{__name__}.{name}')
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
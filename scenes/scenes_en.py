@@ -37,7 +37,7 @@ pat = Scene(
 )
 
 game_over = Scene(
-    id_='over',
+    id_='game_over',
     header='Game Over',
     text='You died.',
     exits=[
@@ -97,7 +97,7 @@ pray = Scene(
 hoofd = Scene(
     id_='hoofd',
     header='Strange man on the right',
-    image='hoofd.webp',
+    image='hoofd.jpg',
     text='You approach the strange man. Speak to him or go back?',
     exits=[
         ('Speak to the strange man', ('hoofd_0', 'True')),
@@ -108,7 +108,7 @@ hoofd = Scene(
 hoofd_0 = Scene(
     id_='hoofd_0',
     header='Hoofd, the pilots\' chief',
-    image='hoofd.webp',
+    image='hoofd.jpg',
     text='Hoofd says: "I am the chief of the pilots, but all my pilots are dead. I need a pilot. Are you a pilot?"',
     exits=[
         ('Yes, I am a pilot', ('game_over', 'True')),
@@ -123,10 +123,10 @@ hoofd_0 = Scene(
 hoofd_1 = Scene(
     id_='hoofd_1',
     header='Hoofd, the pilots\' chief',
-    image='hoofd.webp',
+    image='hoofd.jpg',
     text='Hoofd says: "You are not a pilot? Then you are not needed here. Go anywhere back."',
     exits=[
-        ('Back', ('!random.choice(player.history[:-1])', 'True')),
+        ('Back', ('!player.history.choice(random, skip=1)', 'True')),
     ],
     speaker='Hoofd, the pilots\' chief',
 )
@@ -154,5 +154,5 @@ EXIT = 'Exit'
 LANGUAGE = 'Language'
 SAVED = 'Saved'
 LOADED = 'Loaded'
-RESTART_NEEDED = 'Some changes will take effect only after restarting the game.'
 EMPTY = 'Empty'
+BACK = 'Back'
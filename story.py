@@ -0,0 +1,367 @@
+import argparse
+import importlib
+import marshal
+import mmap
+import pkgutil
+import struct
+import sys
+import time
+from array import array
+from importlib.machinery import ModuleSpec
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from actions import ActionTable
+from classes import Scene
+from conditions import Condition, ConditionCache, iter_scene_sources
+from registry import SceneRegistry
+from saves import write_atomic
+
+STORY_MAGIC = b'QSTY'
+STORY_VERSION = 2
+STORY_SUFFIX = '.story'
+
+# Bundles keep bytecode and native-endian tables, so they are only read by the Python which compiled them
+STORY_TAG = f'{sys.implementation.cache_tag}-{sys.byteorder}'.encode('ascii')
+
+SECTIONS = ('offsets', 'strings', 'ids', 'names', 'scenes', 'records', 'conditions', 'codes', 'constants', 'images')
+# magic, version, tag, then (offset, length) of every section
+HEADER = struct.Struct('<4sH32s' + 'II' * len(SECTIONS))
+
+# Fields of a Scene holding (value, condition) pairs, in the order of the record
+PAIR_FIELDS = ('if_texts', 'if_text_additions', 'if_images', 'if_speakers')
+
+
+class StoryError(Exception):
+    """
+    Raised when a story bundle can't be compiled or read.
+    """
+
+
+def compile_story(module: ModuleType, path: Path) -> int:
+    """
+    Compiles the scene module into a story bundle: a string table, indexes of the scenes by id and by variable
+    name, a record per scene referring to the strings, precompiled conditions, the constants of the module and
+    the images it refers to.
+    The module is validated first, like when it is loaded. The bundle replaces the old one atomically,
+    so games which have the old one mapped keep working.
+    :param module: scene module
+    :param path: Path to the bundle
+    :return: int — size of the bundle in bytes
+    """
+    registry = SceneRegistry(module)
+    registry.scan()
+    cache = ConditionCache(module.__name__)
+    cache.compile_module(module)
+    # Scenes of bundles are compiled when they are entered, unknown actions are reported now
+    ActionTable(module.__name__, cache).compile_module(module)
+
+    strings: Dict[str, int] = {}
+
+    def string(value: str) -> int:
+        return strings.setdefault(value, len(strings))
+
+    numbers: Dict[int, int] = {}
+    scenes: List[Scene] = []
+
+    for scene in registry.by_name.values():
+        if id(scene) not in numbers:
+            numbers[id(scene)] = len(scenes)
+            scenes.append(scene)
+
+    conditions: Dict[str, int] = {}
+    records = []
+
+    for scene in scenes:
+        used = {conditions.setdefault(source, len(conditions)) for _, source in iter_scene_sources('', scene)}
+        records.append(marshal.dumps((
+            string(scene.id_),
+            string(scene.header),
+            string(scene.text),
+            tuple((string(label), string(target), string(cond)) for label, (target, cond) in scene.exits),
+            string(scene.image),
+            tuple(
+                ((string(target), string(action_type), item), string(cond))
+                for (target, action_type, item), cond in scene.on_enter
+            ),
+            *(tuple((string(value), string(cond)) for value, cond in getattr(scene, name)) for name in PAIR_FIELDS),
+            string(scene.speaker),
+            scene.enable_formatting,
+            scene.sanitize,
+            tuple(sorted(used)),
+        )))
+
+    codes = []
+    condition_table = array('I')
+    offset = 0
+
+    for source in conditions:
+        condition = cache.get(source)
+        code = marshal.dumps((condition.code, condition.is_async))
+        condition_table.extend((string(source), offset, len(code)))
+        codes.append(code)
+        offset += len(code)
+
+    def index(keys: Dict[str, Scene]) -> bytes:
+        entries = array('I')
+
+        for key in sorted(keys):
+            entries.extend((string(key), numbers[id(keys[key])]))
+
+        return entries.tobytes()
+
+    ids = index(registry.by_id)
+    names = index(registry.by_name)
+
+    scene_table = array('I')
+    offset = 0
+
+    for record in records:
+        scene_table.extend((offset, len(record)))
+        offset += len(record)
+
+    try:
+        constants = marshal.dumps(registry.constants)
+    except ValueError as e:
+        raise StoryError(f'{module.__name__}: constants can only be plain data: {e}') from e
+
+    # The assets are checked against these at startup, without building every scene
+    images = array('I', sorted({
+        string(image)
+        for scene in scenes
+        for image in [scene.image, *(image for image, _ in scene.if_images)] if image
+    } | {string(image) for image, _ in registry.constants.get('GLOBAL_IMAGES', [])}))
+
+    encoded = [value.encode('utf-8') for value in strings]
+    string_offsets = array('I', [0])
+
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+
+    sections = [
+        string_offsets.tobytes(), b''.join(encoded), ids, names,
+        scene_table.tobytes(), b''.join(records), condition_table.tobytes(), b''.join(codes), constants,
+        images.tobytes()
+    ]
+
+    body = bytearray()
+    layout = []
+
+    for section in sections:
+        # Tables are read in place as arrays of unsigned ints
+        body.extend(b'\0' * (-(HEADER.size + len(body)) % 4))
+        layout.extend((HEADER.size + len(body), len(section)))
+        body.extend(section)
+
+    data = HEADER.pack(STORY_MAGIC, STORY_VERSION, STORY_TAG, *layout) + body
+    write_atomic(Path(path), data)
+
+    return len(data)
+
+
+class StoryBundle:
+    """
+    A class to read a story bundle in place: the file is memory-mapped (so the processes of several games share
+    its pages) and only the header and the constants are read on opening. Strings are decoded and scenes are
+    built when they are asked for; lookups by id and by name are binary searches over the mapped indexes.
+    path — the bundle file.
+    constants — the constants of the scene module.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+        try:
+            with open(self.path, 'rb') as file:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise StoryError(f'{self.path}: {e}') from e
+
+        if len(self.map) < HEADER.size:
+            raise StoryError(f'{self.path}: not a story bundle')
+
+        magic, version, tag, *layout = HEADER.unpack_from(self.map)
+
+        if magic != STORY_MAGIC:
+            raise StoryError(f'{self.path}: not a story bundle')
+
+        if version != STORY_VERSION or tag.rstrip(b'\0') != STORY_TAG:
+            raise StoryError(f'{self.path}: compiled by another version of the game or of Python, recompile it')
+
+        view = memoryview(self.map)
+        sections = {
+            name: view[layout[2 * i]:layout[2 * i] + layout[2 * i + 1]]
+            for i, name in enumerate(SECTIONS)
+        }
+
+        self.offsets = sections['offsets'].cast('I')
+        self.strings = sections['strings']
+        self.ids = sections['ids'].cast('I')
+        self.names = sections['names'].cast('I')
+        self.scenes = sections['scenes'].cast('I')
+        self.records = sections['records']
+        self.conditions = sections['conditions'].cast('I')
+        self.codes = sections['codes']
+        self.constants: Dict[str, Any] = marshal.loads(sections['constants'])
+        self.image_table = sections['images'].cast('I')
+
+        self._strings: Dict[int, str] = {}
+
+    def string(self, number: int) -> str:
+        value = self._strings.get(number)
+
+        if value is None:
+            value = str(self.strings[self.offsets[number]:self.offsets[number + 1]], 'utf-8')
+            self._strings[number] = value
+
+        return value
+
+    def find(self, key: str) -> Optional[int]:
+        """
+        Returns the number of the scene by its id or by its variable name.
+        :param key: id_ or variable name
+        :return: Optional[int]
+        """
+        for entries in (self.ids, self.names):
+            low, high = 0, len(entries) // 2
+
+            while low < high:
+                middle = (low + high) // 2
+                current = self.string(entries[2 * middle])
+
+                if current == key:
+                    return entries[2 * middle + 1]
+
+                if current < key:
+                    low = middle + 1
+                else:
+                    high = middle
+
+        return None
+
+    def images(self) -> List[str]:
+        """
+        Returns every image the scenes and GLOBAL_IMAGES refer to, without building the scenes.
+        :return: List[str]
+        """
+        return [self.string(number) for number in self.image_table]
+
+    def keys(self, entries: memoryview) -> Iterator[str]:
+        return (self.string(entries[i]) for i in range(0, len(entries), 2))
+
+    def __len__(self) -> int:
+        return len(self.scenes) // 2
+
+    def scene(self, number: int) -> Tuple[Scene, List[Condition]]:
+        """
+        Builds the scene from its record.
+        :param number: number of the scene
+        :return: Tuple[Scene, List[Condition]] — the scene and its precompiled conditions
+        """
+        offset, length = self.scenes[2 * number], self.scenes[2 * number + 1]
+        (id_, header, text, exits, image, on_enter, *pairs, speaker, enable_formatting, sanitize,
+         used) = marshal.loads(self.records[offset:offset + length])
+        s = self.string
+
+        scene = Scene(
+            id_=s(id_),
+            header=s(header),
+            text=s(text),
+            exits=[(s(label), (s(target), s(cond))) for label, target, cond in exits],
+            image=s(image),
+            on_enter=[((s(target), s(action_type), item), s(cond)) for (target, action_type, item), cond in on_enter],
+            speaker=s(speaker),
+            enable_formatting=enable_formatting,
+            sanitize=sanitize,
+            **{name: [(s(value), s(cond)) for value, cond in pair] for name, pair in zip(PAIR_FIELDS, pairs)}
+        )
+
+        return scene, [self.condition(number) for number in used]
+
+    def condition(self, number: int) -> Condition:
+        source, offset, length = self.conditions[3 * number:3 * number + 3]
+        code, is_async = marshal.loads(self.codes[offset:offset + length])
+
+        return Condition.precompiled(self.string(source), code, is_async)
+
+
+class StoryModule(ModuleType):
+    """
+    A scene module loaded from a story bundle. It has the constants of the module;
+    scenes are looked up through the registry (SceneRegistry.for_module), which materializes them.
+    """
+
+    def __init__(self, name: str, bundle: StoryBundle):
+        super().__init__(name)
+        self.__file__ = str(bundle.path)
+        self.__spec__ = ModuleSpec(name, None, origin=self.__file__)
+        self.__bundle__ = bundle
+        self.__dict__.update(bundle.constants)
+
+    def __getattr__(self, name: str) -> Scene:
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        scene = SceneRegistry.for_module(self).get(name)
+
+        if scene is None:
+            raise AttributeError(f'module {self.__name__!r} has no attribute {name!r}')
+
+        return scene
+
+
+def story_path(name: str) -> Path:
+    """
+    Returns the path of the bundle of the scene module.
+    :param name: name of the scene module (scenes.scenes_<lang>)
+    :return: Path
+    """
+    package, _, module = name.rpartition('.')
+
+    return Path(importlib.import_module(package).__path__[0]) / f'{module}{STORY_SUFFIX}'
+
+
+def load_story(name: str) -> Optional[StoryModule]:
+    """
+    Loads the scene module from its bundle into sys.modules, if there is a bundle newer than the module's source
+    compiled by this Python.
+    :param name: name of the scene module (scenes.scenes_<lang>)
+    :return: Optional[StoryModule] — None if the module has to be imported from its source
+    """
+    path = story_path(name)
+    source = path.with_suffix('.py')
+
+    try:
+        if source.is_file() and source.stat().st_mtime > path.stat().st_mtime:
+            return None
+
+        module = StoryModule(name, StoryBundle(path))
+    except (OSError, StoryError):
+        return None
+
+    sys.modules[name] = module
+
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compiles scene modules into story bundles.')
+    parser.add_argument('languages', nargs='*', help='languages to compile (every scenes module by default)')
+    args = parser.parse_args()
+
+    import scenes
+
+    languages = args.languages or [
+        info.name[len('scenes_'):] for info in pkgutil.iter_modules(scenes.__path__) if info.name.startswith('scenes_')
+    ]
+
+    for language in languages:
+        name = f'scenes.scenes_{language}'
+        start = time.perf_counter()
+        size = compile_story(importlib.import_module(name), story_path(name))
+        print(f'{story_path(name)}: {size} bytes in {(time.perf_counter() - start) * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+"""
+Makes the game modules importable when pytest is run from any directory: python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,188 @@
+import asyncio
+import types
+
+import pytest
+
+from actions import ACTIONS, ActionError, ActionTable, register_action
+from classes import Scene
+from engine import Engine
+from scenes import scenes_en
+
+
+def scene(scene_id: str, *on_enter) -> Scene:
+    return Scene(id_=scene_id, header=scene_id, text='', exits=[('first', ('first', 'True'))], on_enter=list(on_enter))
+
+
+@pytest.fixture
+def story(request):
+    """
+    Returns a function making a scene module out of scenes; the compiled actions of the module are dropped afterwards.
+    """
+    name = f'test_actions_{request.node.name}'
+
+    def make(**scenes: Scene) -> types.ModuleType:
+        module = types.ModuleType(name)
+        module.MY_VARS = {}
+        module.GLOBAL_ADDITIONS = []
+        module.GLOBAL_IMAGES = []
+        vars(module).update(scenes)
+
+        return module
+
+    yield make
+    ActionTable.discard(name)
+
+
+def enter(module: types.ModuleType, target: str, handler=None) -> Engine:
+    engine = Engine(module, seed=0, handler=handler)
+    asyncio.run(engine.enter())
+    engine.player.previous = engine.player.current
+    asyncio.run(engine.enter(target, run_actions=True))
+
+    return engine
+
+
+def test_conditions_see_the_state_on_entry(story):
+    batch = scene(
+        'batch',
+        (('inventory', 'add', 'coin'), 'True'),
+        (('modifiers', 'add', 'rich'), '"coin" in inventory'),
+        (('variables', 'set', ('coins', 'invdict.get("coin", 0)')), 'True'),
+    )
+    engine = enter(story(first=scene('first'), batch=batch), 'batch')
+
+    assert engine.player.inventory.count('coin') == 1
+    assert 'rich' not in engine.modifiers
+    assert engine.variables == {'coins': 0}
+
+    # The context is refreshed once, after the commit
+    assert engine.context.invdict == {'coin': 1}
+    assert engine.context.vars is engine.variables
+
+
+def test_commit_replaces_only_the_changed_parts(story):
+    module = story(first=scene('first'), batch=scene('batch', (('modifiers', 'add-many', ('luck', '2')), 'True')))
+    engine = Engine(module, seed=0)
+    asyncio.run(engine.enter())
+    inventory, modifiers, variables = engine.player.inventory, engine.modifiers, engine.variables
+
+    engine.player.previous = engine.player.current
+    asyncio.run(engine.enter('batch', run_actions=True))
+
+    assert engine.player.inventory is inventory and engine.variables is variables
+    assert engine.modifiers is not modifiers
+    assert engine.modifiers.count('luck') == 2 and 'luck' not in modifiers
+
+
+def test_rollback(story):
+    failing = scene(
+        'failing',
+        (('inventory', 'add', 'coin'), 'True'),
+        (('variables', 'inc', ('missing', 1)), 'True'),
+    )
+    module = story(first=scene('first'), failing=failing)
+    errors = []
+
+    async def handler(action_type, item):
+        errors.append((action_type, item))
+        return True
+
+    engine = enter(module, 'failing', handler)
+
+    assert errors == [('error', "test_actions_test_rollback.failing.on_enter[1]: KeyError('missing')")]
+    assert 'coin' not in engine.player.inventory
+    assert engine.player.current.id_ == 'failing' and engine.resolved is not None
+
+    with pytest.raises(ActionError, match=r'failing\.on_enter\[1\]'):
+        enter(module, 'failing')
+
+
+def test_failing_condition(story):
+    module = story(first=scene('first'), failing=scene('failing', (('inventory', 'add', 'coin'), 'vars["missing"]')))
+
+    with pytest.raises(ActionError, match=r'on_enter\[0\]: condition \'vars\["missing"\]\''):
+        enter(module, 'failing')
+
+
+def test_game_actions_see_earlier_changes(story):
+    notified = scene(
+        'notified',
+        (('variables', 'add', ('coins', 3)), 'True'),
+        (('game', 'notify', 'Paid.'), 'True'),
+        (('game', 'goto', 'first'), 'True'),
+        (('inventory', 'add', 'coin'), 'True'),
+    )
+    seen = []
+
+    async def handler(action_type, item):
+        seen.append((action_type, item, dict(engine.variables)))
+        return True
+
+    engine = Engine(story(first=scene('first'), notified=notified), seed=0, handler=handler)
+    asyncio.run(engine.enter())
+    engine.player.previous = engine.player.current
+    assert not asyncio.run(engine.enter('notified', run_actions=True))
+
+    # notify is committed before it runs, goto takes over and the actions after it don't run
+    assert seen == [('notify', 'Paid.', {'coins': 3})]
+    assert engine.player.current.id_ == 'first'
+    assert 'coin' not in engine.player.inventory
+
+
+@pytest.mark.parametrize('on_enter, message', [
+    ((('inventory', 'double', 'coin'), 'True'), "on_enter[0]: unknown action 'inventory' 'double'"),
+    ((('modifiers', 'add-many', ('luck', 'x')), 'True'), "on_enter[0]: malformed item ('luck', 'x')"),
+    ((('variables', 'inc', 'coins'), 'True'), "on_enter[0]: malformed item 'coins'"),
+])
+def test_compile_errors(story, on_enter, message):
+    with pytest.raises(ActionError) as error:
+        ActionTable.for_module(story(first=scene('first'), broken=scene('broken', on_enter)))
+
+    assert message in str(error.value)
+
+
+def test_register_action_invalidates_the_scenes_using_it(story):
+    doubled = scene('doubled', (('variables', 'add', ('coins', 2)), 'True'), (('variables', 'double', 'coins'), 'True'))
+    plain = scene('plain', (('variables', 'add', ('coins', 1)), 'True'))
+    module = story(first=scene('first'), doubled=doubled, plain=plain)
+
+    register_action('variables', 'double', lambda batch, item: None)
+
+    try:
+        table = ActionTable.for_module(module)
+        compiled = table.get(plain)
+        assert table.get(doubled)
+
+        @register_action('variables', 'double')
+        def double(batch, item):
+            batch.variables[item] *= 2
+
+        assert doubled not in table.scenes and table.scenes[plain] is compiled
+        assert ActionTable.for_module(module) is table
+
+        engine = Engine(module, seed=0)
+        asyncio.run(engine.enter())
+        engine.player.previous = engine.player.current
+        asyncio.run(engine.enter('doubled', run_actions=True))
+
+        assert engine.variables == {'coins': 4}
+    finally:
+        del ACTIONS[('variables', 'double')]
+        ActionTable.invalidate('variables', 'double')
+
+
+def test_pray_scene():
+    engine = Engine(scenes_en, seed=0)
+    asyncio.run(engine.enter())
+    asyncio.run(engine.step([i for i, (_, _, target) in enumerate(engine.available_exits()) if target == 'pray'][0]))
+
+    for visit in range(1, 15):
+        assert engine.player.current.id_ == 'pray'
+        assert engine.player.inventory.count('money') == min(visit, 10)
+        # The conditions see the money the scene was entered with, so overpraying starts a visit later
+        assert engine.modifiers.count('overpray') == max(visit - 10, 0)
+        asyncio.run(engine.step(0))
+
+    assert engine.player.current.id_ == 'game_over'
+    assert engine.notifications == ['Goodbye.']
+    assert engine.modifiers.count('overpray') == 5
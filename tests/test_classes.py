@@ -0,0 +1,150 @@
+import random
+
+import pytest
+
+from classes import History, ItemBag, Scene
+
+
+def scene(scene_id: str) -> Scene:
+    return Scene(id_=scene_id, header=scene_id, text='', exits=[])
+
+
+SCENES = {scene_id: scene(scene_id) for scene_id in 'abcdef'}
+
+
+def test_bag_counts():
+    bag = ItemBag(['coin', 'key', 'coin'])
+    bag.add('arrow', 5)
+    bag.append('key')
+    bag.add('nothing', 0)
+
+    assert len(bag) == 9
+    assert (bag.count('coin'), bag.count('arrow'), bag.count('missing')) == (2, 5, 0)
+    assert 'key' in bag and 'nothing' not in bag
+    assert dict(bag.as_dict()) == {'coin': 2, 'key': 2, 'arrow': 5}
+
+
+def test_bag_list_behaviour():
+    bag = ItemBag(['coin', 'key', 'coin'])
+
+    # The copies of an item come together, in the order the items were first added
+    assert list(bag) == ['coin', 'coin', 'key']
+    assert (bag[0], bag[-1], bag[1:]) == ('coin', 'key', ['coin', 'key'])
+    assert bag == ['key', 'coin', 'coin']
+    assert bag == ItemBag(['coin', 'coin', 'key'])
+    assert bag != ['coin', 'key']
+
+    with pytest.raises(IndexError):
+        bag[3]
+
+
+def test_bag_remove():
+    bag = ItemBag(['coin', 'coin', 'key'])
+    bag.remove('coin')
+
+    assert (bag.count('coin'), len(bag)) == (1, 2)
+
+    bag.remove('coin')
+
+    # No empty counts are left behind
+    assert 'coin' not in bag
+    assert dict(bag.as_dict()) == {'key': 1}
+
+
+def test_bag_remove_missing():
+    bag = ItemBag(['coin'])
+
+    with pytest.raises(ValueError):
+        bag.remove('key')
+
+    with pytest.raises(ValueError):
+        bag.remove('coin', 2)
+
+    # Nothing is removed then
+    assert bag == ['coin']
+
+
+def test_bag_remove_all_and_clear():
+    bag = ItemBag(['coin', 'coin', 'key'])
+
+    assert bag.remove_all('coin') == 2
+    assert bag.remove_all('coin') == 0
+    assert len(bag) == 1
+
+    bag.clear()
+
+    assert len(bag) == 0 and list(bag) == []
+
+
+def test_bag_copy():
+    bag = ItemBag(['coin'])
+    view = bag.as_dict()
+    copy = bag.copy()
+    copy.add('key')
+
+    assert bag == ['coin'] and copy == ['coin', 'key']
+    assert len(copy) == 2
+
+    # The view follows its own bag
+    bag.add('coin')
+    assert view['coin'] == 2
+    assert copy.as_dict()['coin'] == 1
+
+
+@pytest.mark.parametrize('data, expected', [
+    ({'coin': 2, 'key': '1'}, {'coin': 2, 'key': 1}),
+    (['coin', 'coin', 'key'], {'coin': 2, 'key': 1}),
+    (None, {}),
+])
+def test_bag_load(data, expected):
+    bag = ItemBag.load(data)
+
+    assert dict(bag.as_dict()) == expected
+    assert len(bag) == sum(expected.values())
+
+
+def test_history_ring_buffer():
+    history = History(size=3, lookup=SCENES.__getitem__)
+
+    for scene_id in 'abcab':
+        history.append(scene_id)
+
+    history.append(SCENES['d'])
+
+    # Only the last ids are kept, the visits count every one
+    assert list(history.ids) == ['a', 'b', 'd']
+    assert len(history) == 3 and history.size == 3
+    assert (history.visited('a'), history.visited('b'), history.visited('c'), history.visited('e')) == (2, 2, 1, 0)
+
+
+def test_history_lookup():
+    history = History('abc', size=5, lookup=SCENES.__getitem__)
+
+    assert history[-1] is SCENES['c']
+    assert history[:2] == [SCENES['a'], SCENES['b']]
+    assert list(history) == [SCENES['a'], SCENES['b'], SCENES['c']]
+    assert history.last_ids(2) == ['b', 'c']
+    assert history.last_ids(2, skip=1) == ['a', 'b']
+    assert history.last(5) == [SCENES['a'], SCENES['b'], SCENES['c']]
+
+
+def test_history_visits():
+    # Visits are counted from the ids unless they were saved
+    assert History('aab', lookup=SCENES.__getitem__).visited('a') == 2
+    assert History('ab', lookup=SCENES.__getitem__, visits={'a': 7}).visited('a') == 7
+
+
+def test_history_choice():
+    history = History('abcd', size=4, lookup=SCENES.__getitem__)
+    rng = random.Random(0)
+    chosen = {history.choice(rng, skip=1).id_ for _ in range(200)}
+
+    # The most recent scenes left out are never chosen
+    assert chosen == {'a', 'b', 'c'}
+    assert history.choice(rng, skip=3) is SCENES['a']
+
+    with pytest.raises(IndexError):
+        history.choice(rng, skip=4)
+
+    with pytest.raises(IndexError):
+        History(lookup=SCENES.__getitem__).choice(rng)
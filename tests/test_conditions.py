@@ -0,0 +1,88 @@
+import asyncio
+import types
+
+import pytest
+
+from classes import Scene
+from conditions import Condition, ConditionCache, ConditionError
+
+
+def story(name: str, cond: str = 'True') -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.first = Scene(
+        id_='first',
+        header='First',
+        text='',
+        exits=[('Again', ('first', cond))],
+        if_texts=[('Rich', 'invdict.get("money", 0) >= 10')],
+    )
+    module.GLOBAL_ADDITIONS = [('Lucky', '"lucky" in mods')]
+    module.MY_VARS = {'double': 'rnum * 2'}
+
+    return module
+
+
+def test_expression():
+    condition = Condition('rnum > 50')
+
+    assert condition.code is not None and not condition.is_async
+    assert condition.evaluate({'rnum': 60}) is True
+    assert condition.evaluate({'rnum': 40}) is False
+
+
+def test_async():
+    async def answer():
+        return 42
+
+    condition = Condition('await answer() == 42')
+
+    assert condition.is_async
+    assert asyncio.run(condition.evaluate({'answer': answer})) is True
+
+
+def test_statements():
+    # Statement blocks are run through meval
+    condition = Condition('x = rnum + 1\nreturn x')
+
+    assert condition.code is None and condition.is_async
+    assert asyncio.run(condition.evaluate({'rnum': 1})) == 2
+
+
+def test_syntax_error():
+    with pytest.raises(ConditionError, match='scenes.first.exits'):
+        Condition('rnum >', 'scenes.first.exits[0]')
+
+
+def test_cache():
+    module = story('test_conditions_cache')
+    cache = ConditionCache.for_module(module)
+
+    # Every evaluated string of the module is compiled at load time, once
+    assert {'True', 'invdict.get("money", 0) >= 10', '"lucky" in mods', 'rnum * 2'} <= set(cache.conditions)
+    assert ConditionCache.for_module(module) is cache
+    assert cache.get('True') is cache.get('True')
+    assert cache.evaluate('rnum * 2', {'rnum': 4}) == 8
+
+    ConditionCache.discard(module.__name__)
+
+    assert ConditionCache.for_module(module) is not cache
+
+
+def test_broken_module():
+    module = story('test_conditions_broken', 'rnum >')
+    module.GLOBAL_IMAGES = [('image.png', 'and')]
+
+    # All the errors are reported at once, with their origins
+    with pytest.raises(ConditionError) as error:
+        ConditionCache.for_module(module)
+
+    assert 'test_conditions_broken.first.exits[0]' in str(error.value)
+    assert 'test_conditions_broken.GLOBAL_IMAGES[0]' in str(error.value)
+    assert module.__name__ not in ConditionCache._modules
+
+
+def test_select():
+    cache = ConditionCache('test_conditions_select')
+    pairs = [('a', 'rnum > 50'), ('b', 'True'), ('c', 'rnum < 50')]
+
+    assert asyncio.run(cache.select(pairs, {'rnum': 60})) == ['a', 'b']
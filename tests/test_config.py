@@ -0,0 +1,102 @@
+import tomllib
+
+import pytest
+
+import scenes
+from config import ConfigError, GameConfig
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'config.toml'
+    path.write_text('name = "Test"\nlanguage = "en"\nlanguages = ["en"]\nhistory_size = 10\n', 'utf-8')
+
+    return path
+
+
+@pytest.fixture
+def russian(tmp_path, monkeypatch):
+    """
+    Adds scenes/scenes_ru.py (only its presence is checked).
+    """
+    directory = tmp_path / 'scenes'
+    directory.mkdir()
+    (directory / 'scenes_ru.py').write_text('', 'utf-8')
+    monkeypatch.setattr(scenes, '__path__', [*scenes.__path__, str(directory)])
+
+
+def test_load(path):
+    config = GameConfig.load(path, environ={})
+
+    assert (config.name, config.history_size, config.color) == ('Test', 10, 'green')
+
+
+def test_env_override(path):
+    config = GameConfig.load(path, environ={'QUEST_HISTORY_SIZE': '500', 'QUEST_JOURNAL': 'off'})
+
+    assert (config.history_size, config.journal) == (500, False)
+
+    # Overrides are never written back
+    assert config.update(name='Other')
+    assert config.save()
+    assert tomllib.loads(path.read_text('utf-8'))['history_size'] == 10
+
+
+def test_env_only_language(path, russian):
+    config = GameConfig.load(path, environ={'QUEST_LANGUAGES': 'en,ru'})
+
+    # The language takes effect, but the file would not load without the environment
+    assert not config.update(language='ru')
+    assert config.language == 'ru'
+    assert not config.save()
+    assert GameConfig.load(path, environ={}).language == 'en'
+
+
+def test_update_and_save(path, russian):
+    config = GameConfig.load(path, environ={})
+
+    assert config.update(languages=['en', 'ru'], language='ru')
+    assert config.save()
+    assert not config.save()
+    assert GameConfig.load(path, environ={}).language == 'ru'
+
+
+@pytest.mark.parametrize('contents, message', [
+    ('unknown_key = 1\n', 'unknown keys'),
+    ('history_size = "many"\n', 'must be an integer'),
+    ('autosave = 1\n', 'must be true or false'),
+    ('history_size = 0\n', 'at least 1'),
+    ('color = "no such color"\n', 'color'),
+    ('language = "ru"\n', 'not one of the languages'),
+    ('languages = ["en", "xx"]\n', 'no scenes/scenes_xx.py'),
+    ('name = \n', 'config.toml'),
+])
+def test_invalid_file(tmp_path, contents, message):
+    path = tmp_path / 'config.toml'
+    path.write_text(contents, 'utf-8')
+
+    with pytest.raises(ConfigError, match=message):
+        GameConfig.load(path, environ={})
+
+
+@pytest.mark.parametrize('environ', [{'QUEST_HISTORY_SIZE': 'many'}, {'QUEST_AUTOSAVE': 'maybe'}])
+def test_invalid_env(path, environ):
+    with pytest.raises(ConfigError, match='QUEST_'):
+        GameConfig.load(path, environ=environ)
+
+
+@pytest.mark.parametrize('changes', [{'unknown_key': 1}, {'history_size': 'many'}, {'language': 'xx'}])
+def test_invalid_update(path, changes):
+    config = GameConfig.load(path, environ={})
+
+    with pytest.raises(ConfigError):
+        config.update(**changes)
+
+    # An invalid change leaves the config as it was
+    assert config == GameConfig.load(path, environ={})
+    assert not config.save()
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(ConfigError):
+        GameConfig.load(tmp_path / 'config.toml')
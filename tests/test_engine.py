@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from engine import ChoiceError, Engine, playthrough
+from scenes import scenes_en
+
+
+def test_step():
+    engine = Engine(scenes_en, seed=0)
+    asyncio.run(engine.enter())
+    exits = engine.available_exits()
+    asyncio.run(engine.step(0))
+
+    assert engine.player.previous.id_ == 'first'
+    assert engine.player.current.id_ == exits[0][2]
+    assert list(engine.player.history.ids) == [exits[0][2]]
+
+
+@pytest.mark.parametrize('choice', [-1, 99])
+def test_step_no_exit(choice):
+    engine = Engine(scenes_en, seed=0)
+    asyncio.run(engine.enter())
+    before = engine.state()
+
+    with pytest.raises(ChoiceError, match=f'no exit {choice} in first, it has'):
+        asyncio.run(engine.step(choice))
+
+    assert engine.state() == before
+
+
+def test_playthrough_script():
+    assert asyncio.run(playthrough(scenes_en, 0, 10, [0, 0])) == asyncio.run(playthrough(scenes_en, 1, 10, [0, 0]))
+
+    with pytest.raises(ChoiceError, match='step 3: there is no exit 5'):
+        asyncio.run(playthrough(scenes_en, 0, 10, [0, 0, 5]))
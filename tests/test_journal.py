@@ -0,0 +1,108 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from engine import Engine
+from journal import Journal, JournalError, replay
+from saves import SaveManager
+from scenes import scenes_en
+
+
+async def play(journal: Journal, steps: int, seed: int = 3) -> Engine:
+    """
+    Plays the story choosing exits at random, recording every transition into the journal.
+    The exits are chosen with a generator of their own: the one of the engine is part of the game state.
+    """
+    choices = random.Random(seed)
+    engine = Engine(scenes_en, seed=seed)
+    await engine.enter(run_actions=True)
+    journal.snapshot(engine.state(), engine.context.rnum, 'en')
+
+    for _ in range(steps):
+        exits = engine.available_exits()
+
+        if not exits or engine.finished:
+            break
+
+        position = choices.randrange(len(exits))
+        before = Journal.mark(engine)
+        await engine.step(position)
+        journal.record(engine, position, before, engine.state, 'en')
+
+    journal.flush()
+
+    return engine
+
+
+def test_replay(tmp_path):
+    path = tmp_path / 'autosave.journal'
+    played = asyncio.run(play(Journal(path), 30))
+    snapshot, records = Journal.read(path)
+    engine = Engine(scenes_en)
+
+    assert asyncio.run(replay(engine, snapshot, records)) == len(records)
+    assert engine.state() == played.state()
+
+
+def test_snapshot_every(tmp_path):
+    path = tmp_path / 'autosave.journal'
+    played = asyncio.run(play(Journal(path, snapshot_every=4), 30))
+    snapshot, records = Journal.read(path)
+
+    assert len(records) < 4
+    assert snapshot['snapshot']['version'] == 1
+
+    engine = Engine(scenes_en)
+    asyncio.run(replay(engine, snapshot, records))
+
+    assert engine.state() == played.state()
+
+
+def test_divergence(tmp_path):
+    path = tmp_path / 'autosave.journal'
+    asyncio.run(play(Journal(path), 30))
+    snapshot, records = Journal.read(path)
+    records[0]['rnum'] = -1
+
+    with pytest.raises(JournalError, match='transition 1: rnum'):
+        asyncio.run(replay(Engine(scenes_en), snapshot, records))
+
+
+def test_truncated(tmp_path):
+    path = tmp_path / 'autosave.journal'
+    asyncio.run(play(Journal(path), 30))
+    lines = path.read_text('utf-8').splitlines()
+
+    # The game was killed in the middle of appending: the last line is dropped
+    path.write_text('\n'.join(lines[:-1] + [lines[-1][:10]]), 'utf-8')
+    assert len(Journal.read(path)[1]) == len(lines) - 2
+
+    # A broken line before the end is corruption
+    path.write_text('\n'.join([lines[0], '{', *lines[1:]]), 'utf-8')
+
+    with pytest.raises(JournalError, match='line 2'):
+        Journal.read(path)
+
+
+@pytest.mark.parametrize('contents', ['', json.dumps({'exit': 0}), json.dumps({'v': 99, 'snapshot': {}})])
+def test_unreadable(tmp_path, contents):
+    path = tmp_path / 'autosave.journal'
+    path.write_text(contents + '\n', 'utf-8')
+
+    with pytest.raises(JournalError):
+        Journal.read(path)
+
+
+def test_slot(tmp_path):
+    manager = SaveManager(tmp_path, legacy=None)
+    played = asyncio.run(play(manager.journal('autosave'), 10))
+    state = manager.load('autosave')
+    journal = state.pop('journal')
+    engine = Engine(scenes_en)
+    asyncio.run(replay(engine, journal['snapshot'], journal['records']))
+
+    # The index follows the last transition, not the snapshot
+    assert manager.index()['autosave'].scene == played.player.current.id_
+    assert engine.state() == played.state()
@@ -0,0 +1,121 @@
+import sys
+import types
+import weakref
+from collections import OrderedDict
+
+import pytest
+
+import scenes
+from actions import ActionTable
+from classes import Scene
+from conditions import ConditionCache
+from registry import RegistryError, SceneRegistry
+
+
+def scene(scene_id: str, *targets: str, goto: str = None) -> Scene:
+    return Scene(
+        id_=scene_id,
+        header=scene_id,
+        text='',
+        exits=[(target, (target, 'True')) for target in targets],
+        on_enter=[(('game', 'goto', goto), 'True')] if goto else [],
+    )
+
+
+def story(**scenes: Scene) -> types.ModuleType:
+    module = types.ModuleType('test_registry_story')
+    module.ITEMS = {'coin': 'Coin'}
+    vars(module).update(scenes)
+
+    return module
+
+
+def scan(module: types.ModuleType) -> SceneRegistry:
+    registry = SceneRegistry(module)
+    registry.scan()
+
+    return registry
+
+
+def test_lookup():
+    first = scene('first', 'second', 'EXIT', '!random.choice(["first"])')
+    second = scene('second', goto='first')
+    registry = scan(story(first=first, second=second, alias=second))
+
+    assert registry['first'] is first and registry['alias'] is second
+    assert registry.get('missing') is None
+    assert 'alias' in registry and 'missing' not in registry
+    assert sorted(registry.ids()) == ['first', 'second']
+    assert registry.constant('ITEMS') == {'coin': 'Coin'}
+    assert registry.constant('MISSING', 1) == 1
+
+    with pytest.raises(KeyError, match='no scene'):
+        registry['missing']
+
+
+@pytest.mark.parametrize('scenes, message', [
+    ({'first': scene('first'), 'other': scene('first')}, "other: id 'first' is already used"),
+    ({'first': scene('first'), 'game_over': scene('over')}, "game_over: variable name differs from the id 'over'"),
+    ({'first': scene('second'), 'second': scene('first')}, 'variable name is the id of another scene'),
+    ({'first': scene('first', 'nowhere')}, "first.exits[0]: no scene 'nowhere'"),
+    ({'first': scene('first', goto='nowhere')}, "first.on_enter[0]: no scene 'nowhere'"),
+])
+def test_errors(scenes, message):
+    with pytest.raises(RegistryError, match=message.replace('[', r'\[').replace(']', r'\]')):
+        scan(story(**scenes))
+
+
+def test_all_errors():
+    # Every error of the module is reported at once
+    with pytest.raises(RegistryError) as error:
+        scan(story(first=scene('first', 'nowhere'), game_over=scene('over')))
+
+    assert len(str(error.value).splitlines()) == 2
+
+
+@pytest.fixture
+def languages(tmp_path, monkeypatch):
+    """
+    Adds the languages xx and yy (copies of the first scene) with a single resident language,
+    leaving the loaded languages alone.
+    """
+    directory = tmp_path / 'scenes'
+    directory.mkdir()
+
+    for language in ('xx', 'yy'):
+        (directory / f'scenes_{language}.py').write_text(
+            "from classes import Scene\n\nfirst = Scene(id_='first', header='', text='', exits=[])\n", 'utf-8'
+        )
+
+    monkeypatch.setattr(scenes, '__path__', [*scenes.__path__, str(directory)])
+    monkeypatch.setattr(SceneRegistry, '_modules', OrderedDict())
+    monkeypatch.setattr(SceneRegistry, '_evicted', weakref.WeakSet())
+    monkeypatch.setattr(SceneRegistry, 'resident', 1)
+
+    yield
+
+    for language in ('xx', 'yy'):
+        name = f'scenes.scenes_{language}'
+        sys.modules.pop(name, None)
+        vars(scenes).pop(f'scenes_{language}', None)
+        ConditionCache.discard(name)
+        ActionTable.discard(name)
+
+
+def test_evict(languages):
+    old = SceneRegistry.for_language('xx')
+    SceneRegistry.for_language('yy')
+
+    assert 'scenes.scenes_xx' not in sys.modules
+    assert list(SceneRegistry._modules) == ['scenes.scenes_yy']
+
+    # A thread still holding the unloaded module gets a registry which isn't kept
+    stale = SceneRegistry.for_module(old.module)
+
+    assert stale.module is old.module
+    assert list(SceneRegistry._modules) == ['scenes.scenes_yy']
+
+    new = SceneRegistry.for_language('xx')
+
+    assert new.module is not old.module and new is not stale
+    assert SceneRegistry.for_module(new.module) is new
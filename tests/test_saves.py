@@ -0,0 +1,127 @@
+import asyncio
+import json
+import zlib
+
+import bson
+import pytest
+
+import saves
+from engine import Engine
+from saves import SAVE_VERSION, SaveError, SaveManager
+from scenes import scenes_en
+
+
+def legacy_save(**state) -> bytes:
+    """
+    Returns an unversioned bson save of the older versions.
+    """
+    return bson.dumps({
+        'current': 'first',
+        'previous': '',
+        'inventory': ['coin', 'coin', 'key'],
+        'modifiers': ['lucky'],
+        'variables': {'steps': 2},
+        'history': [{'id_': 'first'}, {'id_': 'first'}],
+        **state,
+    })
+
+
+def game_state() -> dict:
+    engine = Engine(scenes_en, seed=1)
+    asyncio.run(engine.enter())
+    engine.player.inventory.add('coin', 3)
+    engine.variables['steps'] = 2
+
+    return engine.state()
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_round_trip(compress):
+    state = game_state()
+    data = saves.dumps(state, compress)
+
+    assert (data[:1] == b'{') != compress
+    assert saves.loads(data) == {'version': SAVE_VERSION, **state}
+
+
+def test_legacy_bson():
+    state = saves.loads(legacy_save())
+
+    assert state['version'] == SAVE_VERSION
+    assert state['inventory'] == {'coin': 2, 'key': 1}
+    assert state['modifiers'] == {'lucky': 1}
+    assert state['variables'] == {'steps': 2}
+    assert state['history'] == ['first', 'first']
+    assert state['visits'] == {'first': 2}
+
+
+@pytest.mark.parametrize('size', [120, 123, 376, 379])
+def test_legacy_bson_size(size):
+    # A bson save starts with its length: 120 and 376 look like a zlib header, 123 and 379 like '{'
+    state = {'current': 'first', 'inventory': ['coin'], 'pad': ''}
+    state['pad'] = 'x' * (size - len(bson.dumps(state)))
+    data = bson.dumps(state)
+
+    assert len(data) == size
+    assert saves.loads(data)['inventory'] == {'coin': 1}
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'{"current": "first"',
+    b'[1, 2, 3]',
+    zlib.compress(b'not json'),
+    b'\x00\x01\x02\x03\x04\x05',
+])
+def test_corrupted(data):
+    with pytest.raises(SaveError):
+        saves.loads(data)
+
+
+def test_newer_version():
+    data = json.dumps({'version': SAVE_VERSION + 1, 'current': 'first'}).encode()
+
+    with pytest.raises(SaveError, match='newer version'):
+        saves.loads(data)
+
+
+def test_restore_random():
+    state = game_state()
+    engine = Engine(scenes_en, seed=2)
+    engine.restore(saves.loads(saves.dumps(state)))
+
+    assert engine.state() == state
+
+
+def test_restore_removed_scene():
+    engine = Engine(scenes_en, seed=1)
+    asyncio.run(engine.enter())
+    before = engine.state()
+
+    with pytest.raises(SaveError, match='no longer has'):
+        engine.restore({**before, 'current': 'removed_scene'})
+
+    assert engine.state() == before
+
+
+def test_slots(tmp_path):
+    manager = SaveManager(tmp_path, compress=True, legacy=None)
+    state = game_state()
+    info = manager.save('1', state, timestamp=10.0)
+
+    assert (info.slot, info.scene, info.timestamp) == ('1', 'first', 10.0)
+    assert manager.load('1')['inventory'] == state['inventory']
+    # The index is read back from the file
+    assert SaveManager(tmp_path, legacy=None).index()['1'] == info
+
+    with pytest.raises(SaveError, match='no save'):
+        manager.load('2')
+
+
+def test_import_legacy(tmp_path):
+    legacy = tmp_path / 'save.json'
+    legacy.write_bytes(legacy_save())
+    manager = SaveManager(tmp_path / 'saves', legacy=legacy)
+
+    assert manager.index()['1'].scene == 'first'
+    assert manager.load('1')['inventory'] == {'coin': 2, 'key': 1}
@@ -0,0 +1,72 @@
+import asyncio
+from dataclasses import fields
+
+import pytest
+
+import story
+from engine import playthrough
+from registry import SceneRegistry
+from scenes import scenes_en
+from story import StoryBundle, StoryError, StoryModule, compile_story
+
+
+@pytest.fixture
+def bundle(tmp_path):
+    path = tmp_path / 'scenes_en.story'
+    assert compile_story(scenes_en, path) == path.stat().st_size
+
+    return StoryBundle(path)
+
+
+def test_scenes(bundle):
+    module = StoryModule('scenes.scenes_en', bundle)
+    scenes = SceneRegistry(scenes_en)
+    scenes.scan()
+    compiled = SceneRegistry.for_module(module)
+
+    assert len(compiled) == len(bundle) == len(scenes)
+    assert sorted(compiled.ids()) == sorted(scenes.ids())
+
+    for scene in scenes:
+        loaded = compiled[scene.id_]
+
+        for field in fields(scene):
+            assert getattr(loaded, field.name) == getattr(scene, field.name), (scene.id_, field.name)
+
+    assert module.MY_VARS == scenes_en.MY_VARS
+    assert module.first is compiled['first']
+
+    with pytest.raises(AttributeError):
+        module.no_such_scene
+
+
+def test_images(bundle):
+    images = {scene.image for scene in SceneRegistry.for_module(scenes_en) if scene.image}
+
+    assert images <= set(bundle.images())
+    assert set(scenes_en.GLOBAL_IMAGES) <= set(bundle.images())
+
+
+def test_playthroughs(bundle):
+    module = StoryModule('scenes.scenes_en', bundle)
+
+    for seed in range(20):
+        assert asyncio.run(playthrough(module, seed, 50)) == asyncio.run(playthrough(scenes_en, seed, 50))
+
+
+@pytest.mark.parametrize('corrupt', [
+    lambda data: b'',
+    lambda data: b'NOPE' + data[4:],
+    lambda data: data[:4] + (story.STORY_VERSION + 1).to_bytes(2, 'little') + data[6:],
+])
+def test_unreadable(tmp_path, bundle, corrupt):
+    path = tmp_path / 'broken.story'
+    path.write_bytes(corrupt(bundle.path.read_bytes()))
+
+    with pytest.raises(StoryError):
+        StoryBundle(path)
+
+
+def test_missing(tmp_path):
+    with pytest.raises(StoryError):
+        StoryBundle(tmp_path / 'scenes_en.story')
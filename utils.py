@@ -20,15 +20,20 @@ def reduce(image: Path, width: int) -> Image:
     return img
 
 
-def image_to_block_art(img, output_width=100, output_height=None):
+# Unicode block characters (from darkest to lightest)
+BLOCK_CHARS = ' ░▒▓█'
+
+
+def image_to_block_art(img, output_width=100, output_height=None, ramp=BLOCK_CHARS):
     """
     Convert an image to ASCII art using Unicode blocks.
+    :param img: Image
+    :param output_width: Width of the art in characters
+    :param output_height: Height of the art in characters (keeps aspect ratio if None)
+    :param ramp: Characters from darkest to lightest, any length (a sequence of strings for entries of several
+        characters)
+    :return: str
     """
-    # Unicode block characters (from darkest to lightest)
-    BLOCK_CHARS = [' ', '░', '▒', '▓', '█']
-
-    # Load and process image (same as before)
-
     img = img.convert('L')
 
     # Calculate dimensions
@@ -37,15 +42,17 @@ def image_to_block_art(img, output_width=100, output_height=None):
         output_height = int(output_width * aspect_ratio * 0.5)
 
     img = img.resize((output_width, output_height), Image.Resampling.LANCZOS)
-    pixels = np.array(img)
-
-    # Convert to blocks
-    block_art = ''
-    for row in pixels:
-        for pixel in row:
-            # Map pixel values to block characters
-            block_index = int(pixel / 255 * (len(BLOCK_CHARS) - 1))
-            block_art += BLOCK_CHARS[block_index]
-        block_art += '\n'
-
-    return block_art
+    pixels = np.asarray(img)
+
+    # Every possible pixel value is mapped to its character once
+    indexes = np.arange(256) * (len(ramp) - 1) // 255
+
+    if any(len(entry) != 1 for entry in ramp):
+        # Rows can only be viewed as strings of one character per pixel, other ramps are joined row by row
+        lookup = [ramp[i] for i in indexes]
+        return ''.join(''.join(lookup[pixel] for pixel in row) + '\n' for row in pixels.tolist())
+
+    lookup = np.array(list(ramp))[indexes]
+    rows = np.ascontiguousarray(lookup[pixels]).view(f'<U{output_width}').ravel()
+
+    return '\n'.join(rows) + '\n' if output_height else ''